@@ -0,0 +1,414 @@
+import numpy as np
+import pandas as pd
+
+import cube
+import fuel
+import profiler
+from timeline import GAS_FIELDS, MERCH_FIELDS, Timeline
+
+
+# ------------------------------------------------------------
+# Mergeable partial aggregates
+# ------------------------------------------------------------
+# A ReceiptAggregate summarises one shard of receipts (a file, a year, a member).
+# Everything in it is a sum, a set union, a min/max or a date-sorted price run,
+# so merge() is associative and shards can be aggregated independently (in worker
+# processes, per upload) and combined in any grouping. Derived values
+# (first/last/min/max price, the date range label) are produced by finalize().
+#
+# Shards must not share receipts - dedupe by receipt key before aggregating.
+# Money is integer cents (see money.py), so merging never drifts.
+
+# bump when the pickled layout changes, so saved snapshots get rebuilt
+FORMAT_VERSION = 7
+
+
+def _sum_by(keys, values):
+    """{key: sum(values)} via a pandas group-by (sorted keys); int64 cents sum to ints."""
+    if len(keys) == 0:
+        return {}
+    sums = pd.Series(values).groupby(np.asarray(keys), sort=True).sum()
+    return dict(sums.items())
+
+
+def _day_keys(dates):
+    """datetime64 column -> 'YYYY-MM-DD' key per row (formatted once per distinct day)."""
+    days, codes = np.unique(np.asarray(dates, dtype="datetime64[D]"), return_inverse=True)
+    return np.datetime_as_string(days, unit="D").astype(object)[codes]
+
+
+def _add_counts(a, b):
+    out = dict(a)
+    for k, v in b.items():
+        out[k] = out.get(k, 0) + v
+    return out
+
+
+def merge_price_runs(dates_a, prices_a, dates_b, prices_b):
+    """Merge two date-sorted price runs; on equal dates run `a` comes first."""
+    if len(dates_a) == 0:
+        return dates_b, prices_b
+    if len(dates_b) == 0:
+        return dates_a, prices_a
+    dates = np.concatenate((dates_a, dates_b))
+    prices = np.concatenate((prices_a, prices_b))
+    if dates_b[0] < dates_a[-1]:
+        # stable sort on two pre-sorted runs is a linear merge for timsort/radix
+        order = np.argsort(dates, kind="stable")
+        dates, prices = dates[order], prices[order]
+    return dates, prices
+
+
+class PriceHistory:
+    """
+    One item's unit prices as two parallel, date-sorted arrays
+    (datetime64[ns] dates, float64 prices in cents) instead of a list of dicts.
+    Sorted once when built; first/last/min/max are O(1) after that.
+    """
+
+    __slots__ = ("dates", "prices", "_min", "_max")
+
+    def __init__(self, dates, prices, min_price=None, max_price=None):
+        self.dates = dates
+        self.prices = prices
+        self._min = min_price
+        self._max = max_price
+
+    def __len__(self):
+        return len(self.prices)
+
+    @property
+    def first_price(self):
+        return float(self.prices[0])
+
+    @property
+    def last_price(self):
+        return float(self.prices[-1])
+
+    @property
+    def min_price(self):
+        if self._min is None:
+            self._min = float(self.prices.min())
+        return self._min
+
+    @property
+    def max_price(self):
+        if self._max is None:
+            self._max = float(self.prices.max())
+        return self._max
+
+    def merge(self, other):
+        """Both runs interleaved by date; on equal dates this run's purchases come first."""
+        dates, prices = merge_price_runs(self.dates, self.prices, other.dates, other.prices)
+        lo = None if self._min is None or other._min is None else min(self._min, other._min)
+        hi = None if self._max is None or other._max is None else max(self._max, other._max)
+        return PriceHistory(dates, prices, lo, hi)
+
+    def to_frame(self):
+        """date / price DataFrame over the same buffers (no copy)."""
+        return pd.DataFrame({"date": self.dates, "price": self.prices}, copy=False)
+
+
+def _merge_items(a, b):
+    out = dict(a)
+    for item_no, other in b.items():
+        mine = out.get(item_no)
+        if mine is None:
+            out[item_no] = other
+            continue
+        out[item_no] = {
+            "itemNumber": item_no,
+            "name": mine["name"],
+            "total_spent": mine["total_spent"] + other["total_spent"],
+            "total_units": mine["total_units"] + other["total_units"],
+            "purchases": mine["purchases"] + other["purchases"],
+            "history": mine["history"].merge(other["history"]),
+        }
+    return out
+
+
+def _min_date(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def _max_date(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+class ReceiptAggregate:
+    """Partial merch + gas totals for a set of receipts. Build with from_tables(), combine with merge()."""
+
+    def __init__(self):
+        self.version = FORMAT_VERSION
+        # ---- Merchandise ----
+        # money in cents: ints, except the float price_sum
+        self.merch_count = 0
+        self.merch_total = 0
+        self.merch_units = 0.0
+        self.refund_count = 0
+        self.refund_total = 0
+        self.savings = 0
+        self.merch_locations = frozenset()
+        self.merch_monthly = {}         # month_key -> spent
+        self.merch_daily = {}           # 'YYYY-MM-DD' -> spent (feeds the chart time series)
+        self.subtotal_by_year = {}      # year -> pre-tax subtotal
+        self.items = {}                 # itemNumber -> partial stat with its PriceHistory
+        # ---- Gas ----
+        self.gas_count = 0
+        self.gas_total = 0
+        self.gas_gallons = 0.0
+        self.gas_price_sum = 0.0        # weighted (price * gallons)
+        self.gas_locations = frozenset()
+        self.gas_monthly = {}
+        self.gas_daily = {}
+        self.fuel = fuel.empty()        # spend / gallons per (day, station, grade), see fuel.py
+        # ---- Filter cube (see cube.py) and date-window totals (see timeline.py) ----
+        self.cube_receipts, self.cube_departments = cube.empty_partials()
+        self.merch_timeline = Timeline.empty(MERCH_FIELDS)
+        self.gas_timeline = Timeline.empty(GAS_FIELDS)
+        # ---- Both ----
+        self.min_date = None
+        self.max_date = None
+
+    # ------------------------------------------------------------
+    # Build from the columnar tables (see engine._flatten_batch)
+    # ------------------------------------------------------------
+    @classmethod
+    def from_tables(cls, receipts_df, items_df):
+        agg = cls()
+
+        gas_mask = receipts_df["is_gas"].to_numpy()
+        gas_df = receipts_df[gas_mask]
+        merch_df = receipts_df[~gas_mask]
+
+        item_is_gas = items_df["is_gas"].to_numpy()
+        gas_items = items_df[item_is_gas]
+        merch_items = items_df[~item_is_gas]
+
+        # ---- Merchandise ----
+        total = merch_df["total"].to_numpy()
+        refunds = (total < 0) | (merch_df["transactionType"] == "Refund").to_numpy()
+        agg.merch_count = int(len(merch_df))
+        agg.merch_total = int(total.sum())
+        agg.refund_count = int(refunds.sum())
+        agg.refund_total = int(np.abs(total[refunds]).sum())
+        agg.savings = int(merch_df["instantSavings"].sum())
+        agg.merch_locations = frozenset(merch_df["location"])
+        agg.merch_monthly = _sum_by(merch_df["month_key"], total)
+        agg.merch_daily = _sum_by(_day_keys(merch_df["date"]), total)
+        agg.subtotal_by_year = {int(y): v for y, v in _sum_by(merch_df["year"], merch_df["subTotal"].to_numpy()).items()}
+        with profiler.stage("item partials", rows=len(merch_items)):
+            agg.items, agg.merch_units = _item_partials(merch_items)
+
+        # ---- Gas ----
+        fuel_lines = gas_items[gas_items["fuelUnitQuantity"] > 0]
+        agg.gas_count = int(len(gas_df))
+        agg.gas_total = int(gas_df["total"].sum())
+        agg.gas_gallons = float(fuel_lines["fuelUnitQuantity"].sum())
+        agg.gas_price_sum = float((fuel_lines["itemUnitPriceAmount"] * fuel_lines["fuelUnitQuantity"]).sum())
+        agg.gas_locations = frozenset(gas_df["location"])
+        agg.gas_monthly = _sum_by(gas_df["month_key"], gas_df["total"].to_numpy())
+        agg.gas_daily = _sum_by(_day_keys(gas_df["date"]), gas_df["total"].to_numpy())
+        with profiler.stage("fuel grades", rows=len(gas_items)):
+            agg.fuel = fuel.partials(receipts_df, items_df)
+
+        with profiler.stage("filter cube", rows=len(items_df)):
+            agg.cube_receipts, agg.cube_departments = cube.partials(receipts_df, items_df)
+
+        with profiler.stage("timeline", rows=len(receipts_df)):
+            agg.merch_timeline = Timeline.from_columns(MERCH_FIELDS, merch_df["date"], {
+                "total": total,
+                "subTotal": merch_df["subTotal"].to_numpy(),
+                "instantSavings": merch_df["instantSavings"].to_numpy(),
+                "trips": np.ones(len(merch_df)),
+                "refund_total": np.where(refunds, np.abs(total), 0),
+                "refund_count": refunds,
+            })
+            # gas receipts and their fuel lines, one row each
+            n_gas, n_fuel = len(gas_df), len(fuel_lines)
+            agg.gas_timeline = Timeline.from_columns(
+                GAS_FIELDS, np.concatenate((gas_df["date"].to_numpy(), fuel_lines["date"].to_numpy())), {
+                    "total": np.concatenate((gas_df["total"].to_numpy(), np.zeros(n_fuel))),
+                    "gallons": np.concatenate((np.zeros(n_gas), fuel_lines["fuelUnitQuantity"].to_numpy())),
+                    "price_sum": np.concatenate((np.zeros(n_gas), (fuel_lines["itemUnitPriceAmount"] * fuel_lines["fuelUnitQuantity"]).to_numpy())),
+                    "trips": np.concatenate((np.ones(n_gas), np.zeros(n_fuel))),
+                })
+
+        if len(receipts_df):
+            agg.min_date = receipts_df["date"].min()
+            agg.max_date = receipts_df["date"].max()
+        return agg
+
+    # ------------------------------------------------------------
+    # Combine two shards (returns a new aggregate, inputs untouched)
+    # ------------------------------------------------------------
+    def merge(self, other):
+        out = ReceiptAggregate()
+        out.merch_count = self.merch_count + other.merch_count
+        out.merch_total = self.merch_total + other.merch_total
+        out.merch_units = self.merch_units + other.merch_units
+        out.refund_count = self.refund_count + other.refund_count
+        out.refund_total = self.refund_total + other.refund_total
+        out.savings = self.savings + other.savings
+        out.merch_locations = self.merch_locations | other.merch_locations
+        out.merch_monthly = _add_counts(self.merch_monthly, other.merch_monthly)
+        out.merch_daily = _add_counts(self.merch_daily, other.merch_daily)
+        out.subtotal_by_year = _add_counts(self.subtotal_by_year, other.subtotal_by_year)
+        out.items = _merge_items(self.items, other.items)
+
+        out.gas_count = self.gas_count + other.gas_count
+        out.gas_total = self.gas_total + other.gas_total
+        out.gas_gallons = self.gas_gallons + other.gas_gallons
+        out.gas_price_sum = self.gas_price_sum + other.gas_price_sum
+        out.gas_locations = self.gas_locations | other.gas_locations
+        out.gas_monthly = _add_counts(self.gas_monthly, other.gas_monthly)
+        out.gas_daily = _add_counts(self.gas_daily, other.gas_daily)
+        out.fuel = fuel.merge_partials(self.fuel, other.fuel)
+        out.cube_receipts = cube.merge_partials(self.cube_receipts, other.cube_receipts)
+        out.cube_departments = cube.merge_partials(self.cube_departments, other.cube_departments)
+        out.merch_timeline = self.merch_timeline.merge(other.merch_timeline)
+        out.gas_timeline = self.gas_timeline.merge(other.gas_timeline)
+
+        out.min_date = _min_date(self.min_date, other.min_date)
+        out.max_date = _max_date(self.max_date, other.max_date)
+        return out
+
+    # ------------------------------------------------------------
+    # Final pass: the merch / gas dicts the dashboard reads
+    # ------------------------------------------------------------
+    def finalize(self):
+        with profiler.stage("item stats", rows=len(self.items)):
+            item_stats = _item_stats(self.items)
+        merch_cube, gas_cube = cube.split(self.cube_receipts, self.cube_departments)
+        merch = {
+            "item_stats": item_stats,
+            "monthly": {k: {"spent": v} for k, v in sorted(self.merch_monthly.items())},
+            "daily": dict(sorted(self.merch_daily.items())),
+            "subtotal_by_year": dict(sorted(self.subtotal_by_year.items())),
+            "total_spent": self.merch_total,
+            "total_units": self.merch_units,
+            "refund_count": self.refund_count,
+            "refund_total": self.refund_total,
+            "locations": set(self.merch_locations),
+            "Total Savings": self.savings,
+            "count": self.merch_count,
+            "cube": merch_cube,
+            "timeline": self.merch_timeline,
+        }
+        gas = {
+            "monthly": {k: {"spent": v} for k, v in sorted(self.gas_monthly.items())},
+            "daily": dict(sorted(self.gas_daily.items())),
+            "total_spent": self.gas_total,
+            "total_gallons": self.gas_gallons,
+            "price_sum": self.gas_price_sum,  # weighted (price * gallons)
+            "count": self.gas_count,
+            "locations": set(self.gas_locations),
+            "fuel": self.fuel,
+            "cube": gas_cube,
+            "timeline": self.gas_timeline,
+        }
+        all_locations = set(self.merch_locations | self.gas_locations)
+
+        # date range string for header
+        if self.min_date is not None:
+            min_d, max_d = self.min_date, self.max_date
+            if min_d.year == max_d.year:
+                date_range_str = str(min_d.year)
+            else:
+                date_range_str = f"{min_d.year} – {max_d.year}"
+        else:
+            date_range_str = "Waiting for file..."
+
+        return merch, gas, all_locations, date_range_str
+
+
+def merge_all(aggs):
+    """Pairwise (tree) reduction, so no single merge ever sees all shards at once."""
+    aggs = list(aggs)
+    if not aggs:
+        return ReceiptAggregate()
+    while len(aggs) > 1:
+        pairs = [aggs[i].merge(aggs[i + 1]) for i in range(0, len(aggs) - 1, 2)]
+        if len(aggs) % 2:
+            pairs.append(aggs[-1])
+        aggs = pairs
+    return aggs[0]
+
+
+# ------------------------------------------------------------
+# Group-by helpers
+# ------------------------------------------------------------
+def _item_partials(items_df):
+    """itemNumber -> partial stat (sums + date-sorted price run); also returns total units."""
+    valid = items_df[
+        items_df["itemNumber"].notna()
+        & (items_df["itemNumber"] != "")
+        & (items_df["unit"] > 0)
+        & (items_df["amount"] > 0)
+    ]
+    if valid.empty:
+        return {}, 0.0
+
+    codes, keys = pd.factorize(valid["itemNumber"], sort=False)
+    unit = valid["unit"].to_numpy()
+    amount = valid["amount"].to_numpy()
+    price = amount / unit
+    dates = valid["date"].to_numpy()
+    n_items = len(keys)
+
+    # whole cents add up exactly in float64 (below 2**53)
+    total_spent = np.bincount(codes, weights=amount, minlength=n_items).astype(np.int64)
+    total_units = np.bincount(codes, weights=unit, minlength=n_items)
+    purchases = np.bincount(codes, minlength=n_items)
+    _, first_idx = np.unique(codes, return_index=True)
+    names = [str(v).strip() if isinstance(v, str) else "" for v in valid["itemDescription01"].to_numpy()[first_idx]]
+
+    # lexsort is stable: same-day purchases keep receipt order
+    order = np.lexsort((dates, codes))
+    sorted_price = price[order]
+    sorted_dates = dates[order]
+    ends = np.cumsum(purchases)
+    starts = ends - purchases
+    min_price = np.minimum.reduceat(sorted_price, starts).tolist()
+    max_price = np.maximum.reduceat(sorted_price, starts).tolist()
+
+    items = {}
+    for i, item_no in enumerate(keys):
+        s, e = starts[i], ends[i]
+        items[item_no] = {
+            "itemNumber": item_no,
+            "name": names[i],
+            "total_spent": int(total_spent[i]),
+            "total_units": float(total_units[i]),
+            "purchases": int(purchases[i]),
+            "history": PriceHistory(sorted_dates[s:e], sorted_price[s:e], min_price[i], max_price[i]),
+        }
+    return items, float(unit.sum())
+
+
+def _item_stats(items):
+    """Partial item stats -> the dashboard's item_stats (price_history + first/last/min/max)."""
+    item_stats = {}
+    for p in items.values():
+        history = p["history"]
+        item_stats[p["itemNumber"]] = {
+            "itemNumber": p["itemNumber"],
+            "name": p["name"],
+            "total_spent": p["total_spent"],
+            "total_units": p["total_units"],
+            "purchases": p["purchases"],
+            "price_history": history,
+            "first_price": history.first_price,
+            "last_price": history.last_price,
+            "max_price": history.max_price,
+            "min_price": history.min_price,
+        }
+    return item_stats
@@ -0,0 +1,209 @@
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+import charts
+import leaderboards
+import pipeline
+import synthetic
+
+
+# ------------------------------------------------------------
+# Benchmarks on synthetic receipts
+# ------------------------------------------------------------
+# Times the stages a dashboard load goes through - process_receipts, the ranked
+# item tables, the chart time series and a sidebar filter change (answered from
+# the pre-aggregated cube) - at several dataset sizes, with throughput
+# (receipts per second) and peak traced memory per stage.
+#
+#   python benchmark.py                          # 1k / 100k / 1M receipts
+#   python benchmark.py --sizes 1000 100000 --output ../bench_output.txt
+#
+# Peak memory comes from a second, traced run of each stage (tracemalloc slows
+# Python code down, so it never overlaps with the timed runs); --no-memory skips it.
+#
+# To catch regressions, save a run on a given machine and compare later runs with it:
+#
+#   python benchmark.py --sizes 1000 100000 --repeat 3 --output baseline.jsonl
+#   python benchmark.py --sizes 1000 100000 --repeat 3 --baseline baseline.jsonl
+#
+# The second run exits with status 1 if a stage took more than --tolerance (50%)
+# longer, or peaked higher, than in the baseline. Differences under --slack
+# seconds / MiB are ignored, so millisecond stages don't flap.
+# process_receipts streams (see engine.stream_aggregate), but the generated
+# receipts are held in a list for the timed runs, so 1M receipts with the full
+# downloader schema still needs a machine with plenty of RAM.
+
+SIZES = (1_000, 100_000, 1_000_000)
+TOLERANCE = 0.5
+SLACK = 0.05    # seconds, and MiB for peak memory
+
+
+def _measure(fn, repeat=1, memory=True):
+    """(result, best wall seconds, peak traced bytes or None)."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        result = None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, best, peak
+
+
+def _price_history_frames(item_stats):
+    return [s["price_history"].to_frame() for s in item_stats.values()]
+
+
+def _filtered_views(merch, gas):
+    """A sidebar filter change: one warehouse, the middle half of the months, then one department on top."""
+    cube = merch["cube"]
+    if not len(cube.months):
+        return None
+    months = (cube.months[len(cube.months) // 4], cube.months[3 * len(cube.months) // 4])
+    warehouses = list(cube.warehouse_names())[:1]
+    pipeline.apply_filters(merch, gas, months=months, warehouses=warehouses)
+    return pipeline.apply_filters(merch, gas, months=months, warehouses=warehouses,
+                                  departments=list(cube.departments[:1]))
+
+
+def _date_windows(merch, gas):
+    """Every preset window on the KPIs tab plus the same window a year earlier."""
+    _, last = pipeline.timeline_bounds(merch, gas)
+    if last is None:
+        return None
+    out = []
+    for days in pipeline.WINDOWS.values():
+        start, end = pipeline.last_days(last, days)
+        out.append(pipeline.window_kpis(merch, gas, start, end))
+        out.append(pipeline.window_kpis(merch, gas, *pipeline.year_earlier(start, end)))
+    return out
+
+
+def run_size(n, repeat=1, memory=True, **gen_options):
+    """Benchmark every stage on `n` synthetic receipts; returns one result dict per stage."""
+    results = []
+
+    def record(stage, fn):
+        value, seconds, peak = _measure(fn, repeat, memory)
+        results.append({
+            "receipts": n,
+            "stage": stage,
+            "seconds": seconds,
+            "receipts_per_sec": n / seconds if seconds > 0 else None,
+            "peak_mib": peak / (1 << 20) if peak is not None else None,
+        })
+        return value
+
+    receipts = record("generate", lambda: list(synthetic.generate_receipts(n, **gen_options)))
+    merch, gas, _, _ = record("process_receipts", lambda: pipeline.process_receipts(receipts))
+    del receipts
+    record("leaderboards", lambda: leaderboards.rank(merch["item_stats"]))
+    record("chart_series", lambda: charts.build_series(merch, gas))
+    record("price_history_frames", lambda: _price_history_frames(merch["item_stats"]))
+    record("cube_filters", lambda: _filtered_views(merch, gas))
+    record("date_windows", lambda: _date_windows(merch, gas))
+    for r in results:
+        r["items"] = len(merch["item_stats"])
+    return results
+
+
+def _fmt(r):
+    rate = f"{r['receipts_per_sec']:>14,.0f}" if r["receipts_per_sec"] else f"{'-':>14}"
+    peak = f"{r['peak_mib']:>10,.1f}" if r["peak_mib"] is not None else f"{'-':>10}"
+    return f"{r['receipts']:>10,} {r['stage']:<22} {r['seconds']:>10.3f} {rate} {peak}"
+
+
+def load_baseline(path):
+    """{(receipts, stage): result} from a file written by --output (the last run of each wins)."""
+    baseline = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                r = json.loads(line)
+                baseline[(r["receipts"], r["stage"])] = r
+    return baseline
+
+
+def regressions(results, baseline, tolerance=TOLERANCE, slack=SLACK):
+    """Messages for every stage slower (or peaking higher) than its baseline by more than `tolerance`."""
+    out = []
+    for r in results:
+        base = baseline.get((r["receipts"], r["stage"]))
+        if base is None:
+            continue
+        for field, unit in (("seconds", "s"), ("peak_mib", " MiB")):
+            now, then = r.get(field), base.get(field)
+            if now is None or then is None:
+                continue
+            if now > then * (1 + tolerance) and now - then > slack:
+                out.append(f"{r['receipts']:,} {r['stage']}: {field} {now:.3f}{unit} vs {then:.3f}{unit} "
+                           f"(+{(now / then - 1) * 100 if then else float('inf'):.0f}%)")
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark receipt processing on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per stage (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced peak-memory runs")
+    parser.add_argument("--items", type=int, default=8)
+    parser.add_argument("--gas-ratio", type=float, default=0.2)
+    parser.add_argument("--refund-ratio", type=float, default=0.02)
+    parser.add_argument("--distinct-items", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also append results here, one JSON object per line")
+    parser.add_argument("--baseline", help="compare with results saved by --output; exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed slowdown / memory growth vs the baseline (default %(default)s = 50%%)")
+    parser.add_argument("--slack", type=float, default=SLACK,
+                        help="ignore differences below this many seconds / MiB (default %(default)s)")
+    args = parser.parse_args(argv)
+    baseline = load_baseline(args.baseline) if args.baseline else None
+
+    gen_options = {
+        "items_per_receipt": args.items,
+        "gas_ratio": args.gas_ratio,
+        "refund_ratio": args.refund_ratio,
+        "distinct_items": args.distinct_items,
+        "seed": args.seed,
+    }
+    print(f"{'receipts':>10} {'stage':<22} {'seconds':>10} {'receipts/s':>14} {'peak MiB':>10}")
+    slower = []
+    for n in args.sizes:
+        results = run_size(n, repeat=args.repeat, memory=not args.no_memory, **gen_options)
+        for r in results:
+            print(_fmt(r), flush=True)
+        if args.output:
+            with open(args.output, "a", encoding="utf-8") as out:
+                for r in results:
+                    out.write(json.dumps({**r, **gen_options}) + "\n")
+        if baseline is not None:
+            slower += regressions(results, baseline, args.tolerance, args.slack)
+        gc.collect()
+
+    if baseline is not None:
+        if slower:
+            print(f"\n{len(slower)} regression(s) vs {args.baseline}:", *slower, sep="\n  ")
+            return 1
+        print(f"\nNo regressions vs {args.baseline} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
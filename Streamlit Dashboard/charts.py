@@ -0,0 +1,147 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import fuel
+import money
+
+
+# ------------------------------------------------------------
+# Chart-ready time series
+# ------------------------------------------------------------
+# The frames behind the Altair charts, built from the daily series in the merch /
+# gas dicts (see ReceiptAggregate.finalize). Every granularity is built in one go:
+# rows are dense (empty periods included), sorted, and labelled once per period,
+# so switching granularity is a dict lookup. Kept out of streamlit_app.py so they
+# can be benchmarked on their own. The series are in cents; the frames are in
+# dollars, for the chart axes and tooltips.
+
+# label -> pandas period frequency
+GRANULARITIES = {"Day": "D", "Week": "W", "Month": "M", "Quarter": "Q", "Year": "Y"}
+DEFAULT_GRANULARITY = "Month"
+# what a month-level series (e.g. filtered through the cube) can be shown at
+MONTHLY_GRANULARITIES = ("Month", "Quarter", "Year")
+
+LABEL_FORMATS = {
+    "Day": "%b %d '%y",
+    "Week": "Wk of %b %d '%y",
+    "Month": "%b '%y",
+    "Quarter": "Q%q '%y",
+    "Year": "%Y",
+}
+
+def month_label_from_key(month_key: str) -> str:
+    """month_key is 'YYYY-MM' -> 'Mon 'YY' """
+    dt = datetime.strptime(month_key + "-01", "%Y-%m-%d")
+    return dt.strftime("%b '%y")
+
+
+def _periodize(daily, freq):
+    """{'YYYY-MM-DD': value or {field: value}} -> per-period sums over every period in range."""
+    frame = pd.DataFrame.from_dict(daily, orient="index", dtype=float)
+    if frame.empty:
+        return frame
+    periods = pd.to_datetime(frame.index, format="%Y-%m-%d").to_period(freq)
+    sums = frame.groupby(periods, sort=True).sum()
+    full = pd.period_range(sums.index.min(), sums.index.max(), freq=freq)
+    return sums.reindex(full, fill_value=0.0)
+
+
+def _period_columns(periods, granularity):
+    """(period_key, period label) arrays; formatted once per period, not per row."""
+    starts = periods.start_time
+    keys = starts.strftime("%Y-%m-%d")
+    fmt = LABEL_FORMATS[granularity]
+    labels = periods.strftime(fmt) if "%q" in fmt else starts.strftime(fmt)
+    return keys.to_numpy(dtype=object), labels.to_numpy(dtype=object)
+
+
+def spend_frame(daily, granularity=DEFAULT_GRANULARITY):
+    """{'YYYY-MM-DD': spent} -> period_key / period / total, oldest first."""
+    sums = _periodize(daily, GRANULARITIES[granularity])
+    if sums.empty:
+        return pd.DataFrame(columns=["period_key", "period", "total"])
+    keys, labels = _period_columns(sums.index, granularity)
+    return pd.DataFrame({"period_key": keys, "period": labels, "total": money.dollars(sums.iloc[:, 0].to_numpy())})
+
+
+def _fuel_sums(fuel_df, granularity, by):
+    """Fuel rows -> (spend / gallons per (period, *by), every period in range, its keys, its labels)."""
+    periods = pd.PeriodIndex(pd.DatetimeIndex(fuel_df["date"]), freq=GRANULARITIES[granularity])
+    sums = fuel_df.groupby([periods] + [fuel_df[c] for c in by], sort=True)[["spend", "gallons"]].sum()
+    full = pd.period_range(periods.min(), periods.max(), freq=periods.freq)
+    keys, labels = _period_columns(full, granularity)
+    return sums, full, keys, labels
+
+
+def _price(sums):
+    """$/gal from spend in cents and gallons (NaN without gallons)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(sums["gallons"] > 0, money.dollars(sums["spend"] / sums["gallons"]), np.nan)
+
+
+def gas_grade_frames(fuel_df, granularity=DEFAULT_GRANULARITY):
+    """
+    (price, spend) long frames, one series per fuel grade (see fuel.py):
+    price: period_key / period / grade / price ($/gal; periods without that grade are left out)
+    spend: period_key / period / grade ("<grade> Spend") / spend, every period for every grade
+    """
+    if fuel_df.empty:
+        return (pd.DataFrame(columns=["period_key", "period", "grade", "price"]),
+                pd.DataFrame(columns=["period_key", "period", "grade", "spend"]))
+    sums, full, keys, labels = _fuel_sums(fuel_df, granularity, ["grade"])
+    grades = fuel.order(sums.index.get_level_values(1))
+    # period x grade grids, one column per grade in display order
+    spent = sums["spend"].unstack(fill_value=0.0).reindex(index=full, columns=grades, fill_value=0.0)
+    gallons = sums["gallons"].unstack(fill_value=0.0).reindex(index=full, columns=grades, fill_value=0.0)
+    n, k = len(keys), len(grades)
+
+    # price rows interleave per period (grades in display order); spend is one block per grade
+    price = pd.DataFrame({
+        "period_key": np.repeat(keys, k),
+        "period": np.repeat(labels, k),
+        "grade": np.tile(np.array(grades, dtype=object), n),
+        "price": _price({"spend": spent.to_numpy().ravel(), "gallons": gallons.to_numpy().ravel()}),
+    }).dropna(subset=["price"]).reset_index(drop=True)
+    spend = pd.DataFrame({
+        "period_key": np.tile(keys, k),
+        "period": np.tile(labels, k),
+        "grade": np.repeat(np.array([f"{g} Spend" for g in grades], dtype=object), n),
+        "spend": money.dollars(spent.to_numpy().T.ravel()),
+    })
+    return price, spend
+
+
+def station_price_frame(fuel_df, granularity=DEFAULT_GRANULARITY):
+    """period_key / period / station / grade / price ($/gal) for every station and grade that sold fuel."""
+    if fuel_df.empty:
+        return pd.DataFrame(columns=["period_key", "period", "station", "grade", "price"])
+    sums, full, keys, labels = _fuel_sums(fuel_df, granularity, ["station", "grade"])
+    at = full.get_indexer(sums.index.get_level_values(0))
+    frame = pd.DataFrame({
+        "period_key": keys[at],
+        "period": labels[at],
+        "station": sums.index.get_level_values(1).to_numpy(dtype=object),
+        "grade": sums.index.get_level_values(2).to_numpy(dtype=object),
+        "price": _price(sums),
+    })
+    return frame.dropna(subset=["price"]).reset_index(drop=True)
+
+
+def build_series(merch, gas):
+    """
+    {granularity: {"merch_spend", "gas_spend", "gas_price", "gas_grade_spend", "station_price"}}
+    for every granularity.
+    """
+    series = {}
+    for granularity in GRANULARITIES:
+        gas_price, gas_grade_spend = gas_grade_frames(gas["fuel"], granularity)
+        series[granularity] = {
+            "merch_spend": spend_frame(merch["daily"], granularity),
+            "gas_spend": spend_frame(gas["daily"], granularity),
+            "gas_price": gas_price,
+            "gas_grade_spend": gas_grade_spend,
+            "station_price": station_price_frame(gas["fuel"], granularity),
+        }
+    return series
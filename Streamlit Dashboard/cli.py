@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import engine
+import money
+import pipeline
+import profiler
+import store
+
+
+# ------------------------------------------------------------
+# Headless batch mode
+# ------------------------------------------------------------
+# Summarise receipt exports without starting Streamlit:
+#
+#   python cli.py export-2024.json export-2025.json --out summary/
+#   python cli.py --store ~/.costco/receipts.db --out summary/ --format parquet
+#   python cli.py --fetch 01/01/2023 12/31/2025 --out summary/   # straight from the API (fetch.py)
+#
+# Writes kpis.json plus monthly and items tables (JSON records or Parquet), with
+# money in dollars.
+# --trace run.json also writes a per-stage timing trace (chrome://tracing format).
+
+
+def _in_dollars(df):
+    # money columns (spend / spent / price) are cents until written out
+    for column in df.columns:
+        if column.endswith(("_spent", "_spend", "_price")):
+            df[column] = money.dollars(df[column])
+    return df
+
+
+def _write_table(df, path, fmt):
+    if fmt == "parquet":
+        try:
+            df.to_parquet(path, index=False)
+        except ImportError as e:
+            raise SystemExit(f"Parquet output needs pyarrow (pip install pyarrow): {e}")
+    else:
+        df.to_json(path, orient="records", date_format="iso", indent=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise Costco receipt exports without the dashboard.")
+    parser.add_argument("files", nargs="*", help="receipt exports (.json, .ndjson, .gz / .zst, .parquet)")
+    parser.add_argument("--store", help="read receipts from this SQLite receipt store instead of files")
+    parser.add_argument("--fetch", nargs=2, metavar=("START", "END"),
+                        help="download receipts for this date range instead (see fetch.py)")
+    parser.add_argument("--url", help="GraphQL endpoint for --fetch (default: Costco's, see fetch.py)")
+    parser.add_argument("--out", default="summary", help="output directory (default: summary)")
+    parser.add_argument("--format", choices=("json", "parquet"), default="json", help="format of the tables")
+    parser.add_argument("--trace", help="write a per-stage timing trace (Chrome trace JSON) to this file")
+    args = parser.parse_args(argv)
+
+    if not args.files and not args.store and not args.fetch:
+        parser.error("give one or more JSON files, --store or --fetch")
+
+    if args.trace:
+        with profiler.profile("cli") as prof:
+            _run(args)
+        with open(args.trace, "w", encoding="utf-8") as out:
+            out.write(prof.to_trace())
+    else:
+        _run(args)
+
+
+def _run(args):
+    start = time.perf_counter()
+    try:
+        if args.store:
+            if not os.path.exists(os.path.expanduser(args.store)):
+                raise SystemExit(f"No receipt store at {args.store}")
+            receipt_store = store.open_store(args.store)
+            agg = engine.aggregate_receipts(receipt_store.iter_receipts())
+        elif args.fetch:
+            import fetch    # only --fetch needs aiohttp; file and store runs don't pay for loading it
+            # months are aggregated as they arrive, while later ones are still downloading
+            try:
+                agg = engine.aggregate_receipts(fetch.iter_receipts(*args.fetch, url=args.url or fetch.ENDPOINT))
+            except fetch.FetchError as e:
+                raise SystemExit(str(e))
+        else:
+            agg = pipeline.aggregate_files(args.files)
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    with profiler.stage("finalize"):
+        merch, gas, all_locations, date_range_str = agg.finalize()
+
+    os.makedirs(args.out, exist_ok=True)
+    ext = "parquet" if args.format == "parquet" else "json"
+    summary = pipeline.kpis(merch, gas, all_locations, date_range_str)
+    summary.update({k: money.dollars(summary[k]) for k in pipeline.MONEY_KPIS})
+    rewards, _ = pipeline.executive_rewards(merch["subtotal_by_year"])
+    summary["executive_rewards"] = [
+        dict(row, **{k: money.dollars(row[k]) for k in ("Qualifying Spend", "2% Cashback")}) for row in rewards
+    ]
+    with open(os.path.join(args.out, "kpis.json"), "w", encoding="utf-8") as out:
+        json.dump(summary, out, indent=1)
+    with profiler.stage("write tables"):
+        _write_table(_in_dollars(pipeline.monthly_frame(merch, gas)), os.path.join(args.out, f"monthly.{ext}"), args.format)
+        _write_table(_in_dollars(pipeline.item_frame(merch["item_stats"])), os.path.join(args.out, f"items.{ext}"), args.format)
+
+    print(
+        f"{merch['count'] + gas['count']:,} receipts, {summary['unique_items']:,} items "
+        f"({date_range_str}) -> {args.out}/ in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
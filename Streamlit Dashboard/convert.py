@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import time
+
+import ingest
+
+
+# ------------------------------------------------------------
+# Convert receipt exports between upload formats
+# ------------------------------------------------------------
+# The output format follows the file name (see ingest.write_receipts):
+#
+#   python convert.py costco-2023-2025.json costco-2023-2025.json.gz     # ~10x smaller upload
+#   python convert.py costco-2023-2025.json costco-2023-2025.parquet     # flattened line items
+#   python convert.py a.json b.json.gz costco.ndjson                     # several exports into one
+#
+# Receipts found in several inputs are written once.
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert Costco receipt exports between upload formats.")
+    parser.add_argument("inputs", nargs="+", help="exports in any format the dashboard accepts")
+    parser.add_argument("output", help=".json, .ndjson / .jsonl, .parquet; add .gz or .zst to compress")
+    args = parser.parse_args(argv)
+
+    def receipts():
+        for path in args.inputs:
+            with open(path, "rb") as f:
+                try:
+                    yield from ingest.iter_upload(f)
+                except ValueError as e:
+                    raise ValueError(f"Invalid receipt file {path}: {e}") from e
+
+    start = time.perf_counter()
+    written = 0
+
+    def counted(it):
+        nonlocal written
+        for rec in it:
+            written += 1
+            yield rec
+
+    try:
+        ingest.write_receipts(args.output, counted(ingest.unique_receipts(receipts())))
+    except (OSError, ValueError) as e:
+        raise SystemExit(str(e))
+    size_in = sum(os.path.getsize(p) for p in args.inputs)
+    size_out = os.path.getsize(args.output)
+    print(
+        f"{written:,} receipts, {size_in / 2**20:,.1f} MB -> {size_out / 2**20:,.1f} MB "
+        f"({args.output}) in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+
+
+# ------------------------------------------------------------
+# Pre-aggregated filter cube
+# ------------------------------------------------------------
+# Two small tables of sums, one row per combination of their dimensions:
+#   receipt cube    -> (month_key, warehouseNumber, location, is_gas): receipt totals,
+#                      trips, refunds, savings, subtotal and gas gallons
+#   department cube -> the same plus itemDepartmentNumber: line-item spend, units,
+#                      instant-savings lines and refunded lines
+# Receipt totals (tax, instantSavings, trips) have no department, so a department
+# filter switches to the line-item measures. Both tables are plain sums, so shards
+# merge by adding rows (see ReceiptAggregate.merge), and slicing a finished Cube
+# by months / warehouses / departments is a mask and a few bincounts - no receipt
+# is looked at again. Money measures are int64 cents (see money.py) and stay
+# integers through every merge and selection.
+
+RECEIPT_DIMENSIONS = ("month_key", "warehouseNumber", "location", "is_gas")
+DEPARTMENT_DIMENSIONS = RECEIPT_DIMENSIONS + ("department",)
+
+RECEIPT_MEASURES = (
+    "trips", "spend", "subtotal", "savings", "refund_count", "refund_total",
+    "gallons", "price_sum",
+)
+# trips: receipts with a line in that department (a receipt counts once per department)
+DEPARTMENT_MEASURES = ("trips", "spend", "units", "savings", "refund_count", "refund_total")
+MONEY_MEASURES = frozenset(("spend", "subtotal", "savings", "refund_total"))
+
+
+def _codes(values, text=False):
+    """(codes, labels) for a dimension column; text=True labels as str ('' when missing)."""
+    codes, uniques = pd.factorize(np.asarray(values), sort=False)
+    uniques = list(uniques)
+    missing = codes < 0
+    if missing.any():
+        codes[missing] = len(uniques)
+        uniques.append(None)
+    if text:
+        uniques = ["" if pd.isna(v) else str(v).strip() for v in uniques]
+    return codes, np.array(uniques, dtype=object)
+
+
+def _sums(codes, values, n):
+    """Sum values per code; integer (cents) columns come back as int64."""
+    sums = np.bincount(codes, weights=values, minlength=n)
+    # whole cents add up exactly in float64 (below 2**53)
+    return sums.astype(np.int64) if values.dtype.kind in "iu" else sums
+
+
+def _group(dims, measures):
+    """Sum `measures` per distinct combination of `dims` ({name: (codes, labels)}) -> DataFrame."""
+    codes = [c for c, _ in dims.values()]
+    sizes = [max(len(u), 1) for _, u in dims.values()]
+    if len(codes[0]) == 0:
+        return _empty(tuple(dims), tuple(measures))
+    cell, first = pd.factorize(np.ravel_multi_index(codes, sizes), sort=False)
+    cells = np.unravel_index(first, sizes)
+    n = len(first)
+    frame = {name: u[c] for (name, (_, u)), c in zip(dims.items(), cells)}
+    for name, values in measures.items():
+        frame[name] = _sums(cell, np.asarray(values), n)
+    return pd.DataFrame(frame)
+
+
+def _empty(dims, measures):
+    frame = {d: pd.Series(dtype=bool if d == "is_gas" else object) for d in dims}
+    frame.update({m: pd.Series(dtype=np.int64 if m in MONEY_MEASURES else float) for m in measures})
+    return pd.DataFrame(frame)
+
+
+def empty_partials():
+    return _empty(RECEIPT_DIMENSIONS, RECEIPT_MEASURES), _empty(DEPARTMENT_DIMENSIONS, DEPARTMENT_MEASURES)
+
+
+def partials(receipts_df, items_df):
+    """(receipt cube, department cube) for one shard of the columnar tables (see engine._flatten_batch)."""
+    n = len(receipts_df)
+    pos = pd.Index(receipts_df["rid"]).get_indexer(items_df["rid"])
+    # receipt dimensions are coded once; line items pick theirs up through `pos`
+    month = _codes(receipts_df["month_key"])
+    warehouse = _codes(receipts_df["warehouseNumber"], text=True)
+    location = _codes(receipts_df["location"])
+    is_gas = _codes(receipts_df["is_gas"])
+    total = receipts_df["total"].to_numpy()
+    refund = (total < 0) | (receipts_df["transactionType"] == "Refund").to_numpy()
+
+    item_no = items_df["itemNumber"].to_numpy()
+    amount = items_df["amount"].to_numpy()
+    unit = items_df["unit"].to_numpy()
+    qty = items_df["fuelUnitQuantity"].to_numpy()
+    item_gas = items_df["is_gas"].to_numpy()
+
+    # same rules as ReceiptAggregate.from_tables: fuel lines on gas receipts
+    # (per-grade sums live in the fuel table, see fuel.py)
+    gas_lines = np.flatnonzero(item_gas)
+    gas_pos = pos[gas_lines]
+    gas_qty = qty[gas_lines]
+    fuel = np.where(gas_qty > 0, gas_qty, 0.0)
+
+    def per_receipt(weights):
+        return np.bincount(gas_pos, weights=weights, minlength=n)
+    receipts = _group(
+        {"month_key": month, "warehouseNumber": warehouse, "location": location, "is_gas": is_gas},
+        {
+            "trips": np.ones(n),
+            "spend": total,
+            "subtotal": receipts_df["subTotal"].to_numpy(),
+            "savings": receipts_df["instantSavings"].to_numpy(),
+            "refund_count": refund.astype(float),
+            "refund_total": np.where(refund, np.abs(total), 0),
+            "gallons": per_receipt(fuel),
+            "price_sum": per_receipt(fuel * items_df["itemUnitPriceAmount"].to_numpy()[gas_lines]),
+        },
+    )
+
+    department = _codes(items_df["itemDepartmentNumber"], text=True)
+    valid = (unit > 0) & (amount > 0)
+    valid[valid] = item_no[valid].astype(bool)  # None / "" item numbers don't count
+    # instant savings print as their own negative line, described "/<itemNumber>";
+    # the prefix test runs once per distinct description of a negative line
+    negative = np.flatnonzero(amount < 0)
+    desc_codes, descs = pd.factorize(items_df["itemDescription01"].to_numpy()[negative])
+    slash = np.array([isinstance(d, str) and d.startswith("/") for d in descs] + [False])
+    discount = np.zeros(len(amount), dtype=bool)
+    discount[negative] = slash[desc_codes]
+    returned = refund[pos] & (amount < 0) & ~discount
+    first_in_dept = ~pd.Series(pos * max(len(department[1]), 1) + department[0]).duplicated().to_numpy()
+    departments = _group(
+        {
+            "month_key": (month[0][pos], month[1]),
+            "warehouseNumber": (warehouse[0][pos], warehouse[1]),
+            "location": (location[0][pos], location[1]),
+            "is_gas": (is_gas[0][pos], is_gas[1]),
+            "department": department,
+        },
+        {
+            "trips": first_in_dept.astype(float),
+            "spend": amount,
+            "units": np.where(valid, unit, 0.0),
+            "savings": np.where(discount, -amount, 0),
+            "refund_count": returned.astype(float),
+            "refund_total": np.where(returned, -amount, 0),
+        },
+    )
+    return receipts, departments
+
+
+def merge_partials(a, b):
+    """Add two shards' cube tables (same dimensions -> one row)."""
+    if a.empty:
+        return b
+    if b.empty:
+        return a
+    both = pd.concat([a, b], ignore_index=True)
+    dims = [c for c in both.columns if c in DEPARTMENT_DIMENSIONS]
+    return _group({d: _codes(both[d]) for d in dims},
+                  {m: both[m].to_numpy() for m in both.columns if m not in dims})
+
+
+# ------------------------------------------------------------
+# Finished cube (one per merch / gas)
+# ------------------------------------------------------------
+class _Table:
+    """One cube table as integer-coded dimension columns + measure columns (int64 cents or float)."""
+
+    __slots__ = ("month", "warehouse", "location", "department", "measures")
+
+    def __init__(self, frame, months, warehouses, locations, departments=None):
+        self.month = np.searchsorted(months, frame["month_key"].to_numpy(dtype=object))
+        self.warehouse = np.searchsorted(warehouses, frame["warehouseNumber"].to_numpy(dtype=object))
+        self.location = np.searchsorted(locations, frame["location"].to_numpy(dtype=object))
+        self.department = (np.searchsorted(departments, frame["department"].to_numpy(dtype=object))
+                           if departments is not None else None)
+        self.measures = {m: frame[m].to_numpy(dtype=np.int64 if m in MONEY_MEASURES else float)
+                         for m in frame.columns if m not in DEPARTMENT_DIMENSIONS}
+
+
+def _labels(*columns):
+    return np.array(sorted(set().union(*map(set, columns))), dtype=object)
+
+
+class Cube:
+    """
+    Pre-aggregated sums for one side (merch or gas). select() answers any combination of
+    month range / warehouses / departments from the cube alone.
+    """
+
+    __slots__ = ("months", "warehouses", "locations", "departments", "names", "receipts", "items")
+
+    def __init__(self, receipt_frame, department_frame):
+        self.months = _labels(receipt_frame["month_key"], department_frame["month_key"])
+        self.warehouses = _labels(receipt_frame["warehouseNumber"], department_frame["warehouseNumber"])
+        self.locations = _labels(receipt_frame["location"], department_frame["location"])
+        self.departments = _labels(department_frame["department"])
+        self.names = dict(zip(receipt_frame["warehouseNumber"], receipt_frame["location"]))
+        self.receipts = _Table(receipt_frame, self.months, self.warehouses, self.locations)
+        self.items = _Table(department_frame, self.months, self.warehouses, self.locations, self.departments)
+
+    def warehouse_names(self):
+        """{warehouseNumber: location name} for the warehouse picker."""
+        return dict(sorted(self.names.items(), key=lambda kv: kv[1]))
+
+    def _mask(self, table, months, warehouses, departments):
+        mask = np.ones(len(table.month), dtype=bool)
+        if months is not None:
+            lo = np.searchsorted(self.months, months[0], side="left")
+            hi = np.searchsorted(self.months, months[1], side="right")
+            mask &= (table.month >= lo) & (table.month < hi)
+        if warehouses is not None:
+            mask &= np.isin(self.warehouses, list(warehouses))[table.warehouse]
+        if departments is not None:
+            mask &= np.isin(self.departments, list(departments))[table.department]
+        return mask
+
+    def select(self, months=None, warehouses=None, departments=None, lines=False):
+        """
+        Sums over the selected cells. months is an inclusive ('YYYY-MM', 'YYYY-MM') range;
+        warehouses / departments are collections of labels; None means no filter.
+        Returns (totals {measure: sum}, per-month {month_key: {measure: sum}}, locations set).
+        lines=True, implied by departments, sums the line-item table (DEPARTMENT_MEASURES).
+        """
+        table = self.items if lines or departments is not None else self.receipts
+        mask = self._mask(table, months, warehouses, departments)
+        codes = table.month[mask]
+        n = len(self.months)
+        by_month = {m: _sums(codes, v[mask], n) for m, v in table.measures.items()}
+        present = np.bincount(codes, minlength=n) > 0
+        totals = {m: v.sum().item() for m, v in by_month.items()}
+        monthly = {
+            self.months[i]: {m: v[i].item() for m, v in by_month.items()}
+            for i in np.flatnonzero(present)
+        }
+        locations = set(self.locations[np.unique(table.location[mask])])
+        return totals, monthly, locations
+
+
+def split(receipt_frame, department_frame):
+    """Merged cube tables -> (merch Cube, gas Cube)."""
+    r_gas = receipt_frame["is_gas"].to_numpy(dtype=bool)
+    d_gas = department_frame["is_gas"].to_numpy(dtype=bool)
+    return (Cube(receipt_frame[~r_gas], department_frame[~d_gas]),
+            Cube(receipt_frame[r_gas], department_frame[d_gas]))
@@ -0,0 +1,237 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from aggregates import FORMAT_VERSION, PriceHistory, ReceiptAggregate
+from timeline import Timeline
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # optional: without pyarrow every load simply reprocesses
+    pa = None
+
+
+# ------------------------------------------------------------
+# On-disk cache of processed uploads (Arrow IPC, memory-mapped)
+# ------------------------------------------------------------
+# One directory per dataset fingerprint (see helper.dataset_fingerprint) holding
+# the ReceiptAggregate as Arrow IPC files:
+#   items.arrow    -> one row per item: sums, purchase count, min / max price
+#   history.arrow  -> every merch purchase (date, unit price), grouped by item in
+#                     items.arrow order - the line-item part of the aggregate
+#   series.arrow   -> monthly / daily / yearly totals, one row per (series, key)
+#   cube_*.arrow, fuel.arrow, *_timeline.arrow -> the filter cube, fuel table and
+#                     date-window totals
+#   meta.json      -> counts, totals, locations and the date range
+# Files are opened with a memory map, so the price histories are zero-copy views
+# of the page cache: a restarted server, or another worker on the same host,
+# reopens a dataset in milliseconds instead of parsing its JSON again.
+#
+# Opt-in via $COSTCO_CACHE_DIR and needs pyarrow. Directories carry
+# FORMAT_VERSION, so a layout change just misses and rebuilds.
+
+CACHE_ENV_VAR = "COSTCO_CACHE_DIR"
+# what a failed save() can raise; callers skip caching on these
+SAVE_ERRORS = (OSError, TypeError) + ((pa.ArrowException,) if pa is not None else ())
+
+SCALARS = (
+    "merch_count", "merch_total", "merch_units", "refund_count", "refund_total", "savings",
+    "gas_count", "gas_total", "gas_gallons", "gas_price_sum",
+)
+SERIES = ("merch_monthly", "merch_daily", "subtotal_by_year", "gas_monthly", "gas_daily")
+
+
+def _write(path, table):
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read(path):
+    # one record batch per file (see _write), so columns are single zero-copy chunks
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _column(table, name):
+    col = table.column(name)
+    if col.num_chunks == 1:
+        return col.chunk(0).to_numpy(zero_copy_only=False)
+    return col.to_numpy()
+
+
+def _text(values):
+    # item numbers can be numbers in some exports; Arrow string columns need str (None stays null)
+    return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def _frame(df):
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _timeline_table(tl):
+    columns = {"day": pa.array(tl.days, type=pa.date32())}
+    for i, f in enumerate(tl.fields):
+        columns[f] = pa.array(np.ascontiguousarray(tl.sums[:, i]))
+    return pa.table(columns)
+
+
+def _timeline(table, fields):
+    days = _column(table, "day").astype("datetime64[D]")
+    sums = np.column_stack([_column(table, f) for f in fields]) if len(days) else np.empty((0, len(fields)))
+    return Timeline(fields, days, sums)
+
+
+def _timestamp(ts):
+    return None if ts is None else pd.Timestamp(ts).isoformat()
+
+
+def save(agg, path):
+    """Write `agg` (a ReceiptAggregate) to the directory `path`, replacing it atomically."""
+    parent = os.path.dirname(path) or "."
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        items = list(agg.items.values())
+        histories = [p["history"] for p in items]
+        _write(os.path.join(tmp, "items.arrow"), pa.table({
+            "itemNumber": _text(p["itemNumber"] for p in items),
+            "name": _text(p["name"] for p in items),
+            "total_spent": pa.array([p["total_spent"] for p in items], type=pa.int64()),
+            "total_units": pa.array([p["total_units"] for p in items], type=pa.float64()),
+            "purchases": pa.array([len(h) for h in histories], type=pa.int64()),
+            "min_price": pa.array([h.min_price for h in histories], type=pa.float64()),
+            "max_price": pa.array([h.max_price for h in histories], type=pa.float64()),
+        }))
+        _write(os.path.join(tmp, "history.arrow"), pa.table({
+            "date": pa.array(np.concatenate([h.dates for h in histories]) if histories
+                             else np.empty(0, dtype="datetime64[ns]"), type=pa.timestamp("ns")),
+            "price": pa.array(np.concatenate([h.prices for h in histories]) if histories
+                              else np.empty(0), type=pa.float64()),
+        }))
+        rows = [(name, str(k), int(v)) for name in SERIES for k, v in getattr(agg, name).items()]
+        _write(os.path.join(tmp, "series.arrow"), pa.table({
+            "series": pa.array([r[0] for r in rows], type=pa.string()),
+            "key": pa.array([r[1] for r in rows], type=pa.string()),
+            "value": pa.array([r[2] for r in rows], type=pa.int64()),  # cents
+        }))
+        _write(os.path.join(tmp, "cube_receipts.arrow"), _frame(agg.cube_receipts))
+        _write(os.path.join(tmp, "cube_departments.arrow"), _frame(agg.cube_departments))
+        _write(os.path.join(tmp, "fuel.arrow"), _frame(agg.fuel))
+        _write(os.path.join(tmp, "merch_timeline.arrow"), _timeline_table(agg.merch_timeline))
+        _write(os.path.join(tmp, "gas_timeline.arrow"), _timeline_table(agg.gas_timeline))
+
+        meta = {name: getattr(agg, name) for name in SCALARS}
+        meta = {k: v.item() if isinstance(v, np.generic) else v for k, v in meta.items()}
+        meta.update({
+            "version": agg.version,
+            "merch_locations": sorted(agg.merch_locations),
+            "gas_locations": sorted(agg.gas_locations),
+            "merch_timeline_fields": list(agg.merch_timeline.fields),
+            "gas_timeline_fields": list(agg.gas_timeline.fields),
+            "min_date": _timestamp(agg.min_date),
+            "max_date": _timestamp(agg.max_date),
+        })
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # another process wrote the same dataset first; theirs is just as good
+            shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def load(path):
+    """The ReceiptAggregate saved in the directory `path`, its arrays mapped from disk."""
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    agg = ReceiptAggregate()
+    if meta["version"] != agg.version:
+        return None
+    for name in SCALARS:
+        setattr(agg, name, meta[name])
+    agg.merch_locations = frozenset(meta["merch_locations"])
+    agg.gas_locations = frozenset(meta["gas_locations"])
+    agg.min_date = None if meta["min_date"] is None else pd.Timestamp(meta["min_date"])
+    agg.max_date = None if meta["max_date"] is None else pd.Timestamp(meta["max_date"])
+
+    items = _read(os.path.join(path, "items.arrow"))
+    history = _read(os.path.join(path, "history.arrow"))
+    dates = _column(history, "date")
+    prices = _column(history, "price")
+    purchases = _column(items, "purchases")
+    ends = np.cumsum(purchases)
+    starts = ends - purchases
+    agg.items = {
+        item_no: {
+            "itemNumber": item_no,
+            "name": name,
+            "total_spent": spent,
+            "total_units": units,
+            "purchases": int(n),
+            "history": PriceHistory(dates[s:e], prices[s:e], lo, hi),
+        }
+        for item_no, name, spent, units, n, lo, hi, s, e in zip(
+            items.column("itemNumber").to_pylist(), items.column("name").to_pylist(),
+            _column(items, "total_spent").tolist(), _column(items, "total_units").tolist(),
+            purchases.tolist(), _column(items, "min_price").tolist(), _column(items, "max_price").tolist(),
+            starts.tolist(), ends.tolist(),
+        )
+    }
+
+    series = _read(os.path.join(path, "series.arrow")).to_pandas()
+    for name in SERIES:
+        part = series[series["series"] == name]
+        keys = part["key"].map(int) if name == "subtotal_by_year" else part["key"]
+        setattr(agg, name, dict(zip(keys, part["value"].tolist())))
+
+    agg.cube_receipts = _read(os.path.join(path, "cube_receipts.arrow")).to_pandas()
+    agg.cube_departments = _read(os.path.join(path, "cube_departments.arrow")).to_pandas()
+    agg.fuel = _read(os.path.join(path, "fuel.arrow")).to_pandas()
+    agg.merch_timeline = _timeline(_read(os.path.join(path, "merch_timeline.arrow")),
+                                   tuple(meta["merch_timeline_fields"]))
+    agg.gas_timeline = _timeline(_read(os.path.join(path, "gas_timeline.arrow")),
+                                 tuple(meta["gas_timeline_fields"]))
+    return agg
+
+
+class DiskCache:
+    """Processed uploads by dataset fingerprint, one directory each under `root`."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}-v{FORMAT_VERSION}")
+
+    def load(self, key):
+        """The saved ReceiptAggregate for `key`, or None if there is none (or it is unreadable)."""
+        path = self.path(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            return load(path)
+        except (OSError, ValueError, KeyError, pa.ArrowException):
+            return None
+
+    def save(self, key, agg):
+        save(agg, self.path(key))
+
+
+def open_cache(path=None):
+    """Open the cache at `path` (or $COSTCO_CACHE_DIR); None when not configured or pyarrow is missing."""
+    path = path or os.environ.get(CACHE_ENV_VAR)
+    if not path or pa is None:
+        return None
+    return DiskCache(os.path.expanduser(path))
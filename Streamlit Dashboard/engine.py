@@ -0,0 +1,179 @@
+from itertools import chain, islice, repeat
+
+import numpy as np
+import pandas as pd
+
+import fuel
+import money
+import profiler
+from aggregates import ReceiptAggregate
+from ingest import receipt_key
+
+
+# ------------------------------------------------------------
+# Columnar line-item engine
+# ------------------------------------------------------------
+# Each batch of receipts is flattened into two typed tables (see stream_aggregate):
+#   receipts_df -> one row per receipt (rid, date, warehouse, totals, gas flag)
+#   items_df    -> one row per itemArray entry (rid, itemNumber, unit, amount, fuel fields, grade)
+# Every aggregate is then a vectorized group-by over those columns (see aggregates.py).
+# Money columns are int64 cents (see money.py).
+
+RECEIPT_MONEY_FIELDS = ("total", "subTotal", "instantSavings")
+RECEIPT_TEXT_FIELDS = (
+    "transactionDate", "warehouseName", "warehouseNumber",
+    "receiptType", "documentType", "transactionType",
+)
+ITEM_MONEY_FIELDS = ("amount",)
+ITEM_NUMERIC_FIELDS = ("unit", "fuelUnitQuantity")
+ITEM_PRICE_FIELDS = ("itemUnitPriceAmount",)  # $/gal to a tenth of a cent: float cents
+ITEM_TEXT_FIELDS = ("itemNumber", "itemDescription01", "itemDepartmentNumber")
+
+BATCH_SIZE = 20000  # receipts flattened per step when reading from a stream
+
+
+def _column(records, field):
+    """
+    Pull one field out of a list of receipt dicts (or schema structs) straight into an object
+    array (no per-row Python frames).
+    """
+    if records and not isinstance(records[0], dict):
+        values = map(getattr, records, repeat(field), repeat(None))
+    else:
+        values = map(dict.get, records, repeat(field))
+    return np.fromiter(values, dtype=object, count=len(records))
+
+
+def _to_float(values):
+    """Convert a raw column to float64, treating missing/blank values as 0.0."""
+    try:
+        arr = values.astype(np.float64)
+    except (TypeError, ValueError):
+        # blank strings or other junk: let pandas coerce what it can
+        arr = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(np.float64)
+    arr[np.isnan(arr)] = 0.0
+    return arr
+
+
+def _parse_dates(values):
+    """
+    transactionDate is ISO-like ("2025-09-01" or "2025-09-01T00:00:00"); unparseable -> NaT.
+    Receipts share a few hundred distinct dates, so only the unique strings are parsed.
+    """
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), errors="coerce", format="ISO8601")
+    # missing values get code -1, which lands on the trailing NaT
+    return np.append(parsed.to_numpy(), np.datetime64("NaT", "ns"))[codes]
+
+
+def _clean_text(values, default):
+    """(value or default).strip() for a whole column, stripping each distinct value once."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    cleaned = np.array([default if pd.isna(v) or v == "" else str(v).strip() for v in uniques], dtype=object)
+    return cleaned[codes]
+
+
+def _flatten_batch(batch, rid_start):
+    """Flatten one batch of receipts (dicts or schema structs) into (kept receipts, receipt columns, item columns)."""
+    date_strs = _column(batch, "transactionDate")
+    dates = _parse_dates(date_strs)
+    keep = ~np.isnat(dates) & date_strs.astype(bool)
+    if not keep.all():
+        batch = [rec for rec, ok in zip(batch, keep) if ok]
+        dates = dates[keep]
+
+    rid = np.arange(rid_start, rid_start + len(batch), dtype=np.int64)
+    months = dates.astype("datetime64[M]")
+    rec_cols = {
+        "rid": rid,
+        "key": np.fromiter(map(receipt_key, batch), dtype=object, count=len(batch)),
+        "date": dates,
+        "month_key": np.datetime_as_string(months, unit="M").astype(object),
+        "year": months.astype("datetime64[Y]").astype(np.int64) + 1970,
+    }
+    for field in RECEIPT_TEXT_FIELDS:
+        rec_cols[field] = _column(batch, field)
+    for field in RECEIPT_MONEY_FIELDS:
+        rec_cols[field] = money.to_cents(_to_float(_column(batch, field)))
+    rec_cols["location"] = _clean_text(rec_cols["warehouseName"], "Unknown")
+
+    item_lists = [rec.get("itemArray") or [] for rec in batch]
+    items = list(chain.from_iterable(item_lists))
+    item_pos = np.repeat(np.arange(len(batch)), np.fromiter(map(len, item_lists), dtype=np.int64, count=len(item_lists)))
+    item_cols = {"rid": rid[item_pos]}
+    for field in ITEM_TEXT_FIELDS:
+        item_cols[field] = _column(items, field)
+    for field in ITEM_MONEY_FIELDS:
+        item_cols[field] = money.to_cents(_to_float(_column(items, field)))
+    for field in ITEM_NUMERIC_FIELDS:
+        item_cols[field] = _to_float(_column(items, field))
+    for field in ITEM_PRICE_FIELDS:
+        item_cols[field] = _to_float(_column(items, field)) * money.CENTS
+
+    # Gas classification: receipt-level markers OR any line that resolves to a fuel grade
+    # (see fuel.py). The grade code / description are only read for lines that can be fuel:
+    # on a receipt with gas markers, with a fuel quantity, or a known fuel item number.
+    with profiler.stage("classify gas", rows=len(items)):
+        marked = (rec_cols["receiptType"] == "Gas Station") | (rec_cols["documentType"] == "FuelReceipts")
+        lines = np.flatnonzero(marked[item_pos] | fuel.candidates(item_cols["itemNumber"], item_cols["fuelUnitQuantity"]))
+        picked = [items[i] for i in lines]
+        item_cols["grade"] = np.full(len(items), None, dtype=object)
+        item_cols["grade"][lines] = fuel.grade_column(
+            item_cols["itemNumber"][lines], _column(picked, "fuelGradeCode"),
+            _column(picked, "fuelGradeDescription"), item_cols["fuelUnitQuantity"][lines],
+        )
+        has_fuel_item = np.zeros(len(batch), dtype=bool)
+        has_fuel_item[item_pos[pd.notna(item_cols["grade"])]] = True
+        rec_cols["is_gas"] = marked | has_fuel_item
+
+    item_cols["date"] = dates[item_pos]
+    item_cols["month_key"] = rec_cols["month_key"][item_pos]
+    item_cols["is_gas"] = rec_cols["is_gas"][item_pos]
+
+    return batch, rec_cols, item_cols
+
+
+def stream_aggregate(receipts, batch_size=BATCH_SIZE):
+    """
+    Receipt dicts (list or stream, no duplicates) -> unfinalized ReceiptAggregate, batch by batch.
+    Each batch is flattened, aggregated and dropped before the next is read, so neither the
+    receipt dicts nor the line-item tables pile up: memory is one batch plus the partial
+    aggregates, which grow with distinct items, days and cube cells rather than receipts.
+    """
+    # partials of 1, 2, 4, ... batches (like a binary counter): equal-sized neighbours are
+    # merged as soon as they appear, so only log2(batches) partials are alive and each
+    # receipt's totals take part in log2(batches) merges
+    stack = []
+    it = iter(receipts)
+    rid = 0
+    while True:
+        with profiler.stage("read receipts") as s:
+            batch = list(islice(it, batch_size))
+            s["rows"] = len(batch)
+        if not batch:
+            break
+        with profiler.stage("flatten", rows=len(batch)):
+            kept, rec_cols, item_cols = _flatten_batch(batch, rid)
+        rid += len(kept)
+        del batch, kept
+        with profiler.stage("aggregate batch", rows=len(rec_cols["rid"])):
+            part = ReceiptAggregate.from_tables(pd.DataFrame(rec_cols, copy=False),
+                                                pd.DataFrame(item_cols, copy=False))
+        del rec_cols, item_cols
+        size = 1
+        with profiler.stage("merge batches"):
+            while stack and stack[-1][0] == size:
+                part = stack.pop()[1].merge(part)
+                size *= 2
+        stack.append((size, part))
+
+    with profiler.stage("merge batches"):
+        total = ReceiptAggregate()
+        for _, part in stack:
+            total = total.merge(part)
+    return total
+
+
+def aggregate_receipts(receipts):
+    """Receipt dicts (list or stream, no duplicates) -> unfinalized ReceiptAggregate (see stream_aggregate)."""
+    return stream_aggregate(receipts)
@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import ingest
+
+try:
+    import aiohttp
+except ImportError:  # optional: only the fetch client needs it, not the dashboard
+    aiohttp = None
+
+
+# ------------------------------------------------------------
+# Concurrent receipt fetch client
+# ------------------------------------------------------------
+# The browser downloaders send one receiptsWithCounts query for the whole date
+# range, which is slow and times out on multi-year ranges. This client splits the
+# range into calendar-month windows and fetches them concurrently over one pooled
+# aiohttp session: at most `concurrency` requests in flight, each retried with
+# exponential backoff (and Retry-After) on timeouts, 429 and 5xx. Receipts are
+# handed over window by window as responses arrive, so they can go straight into
+# engine.stream_aggregate without waiting for the whole range.
+#
+#   python fetch.py 01/01/2023 12/31/2025 -o costco-receipts.json
+#   python fetch.py 01/01/2023 12/31/2025 --url http://127.0.0.1:8787/graphql   # mock_server.py
+#
+# Credentials are the two values the downloader reads from localStorage on
+# costco.com: clientID and idToken ($COSTCO_CLIENT_ID / $COSTCO_ID_TOKEN).
+
+ENDPOINT = "https://ecom-api.costco.com/ebusiness/order/v1/orders/graphql"
+CLIENT_IDENTIFIER = "481b1aec-aa3b-454b-b81b-48187e28f205"
+CLIENT_ID_ENV_VAR = "COSTCO_CLIENT_ID"
+ID_TOKEN_ENV_VAR = "COSTCO_ID_TOKEN"
+
+DATE_FORMAT = "%m/%d/%Y"  # the API's startDate / endDate format
+CONCURRENCY = 4
+RETRIES = 4
+BACKOFF = 0.5             # seconds before the first retry, doubled after each one
+TIMEOUT = 60              # seconds per request
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# the query manual_receipt_downloader.js sends, field for field
+RECEIPTS_QUERY = " ".join("""
+query receiptsWithCounts($startDate: String!, $endDate: String!) {
+  receiptsWithCounts(startDate: $startDate, endDate: $endDate) {
+    receipts {
+      warehouseName receiptType documentType transactionDateTime transactionDate
+      companyNumber warehouseNumber operatorNumber warehouseShortName registerNumber
+      transactionNumber transactionType transactionBarcode total warehouseAddress1
+      warehouseAddress2 warehouseCity warehouseState warehouseCountry warehousePostalCode
+      totalItemCount subTotal taxes invoiceNumber sequenceNumber
+      itemArray {
+        itemNumber itemDescription01 frenchItemDescription1 itemDescription02
+        frenchItemDescription2 itemIdentifier itemDepartmentNumber unit amount taxFlag
+        merchantID entryMethod transDepartmentNumber fuelUnitQuantity fuelGradeCode
+        itemUnitPriceAmount fuelUomCode fuelUomDescription fuelUomDescriptionFr
+        fuelGradeDescription fuelGradeDescriptionFr
+      }
+      tenderArray {
+        tenderTypeCode tenderSubTypeCode tenderDescription amountTender
+        displayAccountNumber sequenceNumber approvalNumber responseCode tenderTypeName
+        transactionID merchantID entryMethod tenderAcctTxnNumber tenderAuthorizationCode
+        tenderTypeNameFr tenderEntryMethodDescription walletType walletId storedValueBucket
+      }
+      subTaxes {
+        tax1 tax2 tax3 tax4 aTaxPercent aTaxLegend aTaxAmount bTaxPercent bTaxLegend
+        bTaxAmount cTaxPercent cTaxLegend cTaxAmount dTaxAmount
+      }
+      instantSavings
+      membershipNumber
+    }
+  }
+}
+""".split())
+
+
+class FetchError(Exception):
+    """A window that could not be fetched (bad credentials, retries used up, a GraphQL error)."""
+
+
+def parse_date(value):
+    """'MM/DD/YYYY', 'YYYY-MM-DD' or a date -> date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for fmt in (DATE_FORMAT, "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised date {value!r} (use MM/DD/YYYY or YYYY-MM-DD)")
+
+
+def month_windows(start, end):
+    """[(first day, last day)] per calendar month covering start..end inclusive, clipped to the range."""
+    start, end = parse_date(start), parse_date(end)
+    windows = []
+    lo = start
+    while lo <= end:
+        next_month = date(lo.year + lo.month // 12, lo.month % 12 + 1, 1)
+        hi = min(next_month - timedelta(days=1), end)
+        windows.append((lo, hi))
+        lo = next_month
+    return windows
+
+
+def headers(client_id=None, id_token=None):
+    """Request headers the orders API expects (credentials default to the environment)."""
+    client_id = client_id or os.environ.get(CLIENT_ID_ENV_VAR, "")
+    id_token = id_token or os.environ.get(ID_TOKEN_ENV_VAR, "")
+    return {
+        "Content-Type": "application/json-patch+json",
+        "Costco.Env": "ecom",
+        "Costco.Service": "restOrders",
+        "Costco-X-Wcs-Clientid": client_id,
+        "Client-Identifier": CLIENT_IDENTIFIER,
+        "Costco-X-Authorization": f"Bearer {id_token}",
+    }
+
+
+def _payload(window):
+    lo, hi = window
+    return json.dumps({
+        "query": RECEIPTS_QUERY,
+        "variables": {"startDate": lo.strftime(DATE_FORMAT), "endDate": hi.strftime(DATE_FORMAT)},
+    })
+
+
+def _receipts(body, window):
+    data = json.loads(body)
+    result = ((data.get("data") or {}).get("receiptsWithCounts") or {}).get("receipts")
+    if result is None and data.get("errors"):
+        message = "; ".join(str(e.get("message", e)) for e in data["errors"])
+        raise FetchError(f"{_label(window)}: {message}")
+    return result or []
+
+
+def _label(window):
+    return f"{window[0]:%m/%d/%Y}-{window[1]:%m/%d/%Y}"
+
+
+def _delay(attempt, backoff, retry_after=None):
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    # full jitter, so windows that failed together do not retry together
+    return random.uniform(0, backoff * (2 ** attempt))
+
+
+async def fetch_window(session, url, window, request_headers, retries=RETRIES, backoff=BACKOFF, stats=None):
+    """
+    Receipt dicts for one (first day, last day) window, retrying transient failures.
+    `stats` (a dict), when given, counts the "requests" sent and response "bytes" received.
+    """
+    data = _payload(window)
+    for attempt in range(retries + 1):
+        retry_after = None
+        try:
+            async with session.post(url, data=data, headers=request_headers) as resp:
+                body = await resp.read()
+                if stats is not None:
+                    stats["requests"] = stats.get("requests", 0) + 1
+                    stats["bytes"] = stats.get("bytes", 0) + len(body)
+                if resp.status == 200:
+                    return _receipts(body, window)
+                if resp.status in (401, 403):
+                    raise FetchError(f"{_label(window)}: HTTP {resp.status} - sign in again and refresh "
+                                     f"${CLIENT_ID_ENV_VAR} / ${ID_TOKEN_ENV_VAR}")
+                if resp.status not in RETRY_STATUSES:
+                    raise FetchError(f"{_label(window)}: HTTP {resp.status}")
+                error = f"HTTP {resp.status}"
+                retry_after = resp.headers.get("Retry-After")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = str(e) or type(e).__name__
+        except ValueError as e:
+            error = f"invalid response ({e})"
+        if attempt < retries:
+            await asyncio.sleep(_delay(attempt, backoff, retry_after))
+    raise FetchError(f"{_label(window)}: {error} (after {retries + 1} attempts)")
+
+
+async def fetch_windows(start, end, url=ENDPOINT, client_id=None, id_token=None,
+                        concurrency=CONCURRENCY, retries=RETRIES, backoff=BACKOFF, timeout=TIMEOUT, stats=None):
+    """
+    Async generator of (window, receipts) for every month in start..end, in completion order.
+    One session (connection pool of `concurrency`) serves all windows; the first window
+    that fails for good cancels the rest and raises FetchError.
+    """
+    if aiohttp is None:
+        raise FetchError("Fetching receipts needs aiohttp (pip install aiohttp)")
+    windows = month_windows(start, end)
+    request_headers = headers(client_id, id_token)
+    slots = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async def one(window):
+            async with slots:
+                return window, await fetch_window(session, url, window, request_headers, retries, backoff, stats)
+
+        tasks = [asyncio.ensure_future(one(w)) for w in windows]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# ------------------------------------------------------------
+# Synchronous bridge (for engine.stream_aggregate, cli.py)
+# ------------------------------------------------------------
+_DONE = object()
+
+
+def iter_receipts(start, end, **options):
+    """
+    Receipt dicts for start..end, deduped, yielded while later windows are still downloading.
+    The event loop runs in a background thread; at most a few windows wait in between, so a
+    slow consumer holds the downloads back instead of piling responses up in memory.
+    Takes the same options as fetch_windows.
+    """
+    windows = queue.Queue(maxsize=2 * options.get("concurrency", CONCURRENCY))
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                windows.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def pump():
+        loop = asyncio.get_running_loop()
+        fetched = fetch_windows(start, end, **options)
+        try:
+            async for _, receipts in fetched:
+                if not await loop.run_in_executor(None, put, receipts):
+                    return
+        finally:
+            await fetched.aclose()
+
+    def run():
+        try:
+            asyncio.run(pump())
+        except BaseException as e:  # handed to the consumer and raised there
+            put(e)
+        else:
+            put(_DONE)
+
+    worker = threading.Thread(target=run, name="receipt-fetch", daemon=True)
+    worker.start()
+    try:
+        yield from ingest.unique_receipts(_drain(windows))
+    finally:
+        stop.set()
+        worker.join()
+
+
+def _drain(windows):
+    while True:
+        item = windows.get()
+        if item is _DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield from item
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download Costco receipts month by month, several months at a time.")
+    parser.add_argument("start", help="first day, MM/DD/YYYY or YYYY-MM-DD")
+    parser.add_argument("end", help="last day, MM/DD/YYYY or YYYY-MM-DD")
+    parser.add_argument("-o", "--out", help="write the receipts here: a JSON array (the downloader's format), "
+                                            "or .ndjson / .json.gz / .json.zst / .parquet")
+    parser.add_argument("--url", default=ENDPOINT, help="GraphQL endpoint (e.g. a local mock_server.py)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="requests in flight")
+    parser.add_argument("--retries", type=int, default=RETRIES, help="retries per month")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="seconds per request")
+    args = parser.parse_args(argv)
+
+    try:
+        start, end = parse_date(args.start), parse_date(args.end)
+    except ValueError as e:
+        parser.error(str(e))
+    receipts = iter_receipts(start, end, url=args.url, concurrency=max(args.concurrency, 1),
+                             retries=max(args.retries, 0), timeout=args.timeout)
+    n = 0
+
+    def counted(it):
+        nonlocal n
+        for rec in it:
+            n += 1
+            yield rec
+
+    began = time.perf_counter()
+    try:
+        if args.out:
+            ingest.write_receipts(args.out, counted(receipts))
+        else:
+            for _ in counted(receipts):
+                pass
+    except FetchError as e:
+        raise SystemExit(str(e))
+    elapsed = time.perf_counter() - began
+    print(
+        f"{n:,} receipts from {len(month_windows(start, end))} months in {elapsed:.2f}s "
+        f"({n / elapsed if elapsed else 0:,.0f} receipts/s)" + (f" -> {args.out}" if args.out else ""),
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+
+# ------------------------------------------------------------
+# Fuel grades
+# ------------------------------------------------------------
+# A line item is fuel when it resolves to a grade. Grades come from lookup tables,
+# tried in order: keywords in fuelGradeDescription, fuelGradeCode, then the item
+# numbers older exports only identify fuel by. A described grade that matches no
+# keyword keeps its own (title-cased) name, so diesel or a new blend shows up as a
+# grade of its own without code changes. Columns are resolved once per distinct
+# (itemNumber, code, description) combination, never per line, and the grade
+# fields are only read for lines that can be fuel (see engine._flatten_batch).
+
+# (substring of the upper-cased description, grade); first match wins
+GRADE_KEYWORDS = (
+    ("DIESEL", "Diesel"),
+    ("PREM", "Premium"),
+    ("SUPER", "Premium"),
+    ("MID", "Mid-Grade"),
+    ("PLUS", "Mid-Grade"),
+    ("REG", "Regular"),
+    ("UNLEAD", "Regular"),
+)
+GRADE_BY_CODE = {"01": "Regular", "03": "Premium"}
+GRADE_BY_ITEM = {"800599": "Regular", "800877": "Premium"}
+
+# display order; anything else follows alphabetically
+GRADE_ORDER = ("Regular", "Mid-Grade", "Premium", "Diesel")
+
+FUEL_COLUMNS = ("date", "warehouseNumber", "station", "grade")
+FUEL_MEASURES = ("spend", "gallons")  # spend in int64 cents (see money.py)
+
+
+def resolve_grade(item_number, code, description, quantity=0.0):
+    """Grade name for one line item, or None when it is not fuel."""
+    if isinstance(description, str) and description.strip():
+        text = description.strip().upper()
+        for keyword, grade in GRADE_KEYWORDS:
+            if keyword in text:
+                return grade
+    if code is not None and not pd.isna(code):
+        code = str(code).strip()
+        if code in GRADE_BY_CODE:
+            return GRADE_BY_CODE[code]
+    grade = GRADE_BY_ITEM.get(item_number)
+    if grade is not None:
+        return grade
+    if isinstance(description, str) and description.strip():
+        return description.strip().title()
+    if code is not None and not pd.isna(code) and str(code).strip():
+        return f"Grade {str(code).strip()}"
+    if quantity and quantity > 0:
+        return "Other"
+    return None
+
+
+def grade_of(item):
+    """resolve_grade for one itemArray entry (a dict)."""
+    return resolve_grade(item.get("itemNumber"), item.get("fuelGradeCode"),
+                         item.get("fuelGradeDescription"), item.get("fuelUnitQuantity") or 0.0)
+
+
+def candidates(item_numbers, quantities):
+    """Lines that may be fuel without looking at their grade fields: a fuel quantity or a known fuel item number."""
+    return (np.asarray(quantities) > 0) | pd.Series(item_numbers, dtype=object).isin(GRADE_BY_ITEM).to_numpy()
+
+
+def grade_column(item_numbers, codes, descriptions, quantities):
+    """Grade per line item (object array, None for non-fuel lines), resolved once per distinct combination."""
+    if not len(item_numbers):
+        return np.empty(0, dtype=object)
+    columns = [pd.factorize(np.asarray(v, dtype=object), use_na_sentinel=False)
+               for v in (item_numbers, codes, descriptions)]
+    columns.append(pd.factorize(np.asarray(quantities) > 0))
+    sizes = [len(u) for _, u in columns]
+    combo, first = pd.factorize(np.ravel_multi_index([c for c, _ in columns], sizes))
+    cells = np.unravel_index(first, sizes)
+    table = np.array([
+        resolve_grade(*(u[c] for (_, u), c in zip(columns, cell)))
+        for cell in zip(*cells)
+    ], dtype=object)
+    return table[combo]
+
+
+def order(grades):
+    """Grades in display order (known grades first, then alphabetical)."""
+    known = [g for g in GRADE_ORDER if g in set(grades)]
+    return known + sorted(set(grades) - set(GRADE_ORDER))
+
+
+# ------------------------------------------------------------
+# Per-day, per-station, per-grade fuel table
+# ------------------------------------------------------------
+def empty():
+    frame = {c: pd.Series(dtype="datetime64[ns]" if c == "date" else object) for c in FUEL_COLUMNS}
+    frame.update({m: pd.Series(dtype=np.int64 if m == "spend" else float) for m in FUEL_MEASURES})
+    return pd.DataFrame(frame)
+
+
+def _group(frame):
+    if frame.empty:
+        return empty()
+    sums = frame.groupby(list(FUEL_COLUMNS), sort=True, dropna=False)[list(FUEL_MEASURES)].sum()
+    return sums.reset_index()
+
+
+def partials(receipts_df, items_df):
+    """Spend and gallons of every graded line on a gas receipt, summed per (day, station, grade)."""
+    lines = items_df[items_df["is_gas"].to_numpy() & pd.notna(items_df["grade"]).to_numpy()]
+    if lines.empty:
+        return empty()
+    pos = pd.Index(receipts_df["rid"]).get_indexer(lines["rid"])
+    # warehouse numbers as the same text labels the filter cube uses
+    codes, numbers = pd.factorize(receipts_df["warehouseNumber"].to_numpy()[pos], use_na_sentinel=False)
+    numbers = np.array(["" if pd.isna(v) else str(v).strip() for v in numbers], dtype=object)
+    return _group(pd.DataFrame({
+        "date": lines["date"].to_numpy(),
+        "warehouseNumber": numbers[codes],
+        "station": receipts_df["location"].to_numpy()[pos],
+        "grade": lines["grade"].to_numpy(),
+        "spend": lines["amount"].to_numpy(),
+        "gallons": lines["fuelUnitQuantity"].to_numpy(),
+    }))
+
+
+def merge_partials(a, b):
+    if a.empty:
+        return b
+    if b.empty:
+        return a
+    return _group(pd.concat([a, b], ignore_index=True))
+
+
+def select(fuel, months=None, warehouses=None):
+    """Rows in an inclusive ('YYYY-MM', 'YYYY-MM') month range and / or at the given warehouseNumbers."""
+    mask = np.ones(len(fuel), dtype=bool)
+    if months is not None:
+        month = fuel["date"].to_numpy().astype("datetime64[M]")
+        mask &= (month >= np.datetime64(months[0], "M")) & (month <= np.datetime64(months[1], "M"))
+    if warehouses is not None:
+        mask &= fuel["warehouseNumber"].isin(list(warehouses)).to_numpy()
+    return fuel[mask].reset_index(drop=True)
+
+
+def slug(grade):
+    """'Mid-Grade' -> 'mid_grade' (column-name form of a grade)."""
+    return "".join(c if c.isalnum() else "_" for c in grade.lower())
+
+
+def monthly(fuel):
+    """Per-month, per-grade spend / gallons: month_key index, grade columns under "spend" and "gallons"."""
+    if fuel.empty:
+        return pd.DataFrame()
+    month = pd.Series(np.datetime_as_string(fuel["date"].to_numpy().astype("datetime64[M]"), unit="M"),
+                      name="month_key")
+    sums = fuel.groupby([month, fuel["grade"]], sort=True)[list(FUEL_MEASURES)].sum()
+    return sums.unstack("grade", fill_value=0)
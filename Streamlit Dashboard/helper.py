@@ -1,6 +1,17 @@
-from datetime import datetime
-from collections import defaultdict
+import hashlib
+import pandas as pd
 import streamlit as st
+import disk_cache
+import engine
+import incremental
+import ingest
+import leaderboards
+import money
+import pipeline
+import profiler
+import result_cache
+import store
+from charts import month_label_from_key  # still importable as helper.month_label_from_key
 
 
 
@@ -88,6 +99,13 @@ def load_css():
     border-bottom: 2px solid var(--border);
     }
 
+    /* Page selector (horizontal radio) */
+    div[role="radiogroup"] {
+    gap: 1.2rem;
+    padding-bottom: 0.3rem;
+    border-bottom: 1px solid var(--border);
+    }
+
     /* Tables */
     table {
     border-collapse: collapse;
@@ -156,201 +174,261 @@ def load_css():
     """, unsafe_allow_html=True)
 
 
-
-## Identify gas receipts
-def is_gas_receipt(rec):
-    # Primary identifiers
-    if rec.get("receiptType") == "Gas Station":
-        return True
-    if rec.get("documentType") == "FuelReceipts":
-        return True
-
-    # Only true fuel items
-    for item in rec.get("itemArray") or []:
-        if item.get("itemNumber") in ("800599", "800877"):
-            return True
-
-    return False
-
-## New gas grade entry
-def new_gas_grade():
-    return {"pSpend": 0.0, "pGal": 0.0, "rSpend": 0.0, "rGal": 0.0}
-
-def format_money(v: float) -> str:
-    return f"${v:,.2f}"
+def format_money(cents: float) -> str:
+    """Amount in cents (see money.py) -> '$1,234.56'; the one place text goes back to dollars."""
+    return f"${money.dollars(cents):,.2f}"
 
 
 def format_num(v: float, digits: int = 1) -> str:
     return f"{v:,.{digits}f}"
 
 
-def month_label_from_key(month_key: str) -> str:
-    """month_key is 'YYYY-MM' -> 'Mon 'YY' """
-    dt = datetime.strptime(month_key + "-01", "%Y-%m-%d")
-    return dt.strftime("%b '%y")
+## Content hash of the uploaded files -> key for cached results
+def dataset_fingerprint(file_list) -> str:
+    """Hash every uploaded file's bytes (in upload order); same files -> same key across reruns."""
+    h = hashlib.blake2b(digest_size=16)
+    for f in file_list:
+        h.update(ingest.file_fingerprint(f).encode())
+    return h.hexdigest()
 
 
 # ------------------------------------------------------------
 # MAIN RECEIPT PROCESSING FUNCTION (Split Gas and Merch)
 # ------------------------------------------------------------
-def process_receipts(receipts):
+def process_uploads(file_list):
     """
-    Split records into merchandise vs gas, build item stats, monthly totals, refunds & rewards.
+    The ReceiptAggregate of `file_list`, keeping one partial aggregate per upload in session
+    state (see incremental.py): adding a file parses just that file, removing one re-merges
+    the others. Publish it with load_dataset.
     """
+    uploads = st.session_state.setdefault("uploads", incremental.UploadAggregates())
+    uploads.update(file_list)
+    return uploads.total
 
-    merch = {
-        "receipts": [],
-        "item_stats": {},  # itemNumber -> dict
-        "monthly": defaultdict(lambda: {"spent": 0.0}),
-        "subtotal_by_year": defaultdict(float),
-        "total_spent": 0.0,
-        "total_units": 0.0,
-        "refund_count": 0,
-        "refund_total": 0.0,
-        "locations": set(),
-        "Total Savings": 0.0,
-    }
-
-    gas = {
-        "receipts": [],
-        "monthly": defaultdict(lambda: {"spent": 0.0}),
-        "total_spent": 0.0,
-        "total_gallons": 0.0,
-        "price_sum": 0.0,  # weighted (price * gallons)
-        "count": 0,
-        "locations": set(),
-        "grades":{}
-    }
-
-    all_locations = set()
-    all_dates = []
-
-    for rec in receipts:
-        trx_date_str = rec.get("transactionDate")
-        if not trx_date_str:
-            continue
-
-        # transactionDate is ISO-like ("2025-09-01" or "2025-09-01T00:00:00")
-        try:
-            date = datetime.fromisoformat(trx_date_str)
-        except Exception:
-            try:
-                date = datetime.strptime(trx_date_str, "%Y-%m-%d")
-            except Exception:
-                continue
-
-        all_dates.append(date)
-        month_key = date.strftime("%Y-%m")
-        year = date.year
-
-        total = float(rec.get("total") or 0.0)
-        loc_name = (rec.get("warehouseName") or "Unknown").strip()
-        all_locations.add(loc_name)
-        total_savings = float(rec.get("instantSavings") or 0.0)
-
-        item_array = rec.get("itemArray") or []
-
-        if is_gas_receipt(rec):
-            gas["receipts"].append(rec)
-            gas["locations"].add(loc_name)
-            gas["total_spent"] += total
-            gas["count"] += 1
-            gas["monthly"][month_key]["spent"] += total
-
-            for item in item_array:
-                gals = float(item.get("fuelUnitQuantity") or 0.0)
-                price = float(item.get("itemUnitPriceAmount") or 0.0)
-                amt = float(item.get("amount") or 0.0)
-                item_no = item.get("itemNumber")
-
-                if gals > 0:
-                    gas["total_gallons"] += gals
-                    gas["price_sum"] += price * gals
-
-                # Build grade breakdown for charts
-                if month_key not in gas["grades"]:
-                    gas["grades"][month_key] = new_gas_grade()  # triggers default
-
-                g_entry = gas["grades"][month_key]
-                if item_no == "800877":  # Premium
-                    g_entry["pSpend"] += amt
-                    g_entry["pGal"] += gals
-                elif item_no == "800599":  # Regular
-                    g_entry["rSpend"] += amt
-                    g_entry["rGal"] += gals
-
-        else:
-            merch["receipts"].append(rec)
-            merch["locations"].add(loc_name)
-            merch["total_spent"] += total
-            merch["monthly"][month_key]["spent"] += total
-            merch["Total Savings"] += total_savings
-
-            # refunds
-            if total < 0 or rec.get("transactionType") == "Refund":
-                merch["refund_count"] += 1
-                merch["refund_total"] += abs(total)
-
-            # executive rewards (pre-tax subtotal)
-            subtotal = float(rec.get("subTotal") or 0.0)
-            merch["subtotal_by_year"][year] += subtotal
-
-            # item stats
-            for item in item_array:
-                unit = float(item.get("unit") or 0.0)
-                amount = float(item.get("amount") or 0.0)
-                item_no = item.get("itemNumber")
-                if not item_no or unit <= 0 or amount <= 0:
-                    continue
-
-                name = (item.get("itemDescription01") or "").strip()
-                unit_price = amount / unit
-
-                if item_no not in merch["item_stats"]:
-                    merch["item_stats"][item_no] = {
-                        "itemNumber": item_no,
-                        "name": name,
-                        "total_spent": 0.0,
-                        "total_units": 0.0,
-                        "purchases": 0,
-                        "price_history": [],  # list of dicts {date, price}
-                    }
-
-                stat = merch["item_stats"][item_no]
-                stat["total_spent"] += amount
-                stat["total_units"] += unit
-                stat["purchases"] += 1
-                stat["price_history"].append({"date": date, "price": unit_price})
-                merch["total_units"] += unit
-
-    # item stats post-processing
-    for stat in merch["item_stats"].values():
-        hist = sorted(stat["price_history"], key=lambda x: x["date"])
-        stat["price_history"] = hist
-        prices = [p["price"] for p in hist]
-        if prices:
-            stat["first_price"] = prices[0]
-            stat["last_price"] = prices[-1]
-            stat["max_price"] = max(prices)
-            stat["min_price"] = min(prices)
-        else:
-            stat["first_price"] = stat["last_price"] = stat["max_price"] = stat["min_price"] = 0.0
-
-    # date range string for header
-    if all_dates:
-        min_d, max_d = min(all_dates), max(all_dates)
-        if min_d.year == max_d.year:
-            date_range_str = str(min_d.year)
-        else:
-            date_range_str = f"{min_d.year} – {max_d.year}"
-    else:
-        date_range_str = "Waiting for file..."
 
+def publish(merch, gas, all_locations, date_range_str):
     # Store in session state for other pages
     st.session_state["merch"] = merch
     st.session_state["gas"] = gas
     st.session_state["all_locations"] = all_locations
     st.session_state["date_range"] = date_range_str
 
-    return merch, gas, all_locations, date_range_str
 
+# ------------------------------------------------------------
+# Ranked item tables (Warehouse + Prices tabs)
+# ------------------------------------------------------------
+@st.cache_data
+def item_leaderboards(dataset_key, _item_stats):
+    """Every ranked item list for one dataset in a single pass (see leaderboards.py)."""
+    with profiler.stage("leaderboards", rows=len(_item_stats)):
+        return leaderboards.rank(_item_stats)
+
+
+# ------------------------------------------------------------
+# Per-view data products
+# ------------------------------------------------------------
+# Only the selected view runs on a rerun; what it builds is kept per dataset so
+# switching back, or interacting inside the view, does not rebuild it. Cached as
+# resources (no copy per hit), so callers must treat the results as read-only.
+@st.cache_resource(max_entries=64)
+def view_data(dataset_key, product, _build):
+    """`_build()` runs once per (dataset, product); later calls return the same object."""
+    with profiler.stage(f"build {product}"):
+        return _build()
+
+
+# ------------------------------------------------------------
+# Processed datasets shared by every session (see result_cache.py)
+# ------------------------------------------------------------
+@st.cache_resource
+def shared_results():
+    """One ResultCache per server process, capped at $COSTCO_CACHE_MB."""
+    return result_cache.ResultCache(result_cache.budget_from_env())
+
+
+@st.cache_resource
+def get_disk_cache():
+    """The on-disk cache of processed uploads ($COSTCO_CACHE_DIR), or None."""
+    return disk_cache.open_cache()
+
+
+def load_dataset(dataset_key, build, persist=False):
+    """
+    Publish the processed dataset for `dataset_key`. `build()` returns its ReceiptAggregate
+    (process_uploads, load_from_store) and only runs when no session has the result cached
+    and - with persist=True - it is not in the on-disk cache either (see disk_cache.py).
+    """
+    def finalized():
+        disk = get_disk_cache() if persist else None
+        agg = None
+        if disk is not None:
+            with profiler.stage("load from disk cache"):
+                agg = disk.load(dataset_key)
+        if agg is None:
+            agg = build()
+            if disk is not None and (agg.merch_count or agg.gas_count):
+                with profiler.stage("save to disk cache"):
+                    try:
+                        disk.save(dataset_key, agg)
+                    except disk_cache.SAVE_ERRORS:
+                        pass  # a full disk or an unsavable value only costs the next restart a reparse
+        with profiler.stage("finalize"):
+            return agg.finalize()
+
+    with profiler.stage("shared results"):
+        result = shared_results().get_or_build(dataset_key, finalized)
+    publish(*result)
+    return result
+
+
+# ------------------------------------------------------------
+# Sidebar filters (answered from the pre-aggregated cube, see cube.py)
+# ------------------------------------------------------------
+def _drop_stale(key, options):
+    # a new dataset can remove months / warehouses a widget still holds
+    value = st.session_state.get(key)
+    if value is not None and not set(value if isinstance(value, (list, tuple)) else [value]) <= set(options):
+        del st.session_state[key]
+
+
+def _department_order(d):
+    return (not d.isdigit(), int(d) if d.isdigit() else 0, d)
+
+
+def _pick(label, choices, key, **kwargs):
+    """st.multiselect over display labels ({label: value}); returns the picked values."""
+    _drop_stale(key, choices)
+    return [choices[c] for c in st.multiselect(label, options=list(choices), key=key, **kwargs)]
+
+
+def filter_controls(merch, gas):
+    """Month range / warehouse / department pickers -> pipeline.apply_filters kwargs ({} = unfiltered)."""
+    months = sorted(set(merch["cube"].months) | set(gas["cube"].months))
+    if not months:
+        return {}
+    names = {**gas["cube"].warehouse_names(), **merch["cube"].warehouse_names()}
+    taken = list(names.values())
+    warehouses = {
+        (name if taken.count(name) == 1 else f"{name} (#{number})"): number
+        for number, name in sorted(names.items(), key=lambda kv: kv[1])
+    }
+    departments = {
+        (f"Dept {d}" if d else "No department"): d
+        for d in sorted(merch["cube"].departments, key=_department_order)
+    }
+
+    filters = {}
+    with st.sidebar:
+        st.markdown("#### 🔎 Filters")
+        if len(months) > 1:
+            labels = {month_label_from_key(m): m for m in months}
+            options = list(labels)
+            _drop_stale("filter_months", options)
+            first, last = st.select_slider("Months", options=options, value=(options[0], options[-1]),
+                                           key="filter_months")
+            if (first, last) != (options[0], options[-1]):
+                filters["months"] = (labels[first], labels[last])
+
+        picked = _pick("Warehouses", warehouses, "filter_warehouses", placeholder="All warehouses")
+        if picked:
+            filters["warehouses"] = picked
+
+        picked = _pick("Departments", departments, "filter_departments", placeholder="All departments",
+                       help="Merchandise only. Spend, savings and refunds become line-item (pre-tax) sums.")
+        if picked:
+            filters["departments"] = picked
+
+        if filters:
+            st.caption("Filters apply to the KPIs, rewards and spend / gas trends; "
+                       "item tables and price history cover all receipts.")
+    return filters
+
+
+def filter_key(dataset_key, filters):
+    """view_data key for a filtered view of a dataset."""
+    if not filters:
+        return dataset_key
+    return f"{dataset_key}|" + "|".join(f"{k}={sorted(v) if k != 'months' else v}" for k, v in sorted(filters.items()))
+
+
+# ------------------------------------------------------------
+# Local receipt store (opt-in via $COSTCO_RECEIPT_STORE)
+# ------------------------------------------------------------
+@st.cache_resource
+def get_store():
+    return store.open_store()
+
+
+def save_to_store(receipt_store, receipts):
+    """Upsert receipts; brand-new ones are merged into the saved aggregate instead of rebuilding it."""
+    with profiler.stage("store upsert"):
+        return receipt_store.upsert(receipts, fold=pipeline.fold_new_receipts)
+
+
+def load_from_store(receipt_store):
+    """The saved ReceiptAggregate; only reprocess when stored receipts changed in place."""
+    with profiler.stage("load snapshot"):
+        agg = receipt_store.load_snapshot(merge=pipeline.merge_snapshot)
+    if not pipeline.is_current(agg):
+        with profiler.stage("rebuild from store"):
+            agg = engine.aggregate_receipts(receipt_store.iter_receipts())
+            receipt_store.save_snapshot(agg)
+    return agg
+
+
+# ------------------------------------------------------------
+# Performance panel (sidebar, opt-in)
+# ------------------------------------------------------------
+def altair_chart(chart, name="chart"):
+    """st.altair_chart, timed as its own stage (serialising the Vega-Lite spec is not free)."""
+    with profiler.stage(f"render {name}"):
+        st.altair_chart(chart, use_container_width=True)
+
+
+def _stage_table(prof):
+    rows = [
+        {
+            "Stage": "· " * s["depth"] + s["stage"],
+            "Calls": s["calls"],
+            "Time (ms)": s["seconds"] * 1000,
+            "Rows": s["rows"],
+            "Mem Δ (MB)": None if s["mem_delta"] is None else s["mem_delta"] / 2**20,
+        }
+        for s in prof.summary()
+    ]
+    rows.append({"Stage": "Total", "Calls": 1, "Time (ms)": (prof.seconds or 0.0) * 1000,
+                 "Rows": None, "Mem Δ (MB)": None})
+    return pd.DataFrame(rows)
+
+
+def performance_panel(prof, load_prof=None):
+    """Per-stage wall time, rows and memory for this rerun (and the last data load), with trace downloads."""
+    if prof is None:
+        return
+    with st.sidebar:
+        st.markdown("#### ⏱ Performance")
+        sections = [("This rerun", prof, "perf_trace_rerun")]
+        if load_prof is not None and load_prof is not prof:
+            sections.insert(0, ("Last data load", load_prof, "perf_trace_load"))
+        for title, p, key in sections:
+            st.caption(title)
+            st.dataframe(
+                _stage_table(p),
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "Time (ms)": st.column_config.NumberColumn(format="%.1f"),
+                    "Mem Δ (MB)": st.column_config.NumberColumn(format="%.1f"),
+                },
+            )
+            st.download_button(
+                "Download trace",
+                p.to_trace(),
+                file_name=f"costco-{key.rsplit('_', 1)[-1]}-trace.json",
+                mime="application/json",
+                key=key,
+            )
+        c = shared_results().stats()
+        st.caption(f"Shared results: {c['entries']} datasets, {c['bytes'] / (1 << 20):,.1f} of "
+                   f"{c['budget'] / (1 << 20):,.0f} MB · {c['hits']} hits, {c['misses']} misses, "
+                   f"{c['evictions']} evicted")
@@ -0,0 +1,95 @@
+import numpy as np
+
+import parallel
+import profiler
+from aggregates import merge_all
+from ingest import file_fingerprint
+
+
+# ------------------------------------------------------------
+# Incremental recompute for the file uploader
+# ------------------------------------------------------------
+# One partial aggregate per uploaded file lives in session state. When the upload
+# list changes, only files that are new (or whose set of already-counted receipts
+# changed because an earlier file was removed) are parsed again; everything else
+# is reused and the partials are re-merged. Merging costs distinct items and days,
+# not receipts; aggregates can't be un-merged, so removing a file merges the rest
+# again rather than subtracting it.
+#
+# Each receipt is owned by the first upload that contains it. A file entry keeps
+# its receipts as sorted 8-byte key digests (see parallel.digest), not the key
+# strings, plus the digests it skipped in favour of an earlier file. A new file is
+# parsed skipping what the files already loaded before it count, so an export
+# that overlaps older ones is read once; it is read again only when another new
+# file ahead of it in the same upload also overlaps it.
+
+_NONE = np.empty(0, dtype=np.uint64)
+
+
+class UploadAggregates:
+    """Per-file ReceiptAggregates for the current upload list, plus their merged total."""
+
+    def __init__(self):
+        self.entries = []   # [{"sig", "name", "digests", "excluded", "agg"}] in upload order
+        self.total = merge_all([])
+
+    def signatures(self):
+        return [e["sig"] for e in self.entries]
+
+    def update(self, file_list):
+        """Bring the partials in line with `file_list`. Returns True if anything changed."""
+        sigs = [file_fingerprint(f) for f in file_list]
+        old_sigs = self.signatures()
+        if sigs == old_sigs:
+            return False
+        old = {e["sig"]: e for e in self.entries}
+
+        # 1) parse only the files we have never seen, each skipping what the kept files before it count
+        new, excludes = [], []
+        counted = _NONE
+        for i, (f, sig) in enumerate(zip(file_list, sigs)):
+            if sig in old:
+                counted = np.union1d(counted, old[sig]["digests"])
+            else:
+                new.append((i, f))
+                excludes.append(counted)
+        with profiler.stage("parse new files", rows=len(new)):
+            parsed = dict(zip(
+                (i for i, _ in new),
+                parallel.map_files([f.name for _, f in new], [f.getvalue() for _, f in new], excludes),
+            ))
+
+        # 2) walk in upload order and settle which file owns each receipt
+        entries = []
+        redo = []
+        seen = _NONE
+        for i, (f, sig) in enumerate(zip(file_list, sigs)):
+            entry = old.get(sig)
+            if entry is None:
+                digests, skipped, agg = parsed[i]
+                entry = {"sig": sig, "name": f.name, "digests": digests, "excluded": skipped, "agg": agg}
+            excluded = np.intersect1d(entry["digests"], seen, assume_unique=True)
+            if not np.array_equal(excluded, entry["excluded"]):
+                # ownership moved: aggregate again, skipping receipts an earlier file counts
+                entry = dict(entry, excluded=excluded)
+                redo.append((i, f, excluded))
+            entries.append(entry)
+            seen = np.union1d(seen, entry["digests"])
+
+        if redo:
+            with profiler.stage("re-aggregate files", rows=len(redo)):
+                fixed = parallel.map_files([f.name for _, f, _ in redo], [f.getvalue() for _, f, _ in redo],
+                                           [ex for _, _, ex in redo])
+            for (i, _, _), (_, _, agg) in zip(redo, fixed):
+                entries[i]["agg"] = agg
+
+        # 3) total: when files were only appended, merge the new partials into the old total
+        appended = len(entries) >= len(self.entries) and all(a is b for a, b in zip(entries, self.entries))
+        with profiler.stage("merge partials", rows=len(entries)):
+            if appended:
+                self.total = self.total.merge(merge_all(e["agg"] for e in entries[len(self.entries):]))
+            else:
+                self.total = merge_all(e["agg"] for e in entries)
+
+        self.entries = entries
+        return True
@@ -0,0 +1,290 @@
+import codecs
+import gzip
+import hashlib
+import io
+import json
+import mmap
+
+import lineitems
+import schema
+
+try:
+    import zstandard
+except ImportError:  # optional: .json.zst uploads need it, nothing else does
+    zstandard = None
+
+
+# ------------------------------------------------------------
+# Streaming receipt reader
+# ------------------------------------------------------------
+# The downloader writes one big JSON array of receipt objects. Instead of
+# pd.read_json -> to_dict (which holds the text, a DataFrame and the dicts at
+# once), decode the array one receipt at a time from fixed-size chunks.
+
+CHUNK_SIZE = 1 << 20  # 1 MiB of text per read
+_WHITESPACE = " \t\n\r"
+
+
+def iter_receipts(f, chunk_size=CHUNK_SIZE):
+    """
+    Yield receipt dicts from a file-like object holding a JSON array.
+    Raises ValueError if the file is not an array of objects.
+    """
+    if hasattr(f, "seek") and f.seekable():
+        f.seek(0)
+
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if isinstance(chunk, bytes):
+            chunk = text_decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        # skip whitespace / separators between values
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            fill()
+
+        if pos >= len(buf):
+            raise ValueError("Each JSON must contain an array of receipt objects." if not started
+                             else "Unexpected end of file inside the receipt array.")
+
+        ch = buf[pos]
+        if not started:
+            if ch != "[":
+                raise ValueError("Each JSON must contain an array of receipt objects.")
+            started = True
+            pos += 1
+            continue
+        if ch == "]":
+            return
+        if ch == ",":
+            pos += 1
+            continue
+
+        # decode one value; pull more text until it is complete
+        while True:
+            try:
+                rec, end = decoder.raw_decode(buf, pos)
+                # a number at the buffer edge may be truncated; make sure something follows it
+                if end == len(buf) and not eof:
+                    raise json.JSONDecodeError("need more data", buf, end)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+
+        if not isinstance(rec, dict):
+            raise ValueError("Each JSON must contain an array of receipt objects.")
+        pos = end
+        yield rec
+
+
+def iter_ndjson(f):
+    """Yield receipt dicts from newline-delimited JSON (one receipt object per line), line by line."""
+    for n, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {n}: {e}") from e
+        if not isinstance(rec, dict):
+            raise ValueError(f"line {n}: each line must hold one receipt object.")
+        yield rec
+
+
+# ------------------------------------------------------------
+# Upload formats
+# ------------------------------------------------------------
+# Besides the downloader's JSON array, uploads may be newline-delimited JSON,
+# either of them gzip- or zstd-compressed (exports compress ~10x, which keeps big
+# histories under upload limits), or flattened Parquet line items (lineitems.py).
+# The format is recognised from the content, not the file name, and everything is
+# decoded as a stream.
+
+UPLOAD_TYPES = ["json", "ndjson", "jsonl", "gz", "zst", "parquet"]
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_LEADING = b" \t\n\r\xef\xbb\xbf"  # whitespace and a UTF-8 BOM
+
+
+def _decompressed(f):
+    head = f.read(4)
+    f.seek(0)
+    if head[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=f, mode="rb")
+    if head == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ValueError("Zstandard-compressed receipts need zstandard (pip install zstandard).")
+        return zstandard.ZstdDecompressor().stream_reader(f, closefd=False)
+    return f
+
+
+def _buffer(f):
+    # the bytes of an uncompressed upload without copying them: BytesIO's own buffer or a file map
+    if isinstance(f, io.BytesIO):
+        return f.getbuffer()
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+
+
+def _iter_typed_array(f):
+    buf = _buffer(f)
+    if buf is None:
+        yield from iter_receipts(f)
+        return
+    try:
+        yield from schema.iter_array(buf)
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+
+def iter_upload(f, typed=False):
+    """
+    Yield receipt dicts from a binary file-like object in any upload format: a JSON array or
+    NDJSON (optionally .gz / .zst compressed) or flattened Parquet line items.
+    typed=True yields schema.Receipt structs instead where it can (msgspec installed, JSON
+    input) - for callers that only aggregate, not for ones that store receipts as they came.
+    Raises ValueError if the content is none of them.
+    """
+    f.seek(0)
+    if f.read(4) == lineitems.MAGIC:
+        f.seek(0)
+        yield from lineitems.iter_receipts(f)
+        return
+    f.seek(0)
+    typed = typed and schema.available()
+    raw = _decompressed(f)
+    stream = io.BufferedReader(raw, CHUNK_SIZE)
+    try:
+        try:
+            head = stream.peek(CHUNK_SIZE).lstrip(_LEADING)
+        except (OSError, EOFError) as e:  # truncated / corrupt gzip or zstd data
+            raise ValueError(f"Could not decompress: {e}") from e
+        if head[:1] == b"{":
+            yield from (schema.iter_lines(stream) if typed else iter_ndjson(stream))
+        elif typed and head[:1] == b"[" and raw is f:
+            # a whole array needs the bytes at hand: only uncompressed input takes this path
+            yield from _iter_typed_array(stream.detach())
+        else:
+            yield from iter_receipts(stream)
+    except (OSError, EOFError) as e:
+        raise ValueError(f"Could not decompress: {e}") from e
+    finally:
+        if stream.raw is not None:
+            stream.detach()  # leave the caller's file open
+
+
+def _open_text(path, name):
+    if name.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8")
+    if name.endswith(".zst"):
+        if zstandard is None:
+            raise ValueError("Writing .zst needs zstandard (pip install zstandard).")
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, "wb")), encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+def write_receipts(path, receipts):
+    """
+    Write receipts (list or stream, never all held) in the format `path` names: .parquet
+    (lineitems.py), .ndjson / .jsonl, anything else a JSON array; a trailing .gz / .zst compresses.
+    """
+    name = path.lower()
+    if name.endswith(".parquet"):
+        lineitems.write(path, receipts)
+        return
+    base = name.rsplit(".", 1)[0] if name.endswith((".gz", ".zst")) else name
+    with _open_text(path, name) as out:
+        if base.endswith((".ndjson", ".jsonl")):
+            for rec in receipts:
+                out.write(json.dumps(rec, separators=(",", ":")))
+                out.write("\n")
+            return
+        out.write("[")
+        for n, rec in enumerate(receipts):
+            out.write(",\n" if n else "\n")
+            out.write(json.dumps(rec, separators=(",", ":")))
+        out.write("\n]\n")
+
+
+def file_fingerprint(f):
+    """Content hash of one upload; identical bytes -> identical key."""
+    return hashlib.blake2b(f.getvalue(), digest_size=16).hexdigest()
+
+
+def iter_files(file_list):
+    """Chain receipts from several uploads, naming the file that failed to parse."""
+    for f in file_list:
+        try:
+            yield from iter_upload(f)
+        except ValueError as e:
+            raise ValueError(f"Invalid receipt file {f.name}: {e}") from e
+
+
+# ------------------------------------------------------------
+# Receipt identity / dedupe
+# ------------------------------------------------------------
+KEY_FALLBACK_FIELDS = ("warehouseNumber", "registerNumber", "transactionNumber", "transactionDateTime", "transactionDate")
+
+
+def _canonical_value(field, v):
+    # the same value whichever way it was decoded: JSON (12 / "12.50"), a struct (12.0), Parquet ("115")
+    if field in schema.NUMBERS:
+        return schema.number(v)
+    return None if v is None or v == "" else str(v)
+
+
+def _canonical(rec):
+    """The fields every decoding path keeps (see schema.RECEIPT_FIELDS), normalized alike."""
+    out = {f: _canonical_value(f, rec.get(f)) for f in schema.RECEIPT_FIELDS}
+    out["itemArray"] = [
+        {f: _canonical_value(f, item.get(f)) for f in schema.ITEM_FIELDS}
+        for item in rec.get("itemArray") or [] if hasattr(item, "get")
+    ]
+    return out
+
+
+def receipt_key(rec):
+    """
+    transactionBarcode when present, else warehouse/register/transaction number + timestamp.
+    Receipts with neither are keyed by a hash of the fields the dashboard reads, the same for a
+    dict, a schema struct or a Parquet row, so only copies of the same receipt collapse.
+    """
+    barcode = rec.get("transactionBarcode")
+    if barcode:
+        return str(barcode)
+    if rec.get("transactionNumber"):
+        return "|".join(str(rec.get(k) or "") for k in KEY_FALLBACK_FIELDS)
+    body = json.dumps(_canonical(rec), sort_keys=True, separators=(",", ":"))
+    return "sha1:" + hashlib.sha1(body.encode()).hexdigest()
+
+
+def unique_receipts(receipts):
+    """Drop receipts already seen (overlapping exports, the same file uploaded twice)."""
+    seen = set()
+    for rec in receipts:
+        key = receipt_key(rec)
+        if key in seen:
+            continue
+        seen.add(key)
+        yield rec
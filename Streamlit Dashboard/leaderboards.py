@@ -0,0 +1,75 @@
+from operator import itemgetter
+
+import numpy as np
+
+
+# ------------------------------------------------------------
+# Top-K item leaderboards
+# ------------------------------------------------------------
+# item_stats is walked once into NumPy columns. Every ranked table is then a
+# mask + partition over one column (O(n), plus sorting the winners and any items
+# tied with the last of them) instead of building and fully sorting a DataFrame
+# per table.
+
+NUMERIC_FIELDS = ("total_spent", "total_units", "purchases", "first_price", "last_price", "min_price", "max_price")
+
+
+def _bought(cols):
+    return (cols["total_units"] > 0) & (cols["total_spent"] > 0)
+
+
+# name -> sort column, how many rows, direction and which items qualify
+LEADERBOARDS = {
+    "most_expensive":   {"sort": "max_price",   "k": 10, "where": lambda c: c["max_price"] > 0},
+    "most_total_spent": {"sort": "total_spent", "k": 10, "where": _bought},
+    "most_purchased":   {"sort": "total_units", "k": 10, "where": _bought},
+    "price_increase":   {"sort": "price_diff",  "k": 50, "where": lambda c: c["price_diff"] > 0},
+    "price_decrease":   {"sort": "price_diff",  "k": 50, "where": lambda c: c["price_diff"] < 0, "ascending": True},
+}
+
+
+def item_columns(item_stats):
+    """item_stats -> {column: array}, plus derived avg_price / price_diff / price_range."""
+    stats = list(item_stats.values())
+    n = len(stats)
+    get = itemgetter(*NUMERIC_FIELDS)
+    values = np.array([get(s) for s in stats], dtype=np.float64).reshape(n, len(NUMERIC_FIELDS))
+
+    cols = {f: values[:, i] for i, f in enumerate(NUMERIC_FIELDS)}
+    cols["itemNumber"] = np.array([s["itemNumber"] for s in stats], dtype=object)
+    cols["name"] = np.array([s["name"] for s in stats], dtype=object)
+    units = cols["total_units"]
+    cols["avg_price"] = np.divide(cols["total_spent"], units, out=np.zeros(n), where=units > 0)
+    cols["price_diff"] = cols["last_price"] - cols["first_price"]
+    cols["price_range"] = cols["max_price"] - cols["min_price"]
+    return cols
+
+
+def top_k(values, k, ascending=False, mask=None):
+    """Positions of the k largest (smallest if ascending) values, best first; ties keep item order."""
+    idx = np.flatnonzero(mask) if mask is not None else np.arange(len(values))
+    if k <= 0:
+        return idx[:0]
+    keys = values[idx] if ascending else -values[idx]
+    if k < len(idx):
+        # keep every item at least as good as the k-th: argpartition picks an arbitrary
+        # subset of the items tied at the boundary, the sort below picks by item order
+        keep = keys <= np.partition(keys, k - 1)[k - 1]
+        idx, keys = idx[keep], keys[keep]
+    return idx[np.lexsort((idx, keys))][:k]
+
+
+def rank(item_stats, boards=None):
+    """(columns, {board name: row positions}) for every board in one go."""
+    boards = LEADERBOARDS if boards is None else boards
+    cols = item_columns(item_stats)
+    ranked = {}
+    for name, spec in boards.items():
+        where = spec.get("where")
+        ranked[name] = top_k(
+            cols[spec["sort"]],
+            spec["k"],
+            ascending=spec.get("ascending", False),
+            mask=where(cols) if where else None,
+        )
+    return cols, ranked
@@ -0,0 +1,169 @@
+from itertools import islice
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: without pyarrow, Parquet uploads are rejected with a clear error
+    pa = pq = None
+
+
+# ------------------------------------------------------------
+# Flattened Parquet line-item format
+# ------------------------------------------------------------
+# One row per itemArray entry with its receipt's fields repeated alongside
+# (receipts without items get one row with empty item fields); "receipt" numbers
+# the receipts and "line" the items within one. tenderArray / subTaxes are not
+# kept. Repeated receipt fields cost next to nothing once dictionary-encoded and
+# compressed, and the dashboard reads only the READ_COLUMNS it needs (projection
+# pushdown), so a multi-year history loads a fraction of the bytes a JSON export
+# has to decode.
+#
+#   python convert.py costco-2023-2025.json costco-2023-2025.parquet
+
+RECEIPT_FIELDS = (
+    "warehouseName", "receiptType", "documentType", "transactionDateTime", "transactionDate",
+    "companyNumber", "warehouseNumber", "operatorNumber", "warehouseShortName", "registerNumber",
+    "transactionNumber", "transactionType", "transactionBarcode", "total", "warehouseAddress1",
+    "warehouseAddress2", "warehouseCity", "warehouseState", "warehouseCountry", "warehousePostalCode",
+    "totalItemCount", "subTotal", "taxes", "invoiceNumber", "sequenceNumber", "instantSavings",
+    "membershipNumber",
+)
+ITEM_FIELDS = (
+    "itemNumber", "itemDescription01", "frenchItemDescription1", "itemDescription02",
+    "frenchItemDescription2", "itemIdentifier", "itemDepartmentNumber", "unit", "amount", "taxFlag",
+    "merchantID", "entryMethod", "transDepartmentNumber", "fuelUnitQuantity", "fuelGradeCode",
+    "itemUnitPriceAmount", "fuelUomCode", "fuelUomDescription", "fuelUomDescriptionFr",
+    "fuelGradeDescription", "fuelGradeDescriptionFr",
+)
+NUMERIC_FIELDS = frozenset((
+    "total", "subTotal", "taxes", "instantSavings", "totalItemCount",
+    "unit", "amount", "fuelUnitQuantity", "itemUnitPriceAmount",
+))
+
+# what engine._flatten_batch, ingest.receipt_key and the receipt store read
+READ_COLUMNS = (
+    "receipt", "line",
+    "transactionBarcode", "warehouseNumber", "registerNumber", "transactionNumber",
+    "transactionDateTime", "transactionDate", "warehouseName", "receiptType", "documentType",
+    "transactionType", "total", "subTotal", "instantSavings", "membershipNumber",
+    "itemNumber", "itemDescription01", "itemDepartmentNumber", "unit", "amount",
+    "fuelUnitQuantity", "itemUnitPriceAmount", "fuelGradeCode", "fuelGradeDescription",
+)
+
+BATCH_SIZE = 5000        # receipts per written row group
+READ_BATCH_SIZE = 1 << 16  # rows per read batch (about a row group: dictionaries are decoded once per batch)
+MAGIC = b"PAR1"
+
+
+def _require():
+    if pq is None:
+        raise ValueError("Parquet receipts need pyarrow (pip install pyarrow)")
+
+
+def schema():
+    fields = [pa.field("receipt", pa.int64()), pa.field("line", pa.int32())]
+    for name in RECEIPT_FIELDS + ITEM_FIELDS:
+        fields.append(pa.field(name, pa.float64() if name in NUMERIC_FIELDS else pa.string()))
+    return pa.schema(fields)
+
+
+def _value(v, numeric):
+    if v is None or v == "":
+        return None
+    if numeric:
+        try:
+            return float(v)
+        except (TypeError, ValueError):
+            return None
+    return str(v)
+
+
+def _table(batch, first):
+    columns = {name: [] for name in ("receipt", "line") + RECEIPT_FIELDS + ITEM_FIELDS}
+    for n, rec in enumerate(batch, first):
+        items = rec.get("itemArray") or [None]
+        for line, item in enumerate(items):
+            columns["receipt"].append(n)
+            columns["line"].append(None if item is None else line)
+            for name in RECEIPT_FIELDS:
+                columns[name].append(_value(rec.get(name), name in NUMERIC_FIELDS))
+            for name in ITEM_FIELDS:
+                columns[name].append(None if item is None else _value(item.get(name), name in NUMERIC_FIELDS))
+    return pa.table(columns, schema=schema())
+
+
+def write(path, receipts, batch_size=BATCH_SIZE):
+    """Write receipt dicts (list or stream) as flattened line items, one row group per batch."""
+    _require()
+    it = iter(receipts)
+    first = 0
+    with pq.ParquetWriter(path, schema(), compression="zstd") as writer:
+        while True:
+            batch = list(islice(it, batch_size))
+            if not batch:
+                break
+            writer.write_table(_table(batch, first))
+            first += len(batch)
+
+
+def _values(array):
+    """Arrow column -> object array of Python values (None for nulls); strings are expanded from their dictionary."""
+    if pa.types.is_dictionary(array.type):
+        uniques = np.array(array.dictionary.to_pylist() + [None], dtype=object)
+        return uniques[array.indices.fill_null(len(array.dictionary)).to_numpy()]
+    values = np.array(array.to_numpy(zero_copy_only=False), dtype=object)
+    if array.null_count:
+        values[array.is_null().to_numpy(zero_copy_only=False)] = None
+    return values
+
+
+def iter_receipts(f, columns=READ_COLUMNS, batch_size=READ_BATCH_SIZE):
+    """
+    Yield receipt dicts (only `columns` filled in) from a flattened line-item Parquet file.
+    Only the projected columns are read and decompressed, one batch of rows at a time.
+    Receipt fields are converted from each receipt's first row only, and item text stays
+    dictionary-encoded, so each distinct item number / description is converted once.
+    """
+    _require()
+    try:
+        parquet = pq.ParquetFile(f, read_dictionary=[c for c in columns if c in ITEM_FIELDS and c not in NUMERIC_FIELDS])
+    except (pa.ArrowException, OSError) as e:
+        raise ValueError(f"Not a readable Parquet file: {e}") from e
+    names = set(parquet.schema_arrow.names)
+    if "receipt" not in names:
+        raise ValueError("Parquet receipts need a 'receipt' column (see lineitems.py)")
+    wanted = [c for c in columns if c in names]
+    receipt_fields = [c for c in wanted if c in RECEIPT_FIELDS]
+    item_fields = [c for c in wanted if c in ITEM_FIELDS]
+
+    pending, pending_id = None, None
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=wanted):
+        if not batch.num_rows:
+            continue
+        ids = batch.column("receipt").to_numpy(zero_copy_only=False)
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        # a row is a line item when it has a line number (or, without that column, an item field)
+        marker = "line" if "line" in wanted else (item_fields[0] if item_fields else "receipt")
+        present = batch.column(marker).is_valid().to_numpy(zero_copy_only=False) & bool(item_fields)
+        item_rows = pa.array(np.flatnonzero(present))
+        items = [dict(zip(item_fields, row))
+                 for row in zip(*(_values(batch.column(c).take(item_rows)) for c in item_fields))]
+        counts = np.add.reduceat(present.astype(np.int64), starts)
+        ends = np.cumsum(counts)
+        first_rows = pa.array(starts)
+        rows = zip(ids[starts].tolist(), (ends - counts).tolist(), ends.tolist(),
+                   zip(*(_values(batch.column(c).take(first_rows)) for c in receipt_fields)))
+        for n, lo, hi, values in rows:
+            if n == pending_id:
+                # the receipt continues from the previous batch
+                pending["itemArray"].extend(items[lo:hi])
+                continue
+            if pending is not None:
+                yield pending
+            pending = dict(zip(receipt_fields, values))
+            pending["itemArray"] = items[lo:hi]
+            pending_id = n
+    if pending is not None:
+        yield pending
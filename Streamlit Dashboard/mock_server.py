@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import bisect
+import json
+import random
+from datetime import date
+
+import synthetic
+from fetch import parse_date
+
+try:
+    from aiohttp import web
+except ImportError:  # optional, like fetch.py
+    web = None
+
+
+# ------------------------------------------------------------
+# Local stand-in for the orders GraphQL API
+# ------------------------------------------------------------
+# Answers receiptsWithCounts queries with synthetic receipts (synthetic.py, so
+# the same seed always serves the same receipts) in the real response shape, so
+# fetch.py can be tried and load-benchmarked offline:
+#
+#   python mock_server.py --per-day 3 --latency 0.2 --fail-rate 0.1
+#   python fetch.py 01/01/2022 12/31/2024 --url http://127.0.0.1:8787/graphql
+#
+# --latency (plus a little per receipt) mimics a slow backend; --fail-rate answers
+# that share of requests with a 503 (with a Retry-After header if --retry-after is
+# given) so the client's retries get exercised. Any non-empty Costco-X-Authorization
+# header is accepted.
+
+PORT = 8787
+PATH = "/graphql"
+START = date(2022, 1, 1)
+DAYS = 3 * 365
+
+
+class ReceiptIndex:
+    """Synthetic receipts, pre-serialized and sorted by transactionDate for range lookups."""
+
+    def __init__(self, per_day=3.0, start=START, days=DAYS, seed=0, **options):
+        receipts = synthetic.generate_receipts(int(per_day * days), start=start, days=days, seed=seed, **options)
+        rows = sorted((r["transactionDate"], json.dumps(r, separators=(",", ":"))) for r in receipts)
+        self.dates = [d for d, _ in rows]
+        self.bodies = [b for _, b in rows]
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def between(self, start, end):
+        """Serialized receipts dated start..end inclusive."""
+        lo = bisect.bisect_left(self.dates, start.isoformat())
+        hi = bisect.bisect_right(self.dates, end.isoformat())
+        return self.bodies[lo:hi]
+
+
+def _response(bodies):
+    return ('{"data":{"receiptsWithCounts":{"receipts":[' + ",".join(bodies) + "]}}}").encode()
+
+
+def _error(message, status=200):
+    return web.json_response({"errors": [{"message": message}]}, status=status)
+
+
+def make_app(index, latency=0.0, per_receipt=0.0005, fail_rate=0.0, seed=0, retry_after=None):
+    """aiohttp application serving `index` (a ReceiptIndex) at PATH; app["stats"] counts requests."""
+    if web is None:
+        raise SystemExit("The mock server needs aiohttp (pip install aiohttp)")
+    rng = random.Random(seed)
+    stats = {"requests": 0, "failed": 0, "receipts": 0}
+
+    async def graphql(request):
+        stats["requests"] += 1
+        if not request.headers.get("Costco-X-Authorization", "").replace("Bearer", "").strip():
+            return web.Response(status=401)
+        if rng.random() < fail_rate:
+            stats["failed"] += 1
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+            return web.Response(status=503, headers=headers)
+        try:
+            variables = json.loads(await request.read())["variables"]
+            start, end = parse_date(variables["startDate"]), parse_date(variables["endDate"])
+        except (ValueError, KeyError, TypeError) as e:
+            return _error(f"Bad receiptsWithCounts request: {e}", status=400)
+        bodies = index.between(start, end)
+        await asyncio.sleep(latency + per_receipt * len(bodies))
+        stats["receipts"] += len(bodies)
+        return web.Response(body=_response(bodies), content_type="application/json")
+
+    app = web.Application(client_max_size=1 << 20)
+    app.router.add_post(PATH, graphql)
+    app["stats"] = stats
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve synthetic receipts the way the Costco orders API does.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--start", default=START.isoformat(), help="first receipt day (default %(default)s)")
+    parser.add_argument("--days", type=int, default=DAYS, help="days of receipts (default %(default)s)")
+    parser.add_argument("--per-day", type=float, default=3.0, help="receipts per day")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--retry-after", type=float, help="seconds to send as Retry-After with those 503s")
+    args = parser.parse_args(argv)
+
+    index = ReceiptIndex(args.per_day, start=parse_date(args.start), days=args.days, seed=args.seed)
+    print(f"{len(index):,} receipts from {index.dates[0] if index.dates else '-'} "
+          f"to {index.dates[-1] if index.dates else '-'} at http://{args.host}:{args.port}{PATH}")
+    web.run_app(make_app(index, args.latency, fail_rate=args.fail_rate, seed=args.seed, retry_after=args.retry_after),
+                host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
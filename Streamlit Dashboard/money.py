@@ -0,0 +1,31 @@
+import numpy as np
+
+
+# ------------------------------------------------------------
+# Money as integer cents
+# ------------------------------------------------------------
+# Receipt amounts (total, subTotal, instantSavings, line amounts) are rounded to
+# whole cents once, when a batch is flattened (see engine._flatten_batch), and
+# kept as int64 from there on: every total, monthly / daily series, cube cell,
+# fuel row and item sum is an exact integer, however many receipts or merges
+# it took. Summed as float dollars they drifted by cents (0.1 + 0.2 != 0.3).
+#
+# Everything up to the screen is in cents - ReceiptAggregate, the cube, the
+# timelines, pipeline.kpis. Only the display converts back: helper.format_money
+# for text, dollars() for chart axes and the CLI's exported files.
+#
+# Pump prices (itemUnitPriceAmount) have tenths of a cent, so they are kept as
+# float cents, not rounded; so are averages and the gas price_sum (price *
+# gallons), which are ratios rather than amounts anybody paid.
+
+CENTS = 100
+
+
+def to_cents(values):
+    """float64 dollars (array) -> int64 cents, rounded to the nearest cent."""
+    return np.rint(np.asarray(values, dtype=np.float64) * CENTS).astype(np.int64)
+
+
+def dollars(cents):
+    """Cents (number or array) -> float dollars, for display."""
+    return cents / CENTS
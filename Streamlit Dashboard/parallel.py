@@ -0,0 +1,148 @@
+import contextlib
+import hashlib
+import io
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import context as mp_context
+
+import numpy as np
+
+import engine
+import ingest
+
+
+# ------------------------------------------------------------
+# Parallel multi-file ingest
+# ------------------------------------------------------------
+# Each uploaded file is decoded, flattened and aggregated in a worker process,
+# batch by batch (see engine.stream_aggregate). Workers send back only the file's
+# ReceiptAggregate (see aggregates.py) and 8-byte digests of its receipt keys,
+# never the raw receipt dicts; incremental.py merges them.
+
+_pool = None
+_pool_lock = threading.Lock()    # one pool, however many sessions ask at once
+_main_lock = threading.Lock()    # one __main__ swap at a time (see _bare_main)
+
+
+@contextlib.contextmanager
+def _bare_main():
+    # `streamlit run` installs the app script as __main__ (__file__ = streamlit_app.py), and
+    # spawn / forkserver children re-import __main__ from that path as __mp_main__ - which
+    # re-runs the whole app outside Streamlit and kills the worker. Started while __main__
+    # is an empty module, they import nothing but what parse_file needs.
+    with _main_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+# ProcessPoolExecutor starts spawn / forkserver workers on demand, from whichever submit
+# finds no idle one, so every launch - not just the pool's first - goes through _bare_main.
+# (Module level: the child unpickles its process object, so the classes must be importable.)
+class _SpawnWorker(mp_context.SpawnProcess):
+    @staticmethod
+    def _Popen(process_obj):
+        with _bare_main():
+            return mp_context.SpawnProcess._Popen(process_obj)
+
+
+class _SpawnContext(mp_context.SpawnContext):
+    Process = _SpawnWorker
+
+
+if hasattr(mp_context, "ForkServerProcess"):
+    class _ForkServerWorker(mp_context.ForkServerProcess):
+        @staticmethod
+        def _Popen(process_obj):
+            # the first launch also starts the fork server, which imports __main__ the same way
+            with _bare_main():
+                return mp_context.ForkServerProcess._Popen(process_obj)
+
+    class _ForkServerContext(mp_context.ForkServerContext):
+        Process = _ForkServerWorker
+
+
+def _context():
+    # forkserver children start from a clean process, not a fork of Streamlit's threads
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = _ForkServerContext()
+        ctx.set_forkserver_preload(["engine"])
+        return ctx
+    return _SpawnContext()
+
+
+def get_pool():
+    """One pool per server process, sized to the machine."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=_context())
+        return _pool
+
+
+def _discard(pool):
+    """Shut a broken pool down and forget it; the next get_pool() starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def digest(key):
+    """Receipt key -> 64-bit digest (the same in every process, unlike hash())."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+
+def _digests(values):
+    return np.unique(np.fromiter(values, dtype=np.uint64))
+
+
+def parse_file(name, data, exclude=None):
+    """
+    Worker: upload bytes (any ingest.UPLOAD_TYPES format) -> (digests, skipped, ReceiptAggregate)
+    for one file: sorted uint64 digests of all its receipt keys and the subset that was skipped
+    because it is in `exclude` (digests already counted from an earlier file).
+    """
+    exclude = set(exclude.tolist()) if exclude is not None else set()
+    seen, skipped = set(), set()
+
+    def owned(receipts):
+        # first copy of each receipt, unless an earlier file already counted it
+        for rec in receipts:
+            d = digest(ingest.receipt_key(rec))
+            if d in seen:
+                continue
+            seen.add(d)
+            if d in exclude:
+                skipped.add(d)
+                continue
+            yield rec
+
+    try:
+        agg = engine.stream_aggregate(owned(ingest.iter_upload(io.BytesIO(data), typed=True)))
+    except ValueError as e:
+        raise ValueError(f"Invalid receipt file {name}: {e}") from e
+    return _digests(seen), _digests(skipped), agg
+
+
+def map_files(names, payloads, excludes=None):
+    """[(digests, skipped, aggregate)] per file, parsed side by side in the pool (a single file stays in-process)."""
+    excludes = excludes or [None] * len(names)
+    if len(names) <= 1:
+        return list(map(parse_file, names, payloads, excludes))
+    pool = get_pool()
+    try:
+        return list(pool.map(parse_file, names, payloads, excludes))
+    except BrokenProcessPool:
+        # no usable worker processes on this host: do the same work in-process
+        _discard(pool)
+        return list(map(parse_file, names, payloads, excludes))
@@ -0,0 +1,242 @@
+from datetime import timedelta
+from itertools import chain
+
+import pandas as pd
+
+import engine
+import fuel
+import ingest
+import leaderboards
+import profiler
+from aggregates import FORMAT_VERSION, ReceiptAggregate, merge_all
+
+
+# ------------------------------------------------------------
+# Headless processing API
+# ------------------------------------------------------------
+# Everything the dashboard derives from receipts, without Streamlit: the app
+# (through helper.py) and cli.py both call these. Nothing here touches
+# st.session_state, so it runs in scripts, workers and nightly jobs.
+
+REWARD_RATE = 0.02  # Executive membership: 2% back on the pre-tax subtotal
+
+# kpis / window_kpis values that are money - cents, like everything here (see money.py)
+MONEY_KPIS = (
+    "total_spent", "total_savings", "executive_reward", "merch_spent", "avg_per_trip",
+    "refund_total", "gas_spent", "gas_avg_price",
+)
+
+# date-window presets for window_kpis (days, ending on the latest receipt)
+WINDOWS = {"Last 30 days": 30, "Last 90 days": 90, "Last 365 days": 365}
+
+
+def process_receipts(receipts):
+    """
+    Receipt dicts (list or stream) -> (merch, gas, all_locations, date_range_str).
+    Receipts are aggregated batch by batch and not kept, so the result holds counts,
+    the date range and aggregates only (see engine.stream_aggregate).
+    """
+    with profiler.stage("stream receipts"):
+        agg = engine.stream_aggregate(receipts)
+    with profiler.stage("finalize"):
+        return agg.finalize()
+
+
+def _iter_path(path):
+    with open(path, "rb") as f:
+        try:
+            yield from ingest.iter_upload(f, typed=True)
+        except ValueError as e:
+            raise ValueError(f"Invalid receipt file {path}: {e}") from e
+
+
+def aggregate_files(paths):
+    """Stream JSON exports from disk into one ReceiptAggregate; receipts in several files count once."""
+    return engine.aggregate_receipts(ingest.unique_receipts(chain.from_iterable(map(_iter_path, paths))))
+
+
+def is_current(agg):
+    """True for a ReceiptAggregate in today's layout (older pickled snapshots are rebuilt, not merged into)."""
+    return isinstance(agg, ReceiptAggregate) and getattr(agg, "version", None) == FORMAT_VERSION
+
+
+def fold_new_receipts(inserted):
+    """Newly stored receipts -> the snapshot part they add (the `fold` for ReceiptStore.upsert)."""
+    return engine.aggregate_receipts(inserted)
+
+
+def merge_snapshot(parts):
+    """Saved snapshot parts -> one ReceiptAggregate (the `merge` for ReceiptStore.load_snapshot)."""
+    if not all(map(is_current, parts)):
+        return None
+    return merge_all(parts)
+
+
+def executive_rewards(subtotal_by_year, rate=REWARD_RATE):
+    """([{"Year", "Qualifying Spend", "2% Cashback"}] newest year first, total reward), in cents."""
+    rows = []
+    total = 0
+    for y in sorted(subtotal_by_year, reverse=True):
+        sub = subtotal_by_year[y]
+        rew = round(sub * rate)  # each year's reward is paid in whole cents
+        total += rew
+        rows.append({"Year": y, "Qualifying Spend": sub, "2% Cashback": rew})
+    return rows, total
+
+
+def kpis(merch, gas, all_locations, date_range_str=None):
+    """The headline numbers shown on the KPIs tab, as plain numbers (money in cents, see MONEY_KPIS)."""
+    _, rewards = executive_rewards(merch["subtotal_by_year"])
+    return {
+        "date_range": date_range_str,
+        "total_spent": merch["total_spent"] + gas["total_spent"],
+        "total_savings": merch["Total Savings"],
+        "executive_reward": rewards,
+        "locations": len(all_locations),
+        "merch_spent": merch["total_spent"],
+        "merch_trips": merch["count"],
+        "avg_per_trip": merch["total_spent"] / merch["count"] if merch["count"] else 0.0,
+        "total_units": merch["total_units"],
+        "unique_items": len(merch["item_stats"]),
+        "refund_total": merch["refund_total"],
+        "refund_count": merch["refund_count"],
+        "merch_locations": len(merch["locations"]),
+        "gas_spent": gas["total_spent"],
+        "gas_gallons": gas["total_gallons"],
+        "gas_avg_price": gas["price_sum"] / gas["total_gallons"] if gas["total_gallons"] > 0 else 0.0,
+        "gas_trips": gas["count"],
+        "gas_locations": len(gas["locations"]),
+    }
+
+
+def timeline_bounds(merch, gas):
+    """(first, last) receipt date as datetime.date, or (None, None) without receipts."""
+    days = [d for t in (merch["timeline"], gas["timeline"]) for d in (t.first_day, t.last_day) if d is not None]
+    if not days:
+        return None, None
+    return min(days).astype(object), max(days).astype(object)
+
+
+def last_days(end, days):
+    """(start, end) of the `days`-long window ending on `end` (inclusive)."""
+    return end - timedelta(days=days - 1), end
+
+
+def year_earlier(start, end):
+    """The same calendar window one year back (Feb 29 falls back to Feb 28)."""
+    shift = pd.DateOffset(years=1)
+    return (pd.Timestamp(start) - shift).date(), (pd.Timestamp(end) - shift).date()
+
+
+def window_kpis(merch, gas, start=None, end=None):
+    """
+    Headline numbers for receipts dated start..end (inclusive), read from the prefix-sum timelines.
+    Amounts are int cents like kpis(); the timelines hold whole cents as float64, so int() is exact.
+    """
+    m = merch["timeline"].window(start, end)
+    g = gas["timeline"].window(start, end)
+    return {
+        "start": start,
+        "end": end,
+        "total_spent": int(m["total"] + g["total"]),
+        "merch_spent": int(m["total"]),
+        "merch_trips": int(m["trips"]),
+        "avg_per_trip": m["total"] / m["trips"] if m["trips"] else 0.0,
+        "total_savings": int(m["instantSavings"]),
+        "executive_reward": round(m["subTotal"] * REWARD_RATE),
+        "refund_total": int(m["refund_total"]),
+        "refund_count": int(m["refund_count"]),
+        "gas_spent": int(g["total"]),
+        "gas_gallons": g["gallons"],
+        "gas_avg_price": g["price_sum"] / g["gallons"] if g["gallons"] > 0 else 0.0,
+        "gas_trips": int(g["trips"]),
+    }
+
+
+def _years(monthly, measure):
+    out = {}
+    for k, v in monthly.items():
+        out[int(k[:4])] = out.get(int(k[:4]), 0) + v[measure]
+    return out
+
+
+def apply_filters(merch, gas, months=None, warehouses=None, departments=None):
+    """
+    (merch, gas, all_locations) for a month range ('YYYY-MM', 'YYYY-MM') / warehouseNumbers /
+    itemDepartmentNumbers, answered from the pre-aggregated cube (see cube.py).
+    Departments only apply to merchandise and switch its spend, savings and refunds to
+    line-item (pre-tax) sums. Headline numbers and the series are filtered; item_stats are
+    not, and the "daily" series become monthly ('YYYY-MM-01' keys). The fuel table keeps
+    its daily rows.
+    """
+    totals, monthly, merch_locations = merch["cube"].select(months, warehouses, departments)
+    if departments is None:
+        units = merch["cube"].select(months, warehouses, lines=True)[0]["units"]
+        subtotal = _years(monthly, "subtotal")
+    else:
+        units = totals["units"]
+        subtotal = _years(monthly, "spend")
+    merch = dict(
+        merch,
+        total_spent=totals["spend"],
+        count=int(totals["trips"]),
+        refund_total=totals["refund_total"],
+        refund_count=int(totals["refund_count"]),
+        total_units=units,
+        locations=merch_locations,
+        subtotal_by_year=dict(sorted(subtotal.items())),
+        monthly={k: {"spent": v["spend"]} for k, v in monthly.items()},
+        daily={f"{k}-01": v["spend"] for k, v in monthly.items()},
+    )
+    merch["Total Savings"] = totals["savings"]
+
+    totals, monthly, gas_locations = gas["cube"].select(months, warehouses)
+    gas = dict(
+        gas,
+        total_spent=totals["spend"],
+        count=int(totals["trips"]),
+        total_gallons=totals["gallons"],
+        price_sum=totals["price_sum"],
+        locations=gas_locations,
+        monthly={k: {"spent": v["spend"]} for k, v in monthly.items()},
+        daily={f"{k}-01": v["spend"] for k, v in monthly.items()},
+        fuel=fuel.select(gas["fuel"], months, warehouses),
+    )
+    return merch, gas, merch_locations | gas_locations
+
+
+def monthly_frame(merch, gas):
+    """One row per month: merch / gas spend plus spend and gallons per fuel grade (e.g. regular_spend)."""
+    grades = fuel.monthly(gas["fuel"])
+    months = sorted(set(merch["monthly"]) | set(gas["monthly"]) | set(grades.index))
+    frame = pd.DataFrame({
+        "month_key": months,
+        "merch_spent": [merch["monthly"].get(k, {}).get("spent", 0) for k in months],
+        "gas_spent": [gas["monthly"].get(k, {}).get("spent", 0) for k in months],
+    })
+    if not grades.empty:
+        grades = grades.reindex(months, fill_value=0)
+        for grade in fuel.order(grades["spend"].columns):
+            frame[f"{fuel.slug(grade)}_spend"] = grades["spend"][grade].to_numpy()
+            frame[f"{fuel.slug(grade)}_gallons"] = grades["gallons"][grade].to_numpy()
+    return frame
+
+
+def item_frame(item_stats):
+    """One row per item with totals, price range and first / last purchase date."""
+    cols = leaderboards.item_columns(item_stats)
+    histories = [s["price_history"] for s in item_stats.values()]
+    return pd.DataFrame({
+        "itemNumber": cols["itemNumber"],
+        "name": cols["name"],
+        "purchases": cols["purchases"].astype("int64"),
+        "total_spent": cols["total_spent"],
+        "total_units": cols["total_units"],
+        "avg_price": cols["avg_price"],
+        "first_price": cols["first_price"],
+        "last_price": cols["last_price"],
+        "min_price": cols["min_price"],
+        "max_price": cols["max_price"],
+        "first_purchase": pd.to_datetime([h.dates[0] for h in histories]),
+        "last_purchase": pd.to_datetime([h.dates[-1] for h in histories]),
+    })
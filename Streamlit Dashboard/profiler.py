@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# ------------------------------------------------------------
+# Stage profiler
+# ------------------------------------------------------------
+# Processing code wraps its stages in `with profiler.stage("name") as s:` and may
+# set s["rows"]. Nothing is recorded unless a profile is active on the current
+# thread (each Streamlit session reruns on its own thread), so the hooks cost a
+# thread-local lookup when the performance panel is off.
+#
+# Memory deltas are resident-set-size changes of the whole process, read from
+# /proc where available; they are indicative, not exact per-stage allocations.
+
+_local = threading.local()
+
+
+def _rss():
+    """Current resident set size in bytes, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Profile:
+    """Stage records of one run, in the order the stages finished."""
+
+    def __init__(self, name="run"):
+        self.name = name
+        self.origin = time.perf_counter()
+        self.seconds = None     # wall time of the whole run, set by stop()
+        self.records = []
+        self._depth = 0
+
+    def summary(self):
+        """Records grouped by stage name (repeated stages, e.g. per batch, are summed), in start order."""
+        rows = {}
+        for r in self.records:
+            s = rows.get(r["stage"])
+            if s is None:
+                s = rows[r["stage"]] = {"stage": r["stage"], "depth": r["depth"], "start": r["start"],
+                                        "calls": 0, "seconds": 0.0, "rows": None, "mem_delta": None}
+            s["start"] = min(s["start"], r["start"])
+            s["calls"] += 1
+            s["seconds"] += r["seconds"]
+            if r["rows"] is not None:
+                s["rows"] = (s["rows"] or 0) + r["rows"]
+            if r["mem_delta"] is not None:
+                s["mem_delta"] = (s["mem_delta"] or 0) + r["mem_delta"]
+        return sorted(rows.values(), key=lambda s: s["start"])
+
+    def to_trace(self):
+        """Chrome trace-event JSON (open in chrome://tracing or ui.perfetto.dev)."""
+        events = [
+            {
+                "name": r["stage"],
+                "ph": "X",
+                "ts": round(r["start"] * 1e6),
+                "dur": round(r["seconds"] * 1e6),
+                "pid": 1,
+                "tid": 1,
+                "args": {"rows": r["rows"], "mem_delta": r["mem_delta"]},
+            }
+            for r in sorted(self.records, key=lambda r: r["start"])
+        ]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms",
+                           "otherData": {"profile": self.name}}, indent=1)
+
+
+def current():
+    return getattr(_local, "profile", None)
+
+
+def start(name="run"):
+    """Begin recording stages on this thread; returns the new Profile."""
+    _local.profile = Profile(name)
+    return _local.profile
+
+
+def stop():
+    """Stop recording on this thread; returns the finished Profile (or None)."""
+    prof = current()
+    _local.profile = None
+    if prof is not None:
+        prof.seconds = time.perf_counter() - prof.origin
+    return prof
+
+
+@contextmanager
+def profile(name="run"):
+    """with profiler.profile() as prof: ... - records every stage run inside the block."""
+    outer = current()
+    prof = start(name)
+    try:
+        yield prof
+    finally:
+        stop()
+        _local.profile = outer
+
+
+@contextmanager
+def stage(name, rows=None):
+    """Time one stage; set info["rows"] inside the block to record how many rows it handled."""
+    prof = current()
+    info = {"rows": rows}
+    if prof is None:
+        yield info
+        return
+
+    depth = prof._depth
+    prof._depth += 1
+    mem_before = _rss()
+    start_t = time.perf_counter()
+    try:
+        yield info
+    finally:
+        end_t = time.perf_counter()
+        mem_after = _rss()
+        prof._depth = depth
+        prof.records.append({
+            "stage": name,
+            "depth": depth,
+            "start": start_t - prof.origin,
+            "seconds": end_t - start_t,
+            "rows": info["rows"],
+            "mem_delta": mem_after - mem_before if mem_before is not None and mem_after is not None else None,
+        })
@@ -0,0 +1,189 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+
+# ------------------------------------------------------------
+# Server-wide cache of processed datasets
+# ------------------------------------------------------------
+# Every Streamlit session runs in the same server process. Sessions that load the
+# same data (the same upload, byte for byte, or the same store revision) get one
+# shared, read-only (merch, gas, all_locations, date_range_str) result instead of
+# a copy each. Entries are kept in least-recently-used order and evicted once their
+# estimated size passes the budget ($COSTCO_CACHE_MB, default 512). An evicted
+# result stays alive for sessions still showing it; it is just not handed out again.
+
+BUDGET_ENV_VAR = "COSTCO_CACHE_MB"
+DEFAULT_BUDGET_MB = 512
+
+
+def budget_from_env():
+    """Cache budget in bytes from $COSTCO_CACHE_MB (0 disables the cache)."""
+    try:
+        mb = float(os.environ.get(BUDGET_ENV_VAR, DEFAULT_BUDGET_MB))
+    except ValueError:
+        mb = DEFAULT_BUDGET_MB
+    return int(max(mb, 0) * (1 << 20))
+
+
+def estimate_size(obj):
+    """Approximate bytes held by a result: containers, numpy buffers, DataFrames and slotted objects."""
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        if isinstance(o, np.ndarray):
+            # views count the buffer they share, once
+            root = o
+            while isinstance(root.base, np.ndarray):
+                root = root.base
+            if root is o or id(root) not in seen:
+                seen.add(id(root))
+                total += root.nbytes
+            if o.dtype == object:
+                stack.extend(o.ravel().tolist())
+            continue
+        if isinstance(o, (pd.DataFrame, pd.Series, pd.Index)):
+            total += int(np.sum(o.memory_usage(deep=True)))
+            continue
+        total += sys.getsizeof(o)
+        if isinstance(o, (str, bytes, int, float, bool)) or o is None:
+            continue
+        if isinstance(o, (dict, MappingProxyType)):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            slots = [s for cls in type(o).__mro__ for s in getattr(cls, "__slots__", ())]
+            stack.extend(getattr(o, s) for s in slots if hasattr(o, s))
+            if hasattr(o, "__dict__"):
+                stack.extend(vars(o).values())
+    return total
+
+
+def _freeze(o, seen):
+    """o with every dict / list / set replaced by a read-only copy and every array marked read-only."""
+    if isinstance(o, (dict, MappingProxyType)):
+        return MappingProxyType({k: _freeze(v, seen) for k, v in o.items()})
+    if isinstance(o, (list, tuple)):
+        return tuple(_freeze(v, seen) for v in o)
+    if isinstance(o, (set, frozenset)):
+        return frozenset(o)
+    if isinstance(o, np.ndarray):
+        o.flags.writeable = False
+        return o
+    if isinstance(o, (str, bytes, int, float, bool, pd.DataFrame)) or o is None or id(o) in seen:
+        # a DataFrame cannot be made read-only; its readers (fuel.select) hand out copies
+        return o
+    seen.add(id(o))
+    # slotted result objects (Cube, Timeline, PriceHistory, ...): freeze what they hold
+    for s in {s for cls in type(o).__mro__ for s in getattr(cls, "__slots__", ())}:
+        if hasattr(o, s):
+            setattr(o, s, _freeze(getattr(o, s), seen))
+    return o
+
+
+def freeze(result):
+    """
+    (merch, gas, all_locations, date_range_str) made read-only all the way down, safe to share:
+    nested dicts are mappingproxies, lists tuples, sets frozensets and numpy arrays unwritable,
+    so one session cannot change what another is showing.
+    """
+    merch, gas, all_locations, date_range_str = result
+    seen = set()
+    return _freeze(merch, seen), _freeze(gas, seen), frozenset(all_locations), date_range_str
+
+
+class ResultCache:
+    """Thread-safe LRU of frozen results by dataset key, capped at `budget` bytes."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self._entries = OrderedDict()   # key -> (result, bytes), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._building = {}             # key -> lock held while one session builds it
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get(self, key):
+        result = self._lookup(key)
+        if result is None:
+            with self._lock:
+                self.misses += 1
+        return result
+
+    def put(self, key, result):
+        """Freeze and store `result`; returns the frozen result (stored or not)."""
+        frozen = freeze(result)
+        size = estimate_size(frozen)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.budget:
+                return frozen   # would evict everything else and still not fit
+            self._entries[key] = (frozen, size)
+            self._bytes += size
+            while self._bytes > self.budget:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+        return frozen
+
+    def get_or_build(self, key, build):
+        """
+        The cached result for `key`, or build() it once: sessions asking for the same key
+        while it is being built wait for that build instead of repeating it.
+        """
+        result = self._lookup(key)
+        if result is not None:
+            return result
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            result = self._lookup(key)
+            if result is not None:
+                return result
+            with self._lock:
+                self.misses += 1
+            try:
+                return self.put(key, build())
+            finally:
+                with self._lock:
+                    if self._building.get(key) is building:
+                        del self._building[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "budget": self.budget,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
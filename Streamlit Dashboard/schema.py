@@ -0,0 +1,155 @@
+import json
+from typing import Any, List, Optional
+
+try:
+    import msgspec
+except ImportError:  # optional: without it receipts are decoded into plain dicts, as before
+    msgspec = None
+
+
+# ------------------------------------------------------------
+# Typed receipt decoding
+# ------------------------------------------------------------
+# Receipts decoded straight from the JSON bytes into slotted structs that hold
+# only the fields the dashboard reads: the French descriptions, tender and tax
+# details are skipped by the decoder instead of being built as dicts and thrown
+# away, and amounts / quantities arrive as floats (converted once, while
+# decoding). A batch of structs takes about a third of the memory of the same
+# receipts as dicts and decodes several times faster.
+#
+# Structs answer .get(field) like a dict, so receipt_key, fuel.grade_of and the
+# engine take either. Everything that keeps receipts as they came (the receipt
+# store, convert.py) still reads dicts. Needs msgspec; available() says whether
+# it is installed.
+
+# the fields a Receipt / Item keeps, in declaration order (numbers in NUMBERS). Parquet line
+# items (lineitems.READ_COLUMNS) keep them too, so ingest.receipt_key hashes exactly these
+# when a receipt has no barcode or transaction number, however it was decoded.
+RECEIPT_FIELDS = (
+    "transactionBarcode", "warehouseNumber", "registerNumber", "transactionNumber",
+    "transactionDateTime", "transactionDate", "warehouseName", "receiptType", "documentType",
+    "transactionType", "total", "subTotal", "instantSavings", "membershipNumber",
+)
+ITEM_FIELDS = (
+    "itemNumber", "itemDescription01", "itemDepartmentNumber", "unit", "amount",
+    "fuelUnitQuantity", "itemUnitPriceAmount", "fuelGradeCode", "fuelGradeDescription",
+)
+NUMBERS = frozenset(("total", "subTotal", "instantSavings", "unit", "amount", "fuelUnitQuantity", "itemUnitPriceAmount"))
+
+if msgspec is not None:
+    class Item(msgspec.Struct, gc=False):
+        itemNumber: Any = None
+        itemDescription01: Any = None
+        itemDepartmentNumber: Any = None
+        unit: Optional[float] = None
+        amount: Optional[float] = None
+        fuelUnitQuantity: Optional[float] = None
+        itemUnitPriceAmount: Optional[float] = None
+        fuelGradeCode: Any = None
+        fuelGradeDescription: Any = None
+
+        def get(self, field, default=None):
+            return getattr(self, field, default)
+
+    class Receipt(msgspec.Struct, gc=False):
+        transactionBarcode: Any = None
+        warehouseNumber: Any = None
+        registerNumber: Any = None
+        transactionNumber: Any = None
+        transactionDateTime: Any = None
+        transactionDate: Any = None
+        warehouseName: Any = None
+        receiptType: Any = None
+        documentType: Any = None
+        transactionType: Any = None
+        total: Optional[float] = None
+        subTotal: Optional[float] = None
+        instantSavings: Optional[float] = None
+        membershipNumber: Any = None
+        itemArray: Optional[List[Item]] = None
+
+        def get(self, field, default=None):
+            return getattr(self, field, default)
+
+        def as_dict(self):
+            return msgspec.to_builtins(self)
+
+    NUMERIC_FIELDS = {
+        Receipt: ("total", "subTotal", "instantSavings"),
+        Item: ("unit", "amount", "fuelUnitQuantity", "itemUnitPriceAmount"),
+    }
+    _array = msgspec.json.Decoder(List[msgspec.Raw])
+    _receipt = msgspec.json.Decoder(Receipt, strict=False)  # lax: "12.50" still decodes to 12.5
+else:
+    Item = Receipt = None
+
+ARRAY_ERROR = "Each JSON must contain an array of receipt objects."
+LINE_ERROR = "each line must hold one receipt object."
+_BOM = b"\xef\xbb\xbf"
+
+
+def available():
+    return msgspec is not None
+
+
+def number(v):
+    """An amount as the typed records hold it: a float, or None for missing / junk values."""
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _lax(raw, error):
+    """A receipt whose amounts are not all numbers: decode it loosely (junk -> None, counted as 0)."""
+    rec = json.loads(bytes(raw))
+    if not isinstance(rec, dict):
+        raise ValueError(error)
+    items = rec.get("itemArray") or []
+    rec = {f: rec.get(f) for f in Receipt.__struct_fields__ if f != "itemArray"} | {
+        f: number(rec.get(f)) for f in NUMERIC_FIELDS[Receipt]}
+    rec["itemArray"] = [
+        Item(**({f: item.get(f) for f in Item.__struct_fields__} | {f: number(item.get(f)) for f in NUMERIC_FIELDS[Item]}))
+        for item in items if isinstance(item, dict)
+    ]
+    return Receipt(**rec)
+
+
+def decode(raw, error=ARRAY_ERROR):
+    """One receipt object (JSON bytes) -> Receipt; ValueError(`error`) if it is not an object."""
+    try:
+        return _receipt.decode(raw)
+    except msgspec.ValidationError:
+        return _lax(raw, error)
+    except msgspec.DecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}") from e
+
+
+def iter_array(buf):
+    """
+    Yield Receipts from a buffer (bytes, memoryview, mmap) holding the downloader's JSON array.
+    The array is split into raw slices of the buffer in one pass; each receipt is decoded only
+    when it is reached, so only the receipts of the current batch exist as objects.
+    """
+    view = memoryview(buf)
+    if view[:3] == _BOM:
+        view = view[3:]
+    try:
+        raws = _array.decode(view)
+    except msgspec.ValidationError as e:
+        raise ValueError(ARRAY_ERROR) from e
+    except msgspec.DecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}") from e
+    for raw in raws:
+        yield decode(raw)
+
+
+def iter_lines(f):
+    """Yield Receipts from newline-delimited JSON, line by line."""
+    for n, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield decode(line, LINE_ERROR)
+        except ValueError as e:
+            raise ValueError(f"line {n}: {e}") from e
@@ -0,0 +1,249 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from itertools import islice
+
+from ingest import receipt_key
+
+
+# ------------------------------------------------------------
+# Persistent local receipt store (SQLite)
+# ------------------------------------------------------------
+# Receipts are upserted by receipt_key (transactionBarcode, falling back to
+# warehouse / register / transaction number), so overlapping exports never
+# double count. The processed state (a ReceiptAggregate) is snapshotted next to
+# the receipts; uploads that only add receipts fold them into the snapshot, and
+# only in-place changes force a rebuild from the stored history.
+#
+# The snapshot is a chain of pickled parts: a full rebuild writes one, and every
+# upload that only adds receipts appends the partial state of just those receipts,
+# so saving an upload costs what it adds, not the whole history. Loading merges the
+# parts and, once there are COMPACT_PARTS of them, writes the merged state back as
+# a single part.
+
+STORE_ENV_VAR = "COSTCO_RECEIPT_STORE"
+PAGE_SIZE = 1000  # receipts read per query by iter_receipts
+COMPACT_PARTS = 16  # snapshot parts merged back into one by load_snapshot
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS receipts (
+    key                 TEXT PRIMARY KEY,
+    transactionBarcode  TEXT,
+    warehouseNumber     TEXT,
+    transactionNumber   TEXT,
+    membershipNumber    TEXT,
+    transactionDate     TEXT,
+    transactionDateTime TEXT,
+    body                TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS receipts_wh_trx ON receipts (warehouseNumber, transactionNumber);
+CREATE INDEX IF NOT EXISTS receipts_date ON receipts (transactionDate);
+CREATE INDEX IF NOT EXISTS receipts_member_time ON receipts (membershipNumber, transactionDateTime);
+
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value
+);
+
+DROP TABLE IF EXISTS snapshot;
+CREATE TABLE IF NOT EXISTS snapshot_parts (
+    name     TEXT NOT NULL,
+    revision INTEGER NOT NULL,
+    blob     BLOB NOT NULL,
+    PRIMARY KEY (name, revision)
+);
+"""
+
+INSERT_SQL = """
+INSERT INTO receipts (key, transactionBarcode, warehouseNumber, transactionNumber,
+                      membershipNumber, transactionDate, transactionDateTime, body)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPDATE_SQL = "UPDATE receipts SET transactionDate = ?, transactionDateTime = ?, body = ? WHERE key = ?"
+
+
+def _text(v):
+    return None if v is None else str(v)
+
+
+def _row(rec):
+    return (
+        receipt_key(rec),
+        _text(rec.get("transactionBarcode")),
+        _text(rec.get("warehouseNumber")),
+        _text(rec.get("transactionNumber")),
+        _text(rec.get("membershipNumber")),
+        _text(rec.get("transactionDate")),
+        _text(rec.get("transactionDateTime")),
+        json.dumps(rec, separators=(",", ":"), sort_keys=True),
+    )
+
+
+def _batches(iterable, size):
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+class ReceiptStore:
+    """Thread-safe wrapper around one SQLite file; shared by every Streamlit session."""
+
+    def __init__(self, path):
+        self.path = path
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    # ---- receipts ----
+    def upsert(self, receipts, fold=None, batch_size=500):
+        """
+        Insert new receipts / replace changed ones; identical copies are skipped.
+        Returns (inserted receipts, number of receipts updated in place).
+
+        If `fold(inserted)` is given and the upload only added receipts, the partial state it
+        returns is appended to the saved snapshot instead of invalidating it (see load_snapshot).
+        The inserted receipts are returned as a list, so memory grows with what an upload adds
+        (not with what is stored).
+        """
+        inserted, updated = [], 0
+        with self._lock, self._conn:
+            extend = fold is not None and self._snapshot_revision(self._conn) == self._revision(self._conn)
+            for batch in _batches(receipts, batch_size):
+                rows = {}
+                for rec in batch:
+                    row = _row(rec)
+                    rows.setdefault(row[0], (row, rec))
+                marks = ",".join("?" * len(rows))
+                existing = dict(self._conn.execute(
+                    f"SELECT key, body FROM receipts WHERE key IN ({marks})", list(rows)
+                ))
+                new_rows = [(row, rec) for key, (row, rec) in rows.items() if key not in existing]
+                changed = [row for key, (row, _) in rows.items() if key in existing and existing[key] != row[-1]]
+                if new_rows:
+                    self._conn.executemany(INSERT_SQL, [row for row, _ in new_rows])
+                    inserted.extend(rec for _, rec in new_rows)
+                if changed:
+                    self._conn.executemany(UPDATE_SQL, [(row[5], row[6], row[7], row[0]) for row in changed])
+                    updated += len(changed)
+
+            if inserted or updated:
+                self._conn.execute(
+                    "INSERT INTO meta (name, value) VALUES ('revision', 1) "
+                    "ON CONFLICT (name) DO UPDATE SET value = value + 1"
+                )
+                part = fold(inserted) if extend and not updated else None
+                if part is not None:
+                    # same transaction as the inserts and the revision bump
+                    self._write_part(self._conn, part, self._revision(self._conn))
+        return inserted, updated
+
+    def iter_receipts(self, page_size=PAGE_SIZE):
+        """
+        Yield stored receipts in the order they were first added, one page of rowids at a
+        time: only a page of bodies is in memory, and the lock is not held between pages.
+        """
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT rowid, body FROM receipts WHERE rowid > ? ORDER BY rowid LIMIT ?", (last, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            for _, body in rows:
+                yield json.loads(body)
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM receipts").fetchone()[0]
+
+    def high_water_marks(self):
+        """{membershipNumber: latest transactionDateTime stored} - where the next sync picks up (see sync.py)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT membershipNumber, MAX(transactionDateTime) "
+                "FROM receipts GROUP BY membershipNumber"
+            ).fetchall()
+        return {member: latest for member, latest in rows if latest}
+
+    @staticmethod
+    def _revision(conn):
+        row = conn.execute("SELECT value FROM meta WHERE name = 'revision'").fetchone()
+        return row[0] if row else 0
+
+    def revision(self):
+        with self._lock:
+            return self._revision(self._conn)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM receipts")
+            self._conn.execute("DELETE FROM snapshot")
+            self._conn.execute(
+                "INSERT INTO meta (name, value) VALUES ('revision', 1) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + 1"
+            )
+
+    # ---- processed state ----
+    @staticmethod
+    def _snapshot_revision(conn, name="dashboard"):
+        # revision of the newest part; the snapshot is current while it matches the store's
+        row = conn.execute("SELECT MAX(revision) FROM snapshot_parts WHERE name = ?", (name,)).fetchone()
+        return row[0]
+
+    @staticmethod
+    def _write_part(conn, state, revision, name="dashboard"):
+        # inside the caller's transaction; committing is up to the caller
+        blob = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        conn.execute(
+            "INSERT OR REPLACE INTO snapshot_parts (name, revision, blob) VALUES (?, ?, ?)",
+            (name, revision, blob),
+        )
+
+    def save_snapshot(self, state, name="dashboard"):
+        """Pickle the processed state against the current revision, replacing every part."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM snapshot_parts WHERE name = ?", (name,))
+            self._write_part(self._conn, state, self._revision(self._conn), name)
+
+    def load_snapshot(self, name="dashboard", merge=None):
+        """
+        Return the saved state, or None if receipts changed since it was saved.
+        With more than one part, `merge(parts)` combines them (oldest first; None rejects
+        them); without `merge` only a single-part snapshot is returned.
+        """
+        with self._lock:
+            revision = self._revision(self._conn)
+            rows = self._conn.execute(
+                "SELECT revision, blob FROM snapshot_parts WHERE name = ? ORDER BY revision", (name,)
+            ).fetchall()
+        if not rows or rows[-1][0] != revision:
+            return None
+        parts = [pickle.loads(blob) for _, blob in rows]
+        if len(parts) == 1:
+            return parts[0]
+        state = merge(parts) if merge is not None else None
+        if state is not None and len(parts) >= COMPACT_PARTS:
+            with self._lock, self._conn:
+                if self._snapshot_revision(self._conn, name) == revision == self._revision(self._conn):
+                    self._conn.execute("DELETE FROM snapshot_parts WHERE name = ?", (name,))
+                    self._write_part(self._conn, state, revision, name)
+        return state
+
+
+def open_store(path=None):
+    """Open the store at `path` (or $COSTCO_RECEIPT_STORE); None when persistence is not configured."""
+    path = path or os.environ.get(STORE_ENV_VAR)
+    if not path:
+        return None
+    return ReceiptStore(os.path.expanduser(path))
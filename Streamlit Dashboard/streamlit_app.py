@@ -1,7 +1,12 @@
 import streamlit as st
 import pandas as pd
-from helper import process_receipts
+import charts
+import fuel
 import helper
+import ingest
+import money
+import pipeline
+import profiler
 import time
 
 # ------------------------------------------------------------
@@ -18,6 +23,12 @@ st.markdown("""
     """, unsafe_allow_html=True)
 helper.load_css()
 
+# Optional sidebar panel: times every processing / view stage of each rerun
+if st.sidebar.toggle("⏱ Performance panel", key="perf_panel"):
+    profiler.start("rerun")
+else:
+    profiler.stop()
+
 # ------------------------------------------------------------
 # Header + file uploader
 # ------------------------------------------------------------
@@ -35,32 +46,59 @@ with right:
 
 with left:
     file_list = st.file_uploader("Upload Costco receipts", 
-                            type=["json"],
+                            type=ingest.UPLOAD_TYPES,
                             accept_multiple_files=True)
 
-    if not file_list:
+    receipt_store = helper.get_store()
+
+    if not file_list and (receipt_store is None or receipt_store.count() == 0):
         #st.info("Upload your Costco receipts JSON to begin.")
         st.stop()
 
-    all_receipts = []
-
-    # Load all files
-    for f in file_list:
-        try:
-            df = pd.read_json(f)
-            recs = df.to_dict(orient="records")
-
-            if not isinstance(recs, list):
-                raise ValueError("Each JSON must contain an array of receipt objects.")
-
-            all_receipts.extend(recs)
+    if receipt_store is not None:
+        # Uploads are merged into the local store (deduped by barcode);
+        # the dashboard state is loaded from disk unless something new arrived
+        if file_list:
+            upload_key = helper.dataset_fingerprint(file_list)
+            if st.session_state.get("upload_key") != upload_key:
+                try:
+                    with st.spinner("Saving receipts..."):
+                        helper.save_to_store(receipt_store, ingest.iter_files(file_list))
+                except ValueError as e:
+                    st.error(str(e))
+                    st.stop()
+                st.session_state["upload_key"] = upload_key
+
+        dataset_key = f"store-{receipt_store.revision()}"
+        if st.session_state.get("dataset_key") != dataset_key:
+            with st.spinner("Loading saved receipts..."):
+                helper.load_dataset(dataset_key, lambda: helper.load_from_store(receipt_store))
+            st.session_state["dataset_key"] = dataset_key
+            st.session_state["perf_load"] = profiler.current()
 
-        except Exception as e:
-            st.error(f"Invalid JSON file {f.name}: {e}")
-            st.stop()
+    else:
+        # Reruns with the same uploads reuse the processed dataset instead of re-parsing
+        dataset_key = helper.dataset_fingerprint(file_list)
+
+        if st.session_state.get("dataset_key") != dataset_key:
+            # Each upload keeps its own partial aggregate: adding a file parses only that
+            # file (several at once are parsed side by side in worker processes), removing
+            # one re-merges the rest. Overlapping exports are deduped by barcode. Sessions
+            # that upload the same files share one processed result, and with $COSTCO_CACHE_DIR
+            # set it is reopened from disk after a restart (helper.load_dataset).
+            try:
+                with st.spinner("Processing receipts..."):
+                    helper.load_dataset(dataset_key, lambda: helper.process_uploads(file_list), persist=True)
+            except ValueError as e:
+                st.error(str(e))
+                st.stop()
+            st.session_state["dataset_key"] = dataset_key
+            st.session_state["perf_load"] = profiler.current()
 
-    with st.spinner("Processing receipts..."):
-        merch, gas, all_locations, date_range = process_receipts(all_receipts)
+    merch = st.session_state["merch"]
+    gas = st.session_state["gas"]
+    all_locations = st.session_state["all_locations"]
+    kpi = pipeline.kpis(merch, gas, all_locations)
 
 # update header date badge
 date_range_placeholder.markdown(
@@ -70,11 +108,22 @@ date_range_placeholder.markdown(
     unsafe_allow_html=True,
 )
 
+# Sidebar filters are sliced out of the pre-aggregated cube; no receipt is re-read
+filters = helper.filter_controls(merch, gas)
+if filters:
+    merch, gas, all_locations = pipeline.apply_filters(merch, gas, **filters)
+    kpi = pipeline.kpis(merch, gas, all_locations)
+view_key = helper.filter_key(dataset_key, filters)
+# a filtered series is monthly, so Day / Week are not offered
+granularities = list(charts.MONTHLY_GRANULARITIES if filters else charts.GRANULARITIES)
+
 
-# Pages at the top — Excel style
-tabs = st.tabs(["📊 KPIs","📦 Warehouse", "⛽ Gas", "📈 Prices"])
+# Pages at the top — Excel style.
+# Only the selected page runs (st.tabs would run all four bodies on every rerun)
+VIEWS = ["📊 KPIs","📦 Warehouse", "⛽ Gas", "📈 Prices"]
+view = st.radio("View", VIEWS, horizontal=True, label_visibility="collapsed", key="view")
 
-with tabs[0]: # KPIs
+if view == VIEWS[0]: # KPIs
 
     # ------------------------------------------------------------
     #Costco Summary KPIs
@@ -116,14 +165,7 @@ with tabs[0]: # KPIs
             unsafe_allow_html=True,
         )
     # Executive rewards
-    years = sorted(merch["subtotal_by_year"].keys(), reverse=True)
-    rewards_rows = []
-    total_rewards = 0.0
-    for y in years:
-        sub = merch["subtotal_by_year"][y]
-        rew = sub * 0.02
-        total_rewards += rew
-        rewards_rows.append({"Year": y, "Qualifying Spend": sub, "2% Cashback": rew})
+    rewards_rows, total_rewards = pipeline.executive_rewards(merch["subtotal_by_year"])
 
     with total_columns[1]:
         st.markdown(
@@ -168,12 +210,12 @@ with tabs[0]: # KPIs
         )
 
     with summary_cols[1]:
-        avg_per_receipt = merch["total_spent"] / len(merch["receipts"]) if merch["receipts"] else 0
+        avg_per_receipt = kpi["avg_per_trip"]
         st.markdown(
             f"""
             <div class="summary-card">
             <div class="label">Warehouse Trips</div>
-            <div class="value">{len(merch['receipts'])}</div>
+            <div class="value">{merch['count']}</div>
             <div class="sub">Avg {helper.format_money(avg_per_receipt)} / trip</div>
             </div>
             """,
@@ -211,9 +253,7 @@ with tabs[0]: # KPIs
 
     gas_cols = st.columns(5)
 
-    weighted_avg_price = (
-        gas["price_sum"] / gas["total_gallons"] if gas["total_gallons"] > 0 else 0.0
-    )
+    weighted_avg_price = kpi["gas_avg_price"]
 
     with gas_cols[0]:
         st.markdown(
@@ -266,7 +306,56 @@ with tabs[0]: # KPIs
             unsafe_allow_html=True,
         )
 
-with tabs[1]: # Merchandise
+    # ------------------------------------------------------------
+    # Date window vs the same window a year earlier
+    # ------------------------------------------------------------
+    # answered from per-day prefix sums (see timeline.py): two binary searches per window
+    st.markdown("<div class='section-header'>📅 Compare Periods</div>", unsafe_allow_html=True)
+
+    first_day, last_day = pipeline.timeline_bounds(merch, gas)
+    if first_day is None:
+        st.info("No dated receipts.")
+    else:
+        presets = list(pipeline.WINDOWS) + ["Custom"]
+        preset = st.radio("Window", presets, index=1, horizontal=True, key="window_preset")
+        if preset == "Custom":
+            # the default window can't start before the data does: date_input rejects it
+            default = (max(first_day, pipeline.last_days(last_day, 90)[0]), last_day)
+            picked = st.date_input("Dates", value=default, min_value=first_day,
+                                   max_value=last_day, key="window_dates")
+            if not picked:
+                st.info("Pick a start and an end date - showing the default window until then.")
+                start, end = default
+            else:
+                start, end = picked if len(picked) == 2 else (picked[0], picked[0])
+        else:
+            start, end = pipeline.last_days(last_day, pipeline.WINDOWS[preset])
+        prev_start, prev_end = pipeline.year_earlier(start, end)
+        now = pipeline.window_kpis(merch, gas, start, end)
+        before = pipeline.window_kpis(merch, gas, prev_start, prev_end)
+
+        st.caption(f"{start:%b %d, %Y} – {end:%b %d, %Y} vs {prev_start:%b %d, %Y} – {prev_end:%b %d, %Y}"
+                   + (" · all receipts (sidebar filters don't apply here)" if filters else ""))
+
+        def change(key):
+            if not before[key]:
+                return None
+            return f"{(now[key] - before[key]) / abs(before[key]) * 100:+.1f}%"
+
+        window_cols = st.columns(4)
+        window_cols[0].metric("Total Spent", helper.format_money(now["total_spent"]), change("total_spent"))
+        window_cols[1].metric("Warehouse Trips", f"{now['merch_trips']:,}", change("merch_trips"))
+        window_cols[2].metric("Total Savings", helper.format_money(now["total_savings"]), change("total_savings"))
+        window_cols[3].metric("Refunds", helper.format_money(now["refund_total"]), change("refund_total"),
+                              delta_color="inverse")
+        window_cols = st.columns(4)
+        window_cols[0].metric("Gas Spent", helper.format_money(now["gas_spent"]), change("gas_spent"))
+        window_cols[1].metric("Gallons", f"{helper.format_num(now['gas_gallons'], 1)} gal", change("gas_gallons"))
+        window_cols[2].metric("Avg Price / Gal", helper.format_money(now["gas_avg_price"]), change("gas_avg_price"),
+                              delta_color="inverse")
+        window_cols[3].metric("Avg / Trip", helper.format_money(now["avg_per_trip"]), change("avg_per_trip"))
+
+if view == VIEWS[1]: # Merchandise
     import streamlit as st
     import pandas as pd
     import helper
@@ -281,9 +370,6 @@ with tabs[1]: # Merchandise
         st.error("No data loaded. Upload JSON on the Home page.")
         st.stop()
 
-    merch = st.session_state["merch"]
-    all_locations = st.session_state["all_locations"]
-
     # ------------------------------------------------------------
     # MERCHANDISE SECTION
     # ------------------------------------------------------------
@@ -319,12 +405,12 @@ with tabs[1]: # Merchandise
         )
 
     with summary_cols[1]:
-        avg_per_receipt = merch["total_spent"] / len(merch["receipts"]) if merch["receipts"] else 0
+        avg_per_receipt = kpi["avg_per_trip"]
         st.markdown(
             f"""
             <div class="summary-card">
             <div class="label">Warehouse Trips</div>
-            <div class="value">{len(merch['receipts'])}</div>
+            <div class="value">{merch['count']}</div>
             <div class="sub">Avg {helper.format_money(avg_per_receipt)} / trip</div>
             </div>
             """,
@@ -355,14 +441,7 @@ with tabs[1]: # Merchandise
             unsafe_allow_html=True,
         )
     # Executive rewards
-    years = sorted(merch["subtotal_by_year"].keys(), reverse=True)
-    rewards_rows = []
-    total_rewards = 0.0
-    for y in years:
-        sub = merch["subtotal_by_year"][y]
-        rew = sub * 0.02
-        total_rewards += rew
-        rewards_rows.append({"Year": y, "Qualifying Spend": sub, "2% Cashback": rew})
+    rewards_rows, total_rewards = pipeline.executive_rewards(merch["subtotal_by_year"])
 
     with summary_cols[5]:
         st.markdown(
@@ -406,15 +485,11 @@ with tabs[1]: # Merchandise
     with left_merch:
         st.subheader("📊 Trend")
         if merch["monthly"]:
-            merch_month_df = (
-                pd.DataFrame(
-                    [
-                        {"month_key": k, "month": helper.month_label_from_key(k), "total": v["spent"]}
-                        for k, v in merch["monthly"].items()
-                    ]
-                )
-                .sort_values("month_key")
-            )
+            granularity = st.select_slider("Granularity", options=granularities, value=charts.DEFAULT_GRANULARITY,
+                                           key="merch_granularity_filtered" if filters else "merch_granularity")
+            # every granularity is built once per dataset (and filter); switching is a lookup
+            series = helper.view_data(view_key, "series", lambda: charts.build_series(merch, gas))
+            merch_month_df = series[granularity]["merch_spend"]
 
             import altair as alt
 
@@ -422,12 +497,12 @@ with tabs[1]: # Merchandise
                 alt.Chart(merch_month_df)
                 .mark_bar()
                 .encode(
-                    x=alt.X("month:N", title="Month", sort=None),
+                    x=alt.X("period:N", title=granularity, sort=None),
                     y=alt.Y("total:Q", title="Amount Spent ($)"),
-                    tooltip=["month", "total"],
+                    tooltip=["period", "total"],
                 )
             )
-            st.altair_chart(chart, use_container_width=True)
+            helper.altair_chart(chart, "merch trend")
         else:
             st.info("No monthly merchandise data.")
 
@@ -439,136 +514,57 @@ with tabs[1]: # Merchandise
 
     
 
-    @st.cache_data
-    def df_most_expensive():
-        item_values = tuple(merch["item_stats"].values())
-        rows = []
-        for s in item_values:
-            if s["max_price"] <= 0:
-                continue
-
-            avg_price = s["total_spent"] / s["total_units"]
-            rows.append(
-                {
-                    "Item": s["name"],
-                    "Item #": s["itemNumber"],
-                    "Max Price (num)": s["max_price"],         # numeric
-                    "Avg Price (num)": avg_price,              # numeric
-                }
-            )
-
-        # If no rows, return empty table with proper columns
-        if not rows:
-            return pd.DataFrame(columns=["Item", "Item #", "Max Price", "Avg Price"])
-
-        # Sort numerically
-        df = pd.DataFrame(rows).sort_values(
-            by="Max Price (num)", ascending=False
-        ).head(10)
-
-        # Convert to formatted strings for display
-        df["Max Price"] = df["Max Price (num)"].map(helper.format_money)
-        df["Avg Price"] = df["Avg Price (num)"].map(helper.format_money)
-
-        return df[["Item", "Item #", "Max Price", "Avg Price"]]
+    # Each table is one precomputed top-K slice (see leaderboards.py); only those rows get formatted
 
     @st.cache_data
-    def df_most_total_spent():
-        item_values = tuple(merch["item_stats"].values())
-        rows = []
-        for s in item_values:
-            total_spent = s["total_spent"]
-            units = s["total_units"]
-
-            if units <= 0 or total_spent <= 0:
-                continue
-
-            avg_price = total_spent / units
-
-            rows.append(
-                {
-                    "Item": s["name"],
-                    "Item #": s["itemNumber"],
-                    "Total (num)": total_spent,      # numeric
-                    "Units": units,                  # numeric
-                    "Avg Price (num)": avg_price,    # numeric
-                }
-            )
-
-        # No items → return empty frame with proper columns
-        if not rows:
-            return pd.DataFrame(
-                columns=["Item", "Item #", "Total", "Units", "Avg Price"]
-            )
-
-        # Sort numerically (not formatted)
-        df = pd.DataFrame(rows).sort_values(
-            by="Total (num)", ascending=False
-        ).head(10)
-
-        # Format for display
-        df["#"] = range(1, len(df) + 1)
-        df["Total"] = df["Total (num)"].map(helper.format_money)
-        df["Avg Price"] = df["Avg Price (num)"].map(helper.format_money)
-
-        return df[["Item", "Item #", "Total", "Units", "Avg Price"]]
+    def df_most_expensive(dataset_key, _item_stats):
+        cols, ranked = helper.item_leaderboards(dataset_key, _item_stats)
+        top = ranked["most_expensive"]
+
+        return pd.DataFrame(
+            {
+                "Item": cols["name"][top],
+                "Item #": cols["itemNumber"][top],
+                "Max Price": [helper.format_money(v) for v in cols["max_price"][top]],
+                "Avg Price": [helper.format_money(v) for v in cols["avg_price"][top]],
+            }
+        )
 
     @st.cache_data
-    def df_most_purchased():
-        item_values = tuple(merch["item_stats"].values())
-        rows = []
-        for s in item_values:
-
-            units = s["total_units"]
-            total_spent = s["total_spent"]
-
-            # Skip invalid items
-            if units <= 0 or total_spent <= 0:
-                continue
-
-            avg_price = total_spent / units
-
-            # Price change (optional)
-            change = s["max_price"] - s["min_price"]
-
-            rows.append(
-                {
-                    "Item": s["name"],
-                    "Item #": s["itemNumber"],
-                    "Units (num)": units,           # numeric for sorting
-                    "Avg Price (num)": avg_price,   # numeric
-                    "Change (num)": change,         # numeric change
-                }
-            )
-
-        # If no rows → return an empty DataFrame with correct columns
-        if not rows:
-            return pd.DataFrame(
-                columns=["Item", "Item #", "Units", "Avg Price", "Change"]
-            )
-
-        # Sort by numeric units
-        df = pd.DataFrame(rows).sort_values(
-            by="Units (num)", ascending=False
-        ).head(10)
+    def df_most_total_spent(dataset_key, _item_stats):
+        cols, ranked = helper.item_leaderboards(dataset_key, _item_stats)
+        top = ranked["most_total_spent"]
+
+        return pd.DataFrame(
+            {
+                "Item": cols["name"][top],
+                "Item #": cols["itemNumber"][top],
+                "Total": [helper.format_money(v) for v in cols["total_spent"][top]],
+                "Units": cols["total_units"][top],
+                "Avg Price": [helper.format_money(v) for v in cols["avg_price"][top]],
+            }
+        )
 
-        # Add rank
-        df["#"] = range(1, len(df) + 1)
+    @st.cache_data
+    def df_most_purchased(dataset_key, _item_stats):
+        cols, ranked = helper.item_leaderboards(dataset_key, _item_stats)
+        top = ranked["most_purchased"]
 
         # Human-friendly formatting
-        df["Units"] = df["Units (num)"].map(lambda x: f"{x:,.0f}")
-        df["Avg Price"] = df["Avg Price (num)"].map(helper.format_money)
-        df["Change"] = df["Change (num)"].apply(
-            lambda v: f"+{helper.format_money(v)}" if v > 0.01 else "-"
+        return pd.DataFrame(
+            {
+                "Item": cols["name"][top],
+                "Item #": cols["itemNumber"][top],
+                "Units": [f"{x:,.0f}" for x in cols["total_units"][top]],
+                "Avg Price": [helper.format_money(v) for v in cols["avg_price"][top]],
+            }
         )
 
-        return df[["Item", "Item #", "Units", "Avg Price"]]
-
     top_row_left, top_row_mid, top_row_right = st.columns([4,4,3])
 
     with top_row_left:
         st.subheader("💎 Most Expensive")
-        df_exp = df_most_expensive()
+        df_exp = df_most_expensive(dataset_key, merch["item_stats"])
         if not df_exp.empty:
             st.dataframe(df_exp, hide_index=True, use_container_width=True)
         else:
@@ -576,16 +572,16 @@ with tabs[1]: # Merchandise
 
     with top_row_mid:
         st.subheader("💰 Most Total Spent")
-        df_spent = df_most_total_spent()
+        df_spent = df_most_total_spent(dataset_key, merch["item_stats"])
         st.dataframe(df_spent, hide_index=True, use_container_width=True)
         
     with top_row_right:
         st.subheader("🔥 Most Frequently Bought")
-        df_freq = df_most_purchased()
+        df_freq = df_most_purchased(dataset_key, merch["item_stats"])
         st.dataframe(df_freq, hide_index=True, use_container_width=True)
 
 
-with tabs[2]: # Gas
+if view == VIEWS[2]: # Gas
     import streamlit as st
     import pandas as pd
     import helper
@@ -599,8 +595,6 @@ with tabs[2]: # Gas
         st.error("No data loaded. Upload JSON on the Home page.")
         st.stop()
 
-    gas = st.session_state["gas"]
-
     # ------------------------------------------------------------
     # GAS SECTION
     # ------------------------------------------------------------
@@ -611,9 +605,7 @@ with tabs[2]: # Gas
 
     gas_cols = st.columns(5)
 
-    weighted_avg_price = (
-        gas["price_sum"] / gas["total_gallons"] if gas["total_gallons"] > 0 else 0.0
-    )
+    weighted_avg_price = kpi["gas_avg_price"]
 
     with gas_cols[0]:
         st.markdown(
@@ -669,114 +661,102 @@ with tabs[2]: # Gas
 
     st.markdown("")
 
+    granularity = st.select_slider("Granularity", options=granularities, value=charts.DEFAULT_GRANULARITY,
+                                   key="gas_granularity_filtered" if filters else "gas_granularity")
+    series = helper.view_data(view_key, "series", lambda: charts.build_series(merch, gas))[granularity]
+
     gas_top_left, gas_top_right = st.columns(2)
 
-    # Gas price history (premium vs regular)
+    # Gas price history per fuel grade
     with gas_top_left:
         st.subheader("📉 Price Per Gallon History")
-        if gas["grades"]:
+        if not gas["fuel"].empty:
             import altair as alt
 
-            rows = []
-            for month_key, g in gas["grades"].items():
-                rows.append(
-                    {
-                        "month_key": month_key,
-                        "month": helper.month_label_from_key(month_key),
-                        "grade": "Premium",
-                        "price": g["pSpend"] / g["pGal"] if g["pGal"] > 0 else None,
-                    }
-                )
-                rows.append(
-                    {
-                        "month_key": month_key,
-                        "month": helper.month_label_from_key(month_key),
-                        "grade": "Regular",
-                        "price": g["rSpend"] / g["rGal"] if g["rGal"] > 0 else None,
-                    }
-                )
-            gas_price_df = pd.DataFrame(rows).dropna()
-            gas_price_df = gas_price_df.sort_values("month_key")
+            gas_price_df = series["gas_price"]
             chart = (
                 alt.Chart(gas_price_df)
                 .mark_line(point=True)
                 .encode(
-                    x=alt.X("month:N", title="Month", sort=None),
+                    x=alt.X("period:N", title=granularity, sort=None),
                     y=alt.Y("price:Q", title="Price ($/gal)"),
                     color="grade:N",
-                    tooltip=["grade", "month", "price"],
+                    tooltip=["grade", "period", "price"],
                 )
             )
-            st.altair_chart(chart, use_container_width=True)
+            helper.altair_chart(chart, "gas price chart")
         else:
             st.info("No gas grade data.")
 
-    # Gas spend breakdown (premium vs regular)
+    # Gas spend breakdown per fuel grade
     with gas_top_right:
         st.subheader("💳 Gas Spend by Grade")
-        if gas["grades"]:
-            rows = []
-            for month_key, g in gas["grades"].items():
-                rows.append(
-                    {
-                        "month_key": month_key,
-                        "month": helper.month_label_from_key(month_key),
-                        "Premium Spend": g["pSpend"],
-                        "Regular Spend": g["rSpend"],
-                    }
-                )
-            gas_spend_df = pd.DataFrame(rows).sort_values("month_key")
-            gas_spend_df_melt = gas_spend_df.melt(
-                id_vars=["month_key", "month"], var_name="grade", value_name="spend"
-            )
+        if not gas["fuel"].empty:
+            gas_spend_df_melt = series["gas_grade_spend"]
             import altair as alt
 
             chart = (
                 alt.Chart(gas_spend_df_melt)
                 .mark_bar()
                 .encode(
-                    x=alt.X("month:N", title="Month", sort=None),
+                    x=alt.X("period:N", title=granularity, sort=None),
                     y=alt.Y("spend:Q", title="Spend ($)"),
                     color="grade:N",
-                    tooltip=["month", "grade", "spend"],
+                    tooltip=["period", "grade", "spend"],
                 )
             )
-            st.altair_chart(chart, use_container_width=True)
+            helper.altair_chart(chart, "gas grade spend chart")
         else:
             st.info("No gas spend breakdown data.")
 
-    # Total monthly gas spend
-    st.subheader("📊 Total Monthly Gas Spending")
+    # Total gas spend per period
+    st.subheader("📊 Total Gas Spending")
     if gas["monthly"]:
-        gas_month_df = (
-            pd.DataFrame(
-                [
-                    {"month_key": k, "month": helper.month_label_from_key(k), "total": v["spent"]}
-                    for k, v in gas["monthly"].items()
-                ]
-            )
-            .sort_values("month_key")
-        )
+        gas_month_df = series["gas_spend"]
         import altair as alt
 
         chart = (
             alt.Chart(gas_month_df)
             .mark_bar()
             .encode(
-                x=alt.X("month:N", title="Month", sort=None),
+                x=alt.X("period:N", title=granularity, sort=None),
                 y=alt.Y("total:Q", title="Amount Spent ($)"),
-                tooltip=["month", "total"],
+                tooltip=["period", "total"],
             )
         )
-        st.altair_chart(chart, use_container_width=True)
+        helper.altair_chart(chart, "gas spend chart")
     else:
         st.info("No gas receipts detected.")
 
+    # Price per gallon at each station, for one grade at a time
+    st.subheader("⛽ Compare Stations")
+    station_prices = series["station_price"]
+    if not station_prices.empty:
+        import altair as alt
+
+        grades = fuel.order(station_prices["grade"])
+        if st.session_state.get("station_grade") not in grades:
+            st.session_state.pop("station_grade", None)  # a filter or new dataset dropped that grade
+        grade = st.radio("Grade", options=grades, horizontal=True, key="station_grade")
+        chart = (
+            alt.Chart(station_prices[station_prices["grade"] == grade])
+            .mark_line(point=True)
+            .encode(
+                x=alt.X("period:N", title=granularity, sort=None),
+                y=alt.Y("price:Q", title="Price ($/gal)", scale=alt.Scale(zero=False)),
+                color=alt.Color("station:N", title="Station"),
+                tooltip=["station", "period", "price"],
+            )
+        )
+        helper.altair_chart(chart, "station price chart")
+    else:
+        st.info("No station prices to compare.")
+
 
 
     st.divider()
 
-with tabs[3]: # Prices
+if view == VIEWS[3]: # Prices
     import streamlit as st
     import pandas as pd
     import helper
@@ -800,10 +780,12 @@ with tabs[3]: # Prices
     st.markdown("<div class='section-header'>🔍 Item Lookup</div>", unsafe_allow_html=True)
 
     if merch["item_stats"]:
-        item_label_to_key = {
-            f"{v['name']} (#{v['itemNumber']})": k for k, v in merch["item_stats"].items()
-        }
-        choices = [""] + sorted(item_label_to_key.keys())
+        def item_choices():
+            labels = {f"{v['name']} (#{v['itemNumber']})": k for k, v in merch["item_stats"].items()}
+            return labels, [""] + sorted(labels.keys())
+
+        # built once per dataset, so picking an item only pays for that item's history
+        item_label_to_key, choices = helper.view_data(dataset_key, "item_choices", item_choices)
         choice = st.selectbox("Search for an item", options=choices, index=0)
 
         if choice:
@@ -829,7 +811,7 @@ with tabs[3]: # Prices
                     f"""
                     <div class="summary-card">
                     <div class="label">Total Spent</div>
-                    <div class="value">{round(stat["total_spent"],2)}</div>
+                    <div class="value">{helper.format_money(stat["total_spent"])}</div>
                     </div>
                     """,
                     unsafe_allow_html=True,
@@ -856,10 +838,9 @@ with tabs[3]: # Prices
                     unsafe_allow_html=True,
                 )
 
-            # Price history table + chart
-            hist_df = pd.DataFrame(stat["price_history"])
-            hist_df = hist_df.sort_values("date")
-            hist_df["date"] = hist_df["date"].dt.date
+            # Price history table + chart (already date-sorted; prices in dollars for display)
+            hist_df = stat["price_history"].to_frame()
+            hist_df["price"] = money.dollars(hist_df["price"])
 
             st.markdown("#### 🗂️ Price History")
 
@@ -875,16 +856,17 @@ with tabs[3]: # Prices
                         .encode(
                             x=alt.X("date:T", title="Date"),
                             y=alt.Y("price:Q", title="Price ($)"),
-                            tooltip=["date", "price"],
+                            tooltip=[alt.Tooltip("date:T", format="%Y-%m-%d"), "price"],
                         )
                     )
 
-                    st.altair_chart(chart, use_container_width=True)
+                    helper.altair_chart(chart, "price history chart")
                 else:
                     st.info("No price history available to display.")
 
             with tab_table:
-                st.dataframe(hist_df.rename(columns={"date": "Purchase Date", "price": "Price"}),
+                st.dataframe(hist_df.assign(date=hist_df["date"].dt.date)
+                             .rename(columns={"date": "Purchase Date", "price": "Price"}),
                             hide_index=True,
                             use_container_width=True)
 
@@ -892,67 +874,29 @@ with tabs[3]: # Prices
 
 
     st.markdown("<div class='section-header'>Price Trends", unsafe_allow_html=True)
-    item_values = list(merch["item_stats"].values())
-    def df_price_increase():
-        rows = []
-        for s in item_values:
-            if s["last_price"] > s["first_price"]:
-                diff = s["last_price"] - s["first_price"]
-                rows.append(
-                    {
-                        "Item": s["name"],
-                        "Item #": s["itemNumber"],
-                        "Old → New": f"{helper.format_money(s['first_price'])} → {helper.format_money(s['last_price'])}",
-                        "Diff (num)": diff,   # numeric
-                    }
-                )
-
-        # If no rows → return empty table with correct columns
-        if not rows:
-            return pd.DataFrame(columns=["Item", "Item #", "Old → New", "Diff"])
-
-        # Build DataFrame and sort N U M E R I C A L L Y
-        df = pd.DataFrame(rows).sort_values(
-            by="Diff (num)", ascending=False
-        ).head(50)
-
-        # Human-friendly column
-        df["Diff"] = df["Diff (num)"].map(helper.format_money)
 
-        return df[["Item", "Item #", "Old → New", "Diff"]]
+    @st.cache_data
+    def df_price_change(dataset_key, _item_stats, board):
+        cols, ranked = helper.item_leaderboards(dataset_key, _item_stats)
+        top = ranked[board]
+
+        return pd.DataFrame(
+            {
+                "Item": cols["name"][top],
+                "Item #": cols["itemNumber"][top],
+                "Old → New": [
+                    f"{helper.format_money(a)} → {helper.format_money(b)}"
+                    for a, b in zip(cols["first_price"][top], cols["last_price"][top])
+                ],
+                "Diff": [helper.format_money(v) for v in cols["price_diff"][top]],
+            }
+        )
 
+    def df_price_increase():
+        return df_price_change(dataset_key, merch["item_stats"], "price_increase")
 
     def df_price_decrease():
-        rows = []
-        for s in item_values:
-            if s["last_price"] < s["first_price"]:
-                diff = s["last_price"] - s["first_price"]
-                rows.append(
-                    {
-                        "Item": s["name"],
-                        "Item #": s["itemNumber"],
-                        "Old → New": f"{helper.format_money(s['first_price'])} → {helper.format_money(s['last_price'])}",
-                        "Diff (num)": diff,   # numeric
-                    }
-                )
-
-        # If no rows → return an empty table with correct columns
-        if not rows:
-            return pd.DataFrame(columns=["Item", "Item #", "Old → New", "Diff"])
-
-        # Build DataFrame and sort N U M E R I C A L L Y
-        df = pd.DataFrame(rows).sort_values(
-            by="Diff (num)",
-            ascending=True   # lower first
-        ).head(50)
-
-        # Human-readable formatted column
-        df["Diff"] = df["Diff (num)"].map(helper.format_money)
-
-        return df[["Item", "Item #", "Old → New", "Diff"]]
-
-
-    
+        return df_price_change(dataset_key, merch["item_stats"], "price_decrease")
 
     bottom_row_left, bottom_row_right = st.columns(2)
 
@@ -972,4 +916,10 @@ with tabs[3]: # Prices
             st.dataframe(df_dec, hide_index=True, use_container_width=True)
         else:
             st.info("No items with price decreases.")
-   
\ No newline at end of file
+   
+
+
+# ------------------------------------------------------------
+# Performance panel (sidebar toggle at the top)
+# ------------------------------------------------------------
+helper.performance_panel(profiler.stop(), st.session_state.get("perf_load"))
@@ -0,0 +1,100 @@
+import argparse
+import sys
+from datetime import date, timedelta
+
+import fetch
+import pipeline
+import store
+
+
+# ------------------------------------------------------------
+# Incremental sync into the receipt store
+# ------------------------------------------------------------
+# Instead of downloading the whole history again, ask the orders API only for
+# the days after the newest receipt already stored for the membership (its
+# high-water mark, see ReceiptStore.high_water_marks), starting OVERLAP_DAYS
+# early so receipts that post late - refunds, mostly - are still picked up.
+# Receipts already stored are skipped by the upsert, and only the new ones are
+# folded into the saved dashboard snapshot, so a daily refresh moves a few
+# kilobytes and reprocesses a handful of receipts. A running dashboard on the
+# same store shows them on its next rerun (the store revision changes).
+#
+#   python sync.py --store ~/.costco/receipts.db           # e.g. from a daily cron job
+#
+# The first sync of an empty store fetches FIRST_SYNC_DAYS back (or --since).
+# The sync is one transaction: if a month fails to download, nothing is stored.
+
+OVERLAP_DAYS = 14
+FIRST_SYNC_DAYS = 3 * 365
+
+
+def sync_start(marks, membership=None, overlap_days=OVERLAP_DAYS, today=None):
+    """First day to request, given the store's high-water marks ({membership: transactionDateTime})."""
+    today = today or date.today()
+    if membership is None:
+        if len(marks) > 1:
+            raise ValueError(
+                "The store holds receipts for memberships " + ", ".join(sorted(map(str, marks)))
+                + "; pick the signed-in one with --membership"
+            )
+        membership = next(iter(marks), None)
+    latest = marks.get(membership)
+    if latest is None:
+        return today - timedelta(days=FIRST_SYNC_DAYS)
+    return min(fetch.parse_date(latest[:10]) - timedelta(days=overlap_days), today)
+
+
+def sync(receipt_store, membership=None, overlap_days=OVERLAP_DAYS, since=None, today=None, **options):
+    """
+    Fetch receipts from the high-water mark (or `since`) to today and upsert them into
+    `receipt_store`. Takes fetch.iter_receipts options (url, concurrency, ...); returns a
+    summary dict: start, end, fetched, inserted, updated, requests, bytes.
+    """
+    today = today or date.today()
+    start = fetch.parse_date(since) if since else sync_start(
+        receipt_store.high_water_marks(), membership, overlap_days, today)
+    summary = {"start": start, "end": today, "fetched": 0}
+    stats = {"requests": 0, "bytes": 0}
+
+    def counted(receipts):
+        for rec in receipts:
+            summary["fetched"] += 1
+            yield rec
+
+    inserted, updated = receipt_store.upsert(
+        counted(fetch.iter_receipts(start, today, stats=stats, **options)),
+        fold=pipeline.fold_new_receipts,
+    )
+    summary.update(stats, inserted=len(inserted), updated=updated)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch only receipts newer than the receipt store already has.")
+    parser.add_argument("--store", help=f"SQLite receipt store (default: ${store.STORE_ENV_VAR})")
+    parser.add_argument("--membership", help="membershipNumber whose high-water mark to start from")
+    parser.add_argument("--overlap-days", type=int, default=OVERLAP_DAYS,
+                        help="days before the high-water mark to fetch again (default %(default)s)")
+    parser.add_argument("--since", help="fetch from this day instead (MM/DD/YYYY or YYYY-MM-DD)")
+    parser.add_argument("--url", default=fetch.ENDPOINT, help="GraphQL endpoint (e.g. a local mock_server.py)")
+    parser.add_argument("--concurrency", type=int, default=fetch.CONCURRENCY, help="requests in flight")
+    args = parser.parse_args(argv)
+
+    receipt_store = store.open_store(args.store)
+    if receipt_store is None:
+        parser.error(f"give --store or set ${store.STORE_ENV_VAR}")
+    try:
+        summary = sync(receipt_store, membership=args.membership, overlap_days=max(args.overlap_days, 0),
+                       since=args.since, url=args.url, concurrency=max(args.concurrency, 1))
+    except (ValueError, fetch.FetchError) as e:
+        raise SystemExit(str(e))
+    print(
+        f"{summary['start']:%m/%d/%Y} - {summary['end']:%m/%d/%Y}: {summary['fetched']:,} receipts "
+        f"({summary['bytes'] / 1024:,.1f} KB in {summary['requests']} requests), "
+        f"{summary['inserted']:,} new, {summary['updated']:,} updated",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
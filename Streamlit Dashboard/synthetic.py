@@ -0,0 +1,249 @@
+import argparse
+import math
+import random
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+import ingest
+
+
+# ------------------------------------------------------------
+# Deterministic synthetic receipts
+# ------------------------------------------------------------
+# Receipts shaped like the receiptsWithCounts response saved by
+# manual_receipt_downloader.js (every field the GraphQL query asks for), so the
+# dashboard can be exercised and benchmarked without real purchase history.
+# The same arguments and seed always produce the same receipts.
+
+WAREHOUSES = [
+    # (warehouseNumber, warehouseName, city, state, postal code)
+    (1, "SEATTLE", "SEATTLE", "WA", "98134"),
+    (6, "TUKWILA", "TUKWILA", "WA", "98188"),
+    (8, "ISSAQUAH", "ISSAQUAH", "WA", "98027"),
+    (106, "KIRKLAND", "KIRKLAND", "WA", "98034"),
+    (119, "WOODINVILLE", "WOODINVILLE", "WA", "98072"),
+    (423, "SAN FRANCISCO", "SAN FRANCISCO", "CA", "94103"),
+    (465, "SAN JOSE", "SAN JOSE", "CA", "95131"),
+    (1234, "AUSTIN", "AUSTIN", "TX", "78752"),
+]
+
+GAS_GRADES = [
+    # (itemNumber, fuelGradeCode, fuelGradeDescription, share of fills, base $/gal)
+    ("800599", "01", "REGULAR", 0.75, 3.60),
+    ("800877", "03", "PREMIUM", 0.18, 4.20),
+    ("800601", "04", "DIESEL", 0.07, 4.05),
+]
+
+TAX_RATE = 0.0825
+
+
+def _catalog(rng, distinct_items):
+    """(itemNumber, description, department, base price, yearly drift) per item, most popular first."""
+    catalog = []
+    for k in range(distinct_items):
+        base = round(math.exp(rng.uniform(math.log(1.5), math.log(120.0))), 2)
+        catalog.append((
+            str(1000000 + 37 * k),
+            f"KS ITEM {k:05d}",
+            rng.choice((13, 14, 17, 18, 19, 20, 23, 34, 65)),
+            base,
+            rng.uniform(-0.05, 0.12),
+        ))
+    # Zipf-ish popularity: a few staples show up on most trips
+    weights = [1.0 / (k + 1) ** 0.8 for k in range(distinct_items)]
+    return catalog, list(accumulate(weights))
+
+
+def _item(number, description, department, unit, amount):
+    return {
+        "itemNumber": number,
+        "itemDescription01": description,
+        "frenchItemDescription1": None,
+        "itemDescription02": None,
+        "frenchItemDescription2": None,
+        "itemIdentifier": "E",
+        "itemDepartmentNumber": department,
+        "unit": unit,
+        "amount": amount,
+        "taxFlag": "Y" if department in (14, 18, 23) else "N",
+        "merchantID": None,
+        "entryMethod": None,
+        "transDepartmentNumber": department,
+        "fuelUnitQuantity": None,
+        "fuelGradeCode": None,
+        "itemUnitPriceAmount": 0,
+        "fuelUomCode": None,
+        "fuelUomDescription": None,
+        "fuelUomDescriptionFr": None,
+        "fuelGradeDescription": None,
+        "fuelGradeDescriptionFr": None,
+    }
+
+
+def _tender(amount, seq):
+    return {
+        "tenderTypeCode": "061",
+        "tenderSubTypeCode": None,
+        "tenderDescription": "VISA",
+        "amountTender": amount,
+        "displayAccountNumber": "1234",
+        "sequenceNumber": seq,
+        "approvalNumber": f"{seq:06d}",
+        "responseCode": None,
+        "tenderTypeName": "VISA",
+        "transactionID": None,
+        "merchantID": None,
+        "entryMethod": None,
+        "tenderAcctTxnNumber": None,
+        "tenderAuthorizationCode": None,
+        "tenderTypeNameFr": None,
+        "tenderEntryMethodDescription": "Chip Read",
+        "walletType": None,
+        "walletId": None,
+        "storedValueBucket": None,
+    }
+
+
+def _sub_taxes(taxes):
+    return {
+        "tax1": None, "tax2": None, "tax3": None, "tax4": None,
+        "aTaxPercent": TAX_RATE * 100, "aTaxLegend": "A", "aTaxAmount": taxes,
+        "bTaxPercent": None, "bTaxLegend": None, "bTaxAmount": None,
+        "cTaxPercent": None, "cTaxLegend": None, "cTaxAmount": None,
+        "dTaxAmount": None,
+    }
+
+
+def generate_receipts(n_receipts, items_per_receipt=8, gas_ratio=0.2, refund_ratio=0.02,
+                      distinct_items=2000, seed=0, start=date(2022, 1, 1), days=3 * 365):
+    """
+    Yield `n_receipts` receipt dicts in date order, spread over `days` days from `start`.
+
+    items_per_receipt   average line items on a warehouse trip
+    gas_ratio           share of receipts that are gas station fills
+    refund_ratio        share of warehouse receipts that are refunds
+    distinct_items      size of the item catalog (drives len(item_stats))
+    """
+    rng = random.Random(seed)
+    catalog, cum_weights = _catalog(rng, distinct_items)
+    membership = f"1119{seed % 100000:05d}"
+    start_dt = datetime(start.year, start.month, start.day)
+
+    for i in range(n_receipts):
+        day = i * days // max(n_receipts, 1)
+        when = start_dt + timedelta(days=day, seconds=rng.randrange(9 * 3600, 20 * 3600))
+        years = day / 365.0
+        wh_no, wh_name, city, state, postal = WAREHOUSES[rng.randrange(len(WAREHOUSES))]
+        register = rng.randrange(1, 30)
+
+        if rng.random() < gas_ratio:
+            number, code, grade, _, base = rng.choices(GAS_GRADES, weights=[g[3] for g in GAS_GRADES])[0]
+            price = round(base * (1 + 0.08 * math.sin(day / 58.0)) + rng.uniform(-0.05, 0.05), 3)
+            gallons = round(rng.uniform(6.0, 18.0), 3)
+            amount = round(gallons * price, 2)
+            item = _item(number, grade, 54, 1, amount)
+            item.update({
+                "fuelUnitQuantity": gallons,
+                "fuelGradeCode": code,
+                "itemUnitPriceAmount": price,
+                "fuelUomCode": "GAL",
+                "fuelUomDescription": "Gallons",
+                "fuelUomDescriptionFr": "Gallons",
+                "fuelGradeDescription": grade,
+                "fuelGradeDescriptionFr": grade,
+            })
+            items = [item]
+            item_count = 1
+            sub_total, taxes, savings = amount, 0.0, 0.0
+            receipt_type, document_type, transaction_type = "Gas Station", "FuelReceipts", "Sales"
+        else:
+            refund = rng.random() < refund_ratio
+            sign = -1 if refund else 1
+            count = 1 if refund else rng.randint(1, max(1, 2 * items_per_receipt - 1))
+            items, item_count, sub_total, savings = [], 0, 0.0, 0.0
+            for number, desc, dept, base, drift in rng.choices(catalog, cum_weights=cum_weights, k=count):
+                unit = sign * (1 if rng.random() < 0.85 else rng.randint(2, 4))
+                price = round(base * (1 + drift * years), 2)
+                amount = round(unit * price, 2)
+                items.append(_item(number, desc, dept, unit, amount))
+                item_count += abs(unit)
+                sub_total += amount
+                if not refund and rng.random() < 0.08:
+                    # instant savings show up as a separate negative line ("/<itemNumber>")
+                    discount = round(min(price * 0.25, rng.choice((1.0, 2.0, 3.0, 4.0, 5.0))), 2)
+                    items.append(_item("345678", f"/{number}", dept, -1, -discount))
+                    sub_total -= discount
+                    savings += discount
+            sub_total = round(sub_total, 2)
+            taxes = round(sub_total * TAX_RATE * 0.4, 2)
+            receipt_type, document_type = "In-Warehouse", "WarehouseReceiptDetail"
+            transaction_type = "Refund" if refund else "Sales"
+
+        total = round(sub_total + taxes, 2)
+        transaction_number = 1 + i % 9999
+        yield {
+            "warehouseName": wh_name,
+            "receiptType": receipt_type,
+            "documentType": document_type,
+            "transactionDateTime": when.strftime("%Y-%m-%dT%H:%M:%S"),
+            "transactionDate": when.strftime("%Y-%m-%d"),
+            "companyNumber": 1,
+            "warehouseNumber": wh_no,
+            "operatorNumber": rng.randrange(100, 999),
+            "warehouseShortName": wh_name,
+            "registerNumber": register,
+            "transactionNumber": transaction_number,
+            "transactionType": transaction_type,
+            "transactionBarcode": f"21{wh_no:05d}{register:03d}{transaction_number:04d}{i:09d}",
+            "total": total,
+            "warehouseAddress1": f"{100 + wh_no} MAIN ST",
+            "warehouseAddress2": None,
+            "warehouseCity": city,
+            "warehouseState": state,
+            "warehouseCountry": "US",
+            "warehousePostalCode": postal,
+            "totalItemCount": item_count,
+            "subTotal": sub_total,
+            "taxes": taxes,
+            "invoiceNumber": None,
+            "sequenceNumber": None,
+            "itemArray": items,
+            "tenderArray": [_tender(total, i % 1000000)],
+            "subTaxes": _sub_taxes(taxes),
+            "instantSavings": round(savings, 2),
+            "membershipNumber": membership,
+        }
+
+
+def write_json(path, receipts):
+    """
+    Write receipts without holding them all: a JSON array (the downloader's format), or
+    whichever other upload format the path's extension names (see ingest.write_receipts).
+    """
+    ingest.write_receipts(path, receipts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic Costco receipts as a downloader-style JSON file "
+                                                 "(or .ndjson, .json.gz, .json.zst, .parquet).")
+    parser.add_argument("path")
+    parser.add_argument("-n", "--receipts", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=8, help="average line items per warehouse trip")
+    parser.add_argument("--gas-ratio", type=float, default=0.2)
+    parser.add_argument("--refund-ratio", type=float, default=0.02)
+    parser.add_argument("--distinct-items", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    write_json(args.path, generate_receipts(
+        args.receipts,
+        items_per_receipt=args.items,
+        gas_ratio=args.gas_ratio,
+        refund_ratio=args.refund_ratio,
+        distinct_items=args.distinct_items,
+        seed=args.seed,
+    ))
+
+
+if __name__ == "__main__":
+    main()
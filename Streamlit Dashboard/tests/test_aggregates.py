@@ -0,0 +1,103 @@
+import copy
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+import engine
+import money
+import synthetic
+from aggregates import ReceiptAggregate, merge_all
+
+
+def _receipts(n=300, seed=5):
+    return list(synthetic.generate_receipts(n, seed=seed))
+
+
+def _summary(agg):
+    """Everything finalize() shows, in a form that doesn't depend on merge order."""
+    merch, gas, locations, date_range = agg.finalize()
+    items = {
+        k: (s["total_spent"], s["total_units"], s["purchases"],
+            sorted(zip(s["price_history"].dates.tolist(), s["price_history"].prices.tolist())))
+        for k, s in merch["item_stats"].items()
+    }
+    fuel = gas["fuel"].sort_values(list(gas["fuel"].columns)).reset_index(drop=True)
+    return {
+        "locations": locations,
+        "date_range": date_range,
+        "merch": {k: merch[k] for k in ("total_spent", "refund_count", "refund_total", "Total Savings", "count",
+                                        "monthly", "daily", "subtotal_by_year", "locations")},
+        "units": round(merch["total_units"], 6),
+        "gas": {k: gas[k] for k in ("total_spent", "count", "monthly", "daily", "locations")},
+        "gallons": round(gas["total_gallons"], 6),
+        "items": items,
+        "fuel": fuel.to_dict("list"),
+        "cube": (merch["cube"].select(), gas["cube"].select(), merch["cube"].select(lines=True)),
+        "timeline": (merch["timeline"].window(), gas["timeline"].window()),
+    }
+
+
+def _parts(receipts, n):
+    size = math.ceil(len(receipts) / n)
+    return [engine.stream_aggregate(receipts[i:i + size]) for i in range(0, len(receipts), size)]
+
+
+def test_merge_is_order_independent():
+    parts = _parts(_receipts(), 4)
+    expected = _summary(merge_all(parts))
+    for order in itertools.permutations(parts):
+        total = ReceiptAggregate()
+        for part in order:
+            total = total.merge(part)
+        assert _summary(total) == expected
+    a, b = parts[:2]
+    assert _summary(a.merge(b)) == _summary(b.merge(a))
+
+
+@pytest.mark.parametrize("files", [1, 2, 3, 7])
+def test_merge_all_of_partials_matches_one_pass(files):
+    receipts = _receipts()
+    assert _summary(merge_all(_parts(receipts, files))) == _summary(engine.stream_aggregate(receipts))
+
+
+def test_small_batches_match_one_batch():
+    receipts = _receipts()
+    assert _summary(engine.stream_aggregate(receipts, batch_size=7)) == _summary(engine.stream_aggregate(receipts))
+
+
+def _with_totals(template, totals):
+    out = []
+    for i, total in enumerate(totals):
+        rec = copy.deepcopy(template)
+        rec["transactionBarcode"] = f"2100{i:019d}"
+        rec["total"] = rec["subTotal"] = total
+        rec["instantSavings"] = 0
+        for item in rec["itemArray"]:
+            item["amount"] = total / len(rec["itemArray"])
+        out.append(rec)
+    return out
+
+
+@pytest.mark.parametrize("totals", [
+    [0.1, 0.2],
+    [0.1] * 10,
+    [19.99, 0.01, 3.3, 1.1, 2.2],
+    [0.07] * 1000,
+])
+def test_cents_are_exact(totals):
+    template = next(r for r in _receipts(50) if r["receiptType"] == "In-Warehouse" and r["total"] > 0)
+    receipts = _with_totals(template, totals)
+    merch, _, _, _ = engine.aggregate_receipts(receipts).finalize()
+    expected = int(money.to_cents(math.fsum(totals)))
+    assert merch["total_spent"] == expected
+    assert isinstance(merch["total_spent"], int)
+    # split across partials, the sum is still exact
+    halves = merge_all([engine.stream_aggregate(receipts[::2]), engine.stream_aggregate(receipts[1::2])])
+    assert halves.finalize()[0]["total_spent"] == expected
+
+
+def test_to_cents_rounds_to_the_nearest_cent():
+    assert money.to_cents([0.1 + 0.2, 1.005, -12.34, 0.0]).tolist() == [30, 100, -1234, 0]
+    assert money.to_cents(np.array([19.99])).dtype == np.int64
@@ -0,0 +1,39 @@
+import json
+
+import benchmark
+
+STAGES = ["generate", "process_receipts", "leaderboards", "chart_series", "price_history_frames",
+          "cube_filters", "date_windows"]
+
+
+def test_every_stage_runs_at_1k():
+    results = benchmark.run_size(1000, memory=False, seed=1)
+    assert [r["stage"] for r in results] == STAGES
+    assert all(r["seconds"] > 0 and r["receipts"] == 1000 and r["items"] > 0 for r in results)
+
+
+def test_regressions_respect_tolerance_and_slack():
+    base = {(1000, "process_receipts"): {"seconds": 1.0, "peak_mib": 10.0},
+            (1000, "leaderboards"): {"seconds": 0.001, "peak_mib": None}}
+    results = [{"receipts": 1000, "stage": "process_receipts", "seconds": 1.4, "peak_mib": 16.0},
+               {"receipts": 1000, "stage": "leaderboards", "seconds": 0.01, "peak_mib": 1.0},
+               {"receipts": 5000, "stage": "process_receipts", "seconds": 99.0, "peak_mib": None}]
+    found = benchmark.regressions(results, base, tolerance=0.5, slack=0.05)
+    # 40% slower is within tolerance, 60% more memory is not; 10x of a millisecond is under
+    # the slack, and sizes missing from the baseline are not compared
+    assert len(found) == 1 and "peak_mib" in found[0]
+
+
+def test_baseline_run_exits_non_zero_on_regression(tmp_path, capsys):
+    baseline = tmp_path / "baseline.jsonl"
+    argv = ["--sizes", "1000", "--no-memory", "--seed", "1"]
+    assert benchmark.main(argv + ["--output", str(baseline)]) == 0
+    assert benchmark.main(argv + ["--baseline", str(baseline), "--tolerance", "10"]) == 0
+
+    rows = [json.loads(line) for line in baseline.read_text().splitlines()]
+    for r in rows:
+        if r["stage"] == "process_receipts":
+            r["seconds"] /= 1000
+    baseline.write_text("".join(json.dumps(r) + "\n" for r in rows))
+    assert benchmark.main(argv + ["--baseline", str(baseline), "--slack", "0"]) == 1
+    assert "process_receipts" in capsys.readouterr().out.split("regression(s)")[-1]
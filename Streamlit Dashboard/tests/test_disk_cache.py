@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import disk_cache
+import engine
+import synthetic
+
+
+def _receipts(numeric_items):
+    receipts = list(synthetic.generate_receipts(60, seed=7))
+    if numeric_items:
+        for rec in receipts:
+            for item in rec.get("itemArray") or []:
+                if str(item.get("itemNumber", "")).isdigit():
+                    item["itemNumber"] = int(item["itemNumber"])
+    return receipts
+
+
+@pytest.mark.parametrize("numeric_items", [False, True])
+def test_round_trip(tmp_path, numeric_items):
+    agg = engine.aggregate_receipts(_receipts(numeric_items))
+    cache = disk_cache.DiskCache(str(tmp_path))
+    cache.save("key", agg)
+    loaded = cache.load("key")
+    assert loaded is not None
+
+    merch, gas, locations, date_range = agg.finalize()
+    l_merch, l_gas, l_locations, l_date_range = loaded.finalize()
+    assert (l_locations, l_date_range) == (locations, date_range)
+    for key in ("total_spent", "refund_total", "Total Savings", "count", "monthly", "daily", "subtotal_by_year"):
+        assert l_merch[key] == merch[key]
+    for key in ("total_spent", "count", "monthly", "daily"):
+        assert l_gas[key] == gas[key]
+    # item numbers come back as text, whatever type the export used
+    stats = {str(k): v for k, v in merch["item_stats"].items()}
+    assert set(l_merch["item_stats"]) == set(stats)
+    for item_no, stat in l_merch["item_stats"].items():
+        assert stat["total_spent"] == stats[item_no]["total_spent"]
+        assert stat["purchases"] == stats[item_no]["purchases"]
+        assert list(stat["price_history"].prices) == list(stats[item_no]["price_history"].prices)
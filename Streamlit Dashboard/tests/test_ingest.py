@@ -0,0 +1,59 @@
+import gzip
+import io
+import json
+from itertools import chain
+
+import pytest
+
+import ingest
+import synthetic
+
+
+class Upload(io.BytesIO):
+    """What st.file_uploader hands over: bytes with a file name."""
+
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+
+def _ndjson_gz(receipts):
+    return gzip.compress("".join(json.dumps(r) + "\n" for r in receipts).encode())
+
+
+def test_unique_receipts_across_formats():
+    receipts = list(synthetic.generate_receipts(40, seed=2))
+    first = Upload("export-1.json", json.dumps(receipts[:30]).encode())
+    second = Upload("export-2.ndjson.gz", _ndjson_gz(receipts[20:]))
+    merged = list(ingest.unique_receipts(chain(ingest.iter_upload(first), ingest.iter_upload(second))))
+    assert len(merged) == 40
+    assert sorted(map(ingest.receipt_key, merged)) == sorted(map(ingest.receipt_key, receipts))
+
+
+def test_unique_receipts_keeps_first_copy_and_same_file_twice():
+    receipts = list(synthetic.generate_receipts(10, seed=4))
+    data = json.dumps(receipts).encode()
+    uploads = [Upload("a.json", data), Upload("a-again.json", data)]
+    merged = list(ingest.unique_receipts(chain.from_iterable(map(ingest.iter_upload, uploads))))
+    assert merged == receipts
+
+
+def test_receipt_key_is_the_same_typed_and_untyped():
+    pytest.importorskip("msgspec")
+    receipts = list(synthetic.generate_receipts(20, seed=6))
+    # no barcode and no transaction number: keyed by content, amounts as text or numbers
+    for i, rec in enumerate(receipts):
+        del rec["transactionBarcode"], rec["transactionNumber"]
+        if i % 2:
+            rec["total"] = str(rec["total"])
+            rec["warehouseNumber"] = str(rec["warehouseNumber"])
+            for item in rec.get("itemArray") or []:
+                item["amount"] = f"{item['amount']:.2f}"
+    data = json.dumps(receipts).encode()
+    untyped = list(ingest.iter_upload(Upload("a.json", data)))
+    typed = list(ingest.iter_upload(Upload("a.json", data), typed=True))
+    assert not isinstance(typed[0], dict)
+    keys = [ingest.receipt_key(r) for r in untyped]
+    assert all(k.startswith("sha1:") for k in keys)
+    assert keys == [ingest.receipt_key(r) for r in typed]
+    assert len(set(keys)) == len(keys)
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+import leaderboards
+
+
+def _reference(values, k, ascending=False, mask=None):
+    positions = [i for i in range(len(values)) if mask is None or mask[i]]
+    return sorted(positions, key=lambda i: (values[i] if ascending else -values[i], i))[:k]
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("ascending", [False, True])
+def test_top_k_matches_a_full_sort(seed, ascending):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 300))
+    # few distinct values, so many items tie at the k-th place
+    values = rng.integers(-5, 6, n).astype(np.float64)
+    mask = rng.random(n) < 0.7 if seed % 2 else None
+    for k in (0, 1, 3, 10, 50, n, n + 5):
+        got = leaderboards.top_k(values, k, ascending=ascending, mask=mask)
+        assert got.tolist() == _reference(values, k, ascending, mask)
+
+
+def test_top_k_ties_keep_item_order():
+    values = np.array([1.0, 5.0, 5.0, 3.0, 5.0, 5.0])
+    assert leaderboards.top_k(values, 3).tolist() == [1, 2, 4]
+    assert leaderboards.top_k(values, 2, ascending=True).tolist() == [0, 3]
@@ -0,0 +1,48 @@
+import pipeline
+import store
+import synthetic
+from engine import aggregate_receipts
+
+
+def _totals(agg):
+    merch, gas, locations, date_range = agg.finalize()
+    return (merch["total_spent"], merch["count"], merch["monthly"], gas["total_spent"], gas["count"],
+            {k: s["purchases"] for k, s in merch["item_stats"].items()}, locations, date_range)
+
+
+def _parts(receipt_store):
+    return receipt_store._conn.execute("SELECT COUNT(*) FROM snapshot_parts").fetchone()[0]
+
+
+def test_uploads_append_snapshot_parts(tmp_path, monkeypatch):
+    monkeypatch.setattr(store, "COMPACT_PARTS", 4)
+    receipts = list(synthetic.generate_receipts(200, seed=8))
+    receipt_store = store.ReceiptStore(str(tmp_path / "receipts.db"))
+    receipt_store.upsert(receipts[:100])
+    receipt_store.save_snapshot(aggregate_receipts(receipt_store.iter_receipts()))
+
+    for i in (100, 125, 150):
+        inserted, updated = receipt_store.upsert(receipts[i:i + 25] + receipts[:5], fold=pipeline.fold_new_receipts)
+        assert (len(inserted), updated) == (25, 0)
+    assert _parts(receipt_store) == 4
+    # loading merges the parts, then writes them back as one
+    loaded = receipt_store.load_snapshot(merge=pipeline.merge_snapshot)
+    assert _totals(loaded) == _totals(aggregate_receipts(receipts[:175]))
+    assert _parts(receipt_store) == 1
+
+    receipt_store.upsert(receipts[175:], fold=pipeline.fold_new_receipts)
+    assert _totals(receipt_store.load_snapshot(merge=pipeline.merge_snapshot)) == _totals(aggregate_receipts(receipts))
+    assert receipt_store.load_snapshot() is None    # several parts and nothing to merge them with
+
+
+def test_changed_receipt_invalidates_snapshot(tmp_path):
+    receipts = list(synthetic.generate_receipts(50, seed=8))
+    receipt_store = store.ReceiptStore(str(tmp_path / "receipts.db"))
+    receipt_store.upsert(receipts)
+    receipt_store.save_snapshot(aggregate_receipts(receipts))
+    changed = dict(receipts[0], total=receipts[0]["total"] + 1)
+    assert receipt_store.upsert([changed], fold=pipeline.fold_new_receipts) == ([], 1)
+    assert receipt_store.load_snapshot(merge=pipeline.merge_snapshot) is None
+    # without a current snapshot, new receipts are stored but not folded into a stale one
+    receipt_store.upsert(list(synthetic.generate_receipts(5, seed=99)), fold=pipeline.fold_new_receipts)
+    assert receipt_store.load_snapshot(merge=pipeline.merge_snapshot) is None
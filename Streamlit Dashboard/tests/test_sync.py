@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+web = pytest.importorskip("aiohttp.web")
+
+import fetch
+import ingest
+import mock_server
+import store
+import sync
+
+START = date(2024, 1, 1)
+DAYS = 120
+
+
+class _Server:
+    """mock_server's app on a free local port, run by an event loop in a background thread."""
+
+    def __init__(self, **options):
+        self.index = mock_server.ReceiptIndex(2, start=START, days=DAYS, seed=3)
+        self.app = mock_server.make_app(self.index, per_receipt=0, seed=1, **options)
+        self.loop = asyncio.new_event_loop()
+        self.runner = web.AppRunner(self.app)
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.runner.setup())
+            self.loop.run_until_complete(web.TCPSite(self.runner, "127.0.0.1", 0).start())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait(10)
+        self.url = f"http://127.0.0.1:{self.runner.addresses[0][1]}{mock_server.PATH}"
+
+    @property
+    def stats(self):
+        return self.app["stats"]
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**options):
+        servers.append(_Server(**options))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def _fetch(server, start, end, **options):
+    return list(fetch.iter_receipts(start, end, url=server.url, id_token="test", **options))
+
+
+def test_fetch_retries_through_failures(serve):
+    server = serve(fail_rate=0.2)
+    end = START + timedelta(days=DAYS - 1)
+    receipts = _fetch(server, START, end, backoff=0.01)
+    assert server.stats["failed"] > 0
+    assert len(receipts) == len(server.index.between(START, end))
+    assert len({ingest.receipt_key(r) for r in receipts}) == len(receipts)
+
+
+def test_fetch_honours_retry_after(serve, monkeypatch):
+    delays = []
+    delay = fetch._delay
+
+    def recorded(attempt, backoff, retry_after=None):
+        delays.append(delay(attempt, backoff, retry_after))
+        return delays[-1]
+
+    monkeypatch.setattr(fetch, "_delay", recorded)
+    server = serve(fail_rate=0.3, retry_after=0.05)
+    # a backoff this long would stall the test if Retry-After were ignored
+    receipts = _fetch(server, START, START + timedelta(days=59), backoff=60)
+    assert receipts
+    assert delays and set(delays) == {0.05}
+    assert len(delays) == server.stats["failed"]
+
+
+def test_fetch_gives_up_after_retries(serve):
+    server = serve(fail_rate=1.0, retry_after=0)
+    with pytest.raises(fetch.FetchError, match="after 3 attempts"):
+        _fetch(server, START, START + timedelta(days=10), retries=2)
+
+
+def test_second_sync_adds_nothing(serve, tmp_path):
+    server = serve()
+    receipt_store = store.ReceiptStore(str(tmp_path / "receipts.db"))
+    today = START + timedelta(days=DAYS - 1)
+    options = {"url": server.url, "id_token": "test", "today": today}
+
+    first = sync.sync(receipt_store, since=START.isoformat(), **options)
+    assert first["inserted"] == len(server.index.between(START, today)) > 0
+    revision, count = receipt_store.revision(), receipt_store.count()
+
+    second = sync.sync(receipt_store, **options)
+    # only the overlap before the high-water mark is asked for again
+    assert second["start"] >= today - timedelta(days=sync.OVERLAP_DAYS)
+    assert (second["inserted"], second["updated"]) == (0, 0)
+    assert second["fetched"] > 0
+    assert receipt_store.revision() == revision
+    assert receipt_store.count() == count
@@ -0,0 +1,77 @@
+import datetime
+
+import numpy as np
+import pytest
+
+import pipeline
+import synthetic
+from timeline import Timeline
+
+
+def _timeline():
+    # three days, two fields: a per-day total and a count
+    return Timeline.from_columns(
+        ("total", "trips"),
+        ["2024-02-27", "2024-02-29", "2024-02-29", "2024-03-02"],
+        {"total": [100, 250, 50, 700], "trips": [1, 1, 1, 1]},
+    )
+
+
+@pytest.mark.parametrize("start, end, total, trips", [
+    (None, None, 1100, 4),
+    ("2024-02-29", "2024-02-29", 300, 2),
+    ("2024-02-28", "2024-03-01", 300, 2),        # edges fall between stored days
+    ("2024-01-01", "2024-02-27", 100, 1),        # starts before the data
+    ("2024-03-01", "2025-01-01", 700, 1),        # runs past the data
+    ("2023-01-01", "2023-12-31", 0, 0),          # entirely before
+    ("2024-03-02", "2024-02-27", 0, 0),          # end before start
+])
+def test_timeline_window(start, end, total, trips):
+    assert _timeline().window(start, end) == {"total": total, "trips": trips}
+
+
+def test_timeline_window_matches_brute_force():
+    rng = np.random.default_rng(1)
+    dates = np.datetime64("2023-01-01") + rng.integers(0, 400, 500)
+    values = rng.integers(0, 10_000, 500)
+    t = Timeline.from_columns(("total",), dates, {"total": values})
+    for _ in range(50):
+        lo, hi = np.sort(np.datetime64("2022-12-01") + rng.integers(0, 460, 2))
+        expected = values[(dates >= lo) & (dates <= hi)].sum()
+        assert t.window(lo, hi)["total"] == expected
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (datetime.date(2025, 3, 1), datetime.date(2025, 3, 31), (datetime.date(2024, 3, 1), datetime.date(2024, 3, 31))),
+    (datetime.date(2024, 2, 29), datetime.date(2024, 3, 1), (datetime.date(2023, 2, 28), datetime.date(2023, 3, 1))),
+    (datetime.date(2025, 2, 28), datetime.date(2025, 2, 28), (datetime.date(2024, 2, 28), datetime.date(2024, 2, 28))),
+])
+def test_year_earlier(start, end, expected):
+    assert pipeline.year_earlier(start, end) == expected
+
+
+def test_last_days():
+    assert pipeline.last_days(datetime.date(2024, 3, 1), 2) == (datetime.date(2024, 2, 29), datetime.date(2024, 3, 1))
+
+
+def test_window_kpis_match_kpis_of_the_window():
+    receipts = list(synthetic.generate_receipts(400, seed=11, start=datetime.date(2023, 1, 1), days=500))
+    merch, gas, _, _ = pipeline.process_receipts(receipts)
+
+    # the whole range (and a window running past it on both sides) is the headline kpis
+    everything = pipeline.kpis(merch, gas, set())
+    for start, end in ((None, None), ("2020-01-01", "2030-01-01")):
+        window = pipeline.window_kpis(merch, gas, start, end)
+        for key in ("total_spent", "merch_spent", "merch_trips", "total_savings", "refund_total",
+                    "refund_count", "gas_spent", "gas_trips"):
+            assert window[key] == everything[key], key
+
+    # an inner window equals processing only the receipts dated inside it
+    start, end = datetime.date(2023, 6, 1), datetime.date(2023, 9, 30)
+    inside = [r for r in receipts if start.isoformat() <= r["transactionDate"][:10] <= end.isoformat()]
+    m, g, _, _ = pipeline.process_receipts(inside)
+    expected = pipeline.kpis(m, g, set())
+    window = pipeline.window_kpis(merch, gas, start, end)
+    for key in ("total_spent", "merch_spent", "merch_trips", "total_savings", "refund_total", "gas_spent"):
+        assert window[key] == expected[key], key
+        assert isinstance(window[key], int), key
@@ -0,0 +1,90 @@
+import numpy as np
+
+
+# ------------------------------------------------------------
+# Date-sorted totals with prefix sums
+# ------------------------------------------------------------
+# One row per day that has receipts (transactionDate has no time of day, so this
+# answers every date window a per-receipt index would, in far fewer rows), with a
+# column per measure. Cumulative sums over the rows turn any inclusive date window
+# into two binary searches and one subtraction: "last 90 days" and "same period
+# last year" cost the same however many receipts there are.
+#
+# Money fields hold whole cents (see money.py). Sums and prefix sums of integers
+# stay exact in float64 below 2**53 cents, so one float matrix serves the money
+# and the gallons columns alike.
+
+MERCH_FIELDS = ("total", "subTotal", "instantSavings", "trips", "refund_total", "refund_count")
+GAS_FIELDS = ("total", "gallons", "price_sum", "trips")
+
+
+class Timeline:
+    """Per-day sums of `fields` over days sorted ascending; window() reads them through prefix sums."""
+
+    __slots__ = ("fields", "days", "sums", "_cum")
+
+    def __init__(self, fields, days, sums):
+        self.fields = fields
+        self.days = days        # datetime64[D], sorted, unique
+        self.sums = sums        # float64 (len(days), len(fields))
+        self._cum = None
+
+    @classmethod
+    def empty(cls, fields):
+        return cls(fields, np.empty(0, dtype="datetime64[D]"), np.empty((0, len(fields))))
+
+    @classmethod
+    def from_columns(cls, fields, dates, columns):
+        """dates (one per row) + {field: values per row} -> per-day sums."""
+        days, codes = np.unique(np.asarray(dates, dtype="datetime64[D]"), return_inverse=True)
+        sums = np.column_stack([
+            np.bincount(codes, weights=np.asarray(columns[f], dtype=float), minlength=len(days))
+            for f in fields
+        ]) if len(days) else np.empty((0, len(fields)))
+        return cls(fields, days, sums)
+
+    def __len__(self):
+        return len(self.days)
+
+    def __getstate__(self):
+        # prefix sums are rebuilt on demand, not pickled with snapshots
+        return self.fields, self.days, self.sums
+
+    def __setstate__(self, state):
+        self.fields, self.days, self.sums = state
+        self._cum = None
+
+    def merge(self, other):
+        if not len(other):
+            return self
+        if not len(self):
+            return other
+        days, codes = np.unique(np.concatenate((self.days, other.days)), return_inverse=True)
+        sums = np.zeros((len(days), len(self.fields)))
+        np.add.at(sums, codes, np.concatenate((self.sums, other.sums)))
+        return Timeline(self.fields, days, sums)
+
+    @property
+    def cumulative(self):
+        """Prefix sums with a leading zero row: cumulative[i] = sum of the first i days."""
+        if self._cum is None:
+            cum = np.zeros((len(self.days) + 1, len(self.fields)))
+            np.cumsum(self.sums, axis=0, out=cum[1:])
+            self._cum = cum
+        return self._cum
+
+    @property
+    def first_day(self):
+        return self.days[0] if len(self.days) else None
+
+    @property
+    def last_day(self):
+        return self.days[-1] if len(self.days) else None
+
+    def window(self, start=None, end=None):
+        """{field: sum} over start..end inclusive (dates, strings or None for open-ended)."""
+        lo = 0 if start is None else np.searchsorted(self.days, np.datetime64(start, "D"), side="left")
+        hi = len(self.days) if end is None else np.searchsorted(self.days, np.datetime64(end, "D"), side="right")
+        cum = self.cumulative
+        totals = cum[max(hi, lo)] - cum[lo]
+        return dict(zip(self.fields, totals.tolist()))